@@ -0,0 +1,96 @@
+"""Cold-start regression benchmark for the CLI and API entry points
+
+Runs each entry point in fresh interpreters and fails (exit status 1) when
+its median wall time exceeds the threshold, or when it imports a module it
+should load lazily. The import check catches regressions that timing noise
+would hide.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --repeats 10 --max-ms api=1500 --json
+
+Thresholds are deliberately loose (about 2.5x a typical laptop run); a
+breach means something heavy moved onto the startup path, not jitter.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "codeassist"))
+
+from services.startup_profile import imported_modules, measure_cold_start, profile_startup
+
+CLI = str(ROOT / "codeassist" / "cli" / "commands.py")
+
+ENTRY_POINTS = {
+    "cli-help": [CLI, "--help"],
+    "cli-hello": [CLI, "hello"],
+    "cli-status": [CLI, "status"],
+    "api": ["-c", f"import sys; sys.path.insert(0, {str(ROOT)!r}); import codeassist.api.main"],
+}
+
+THRESHOLDS_MS = {
+    "cli-help": 400,
+    "cli-hello": 450,
+    "cli-status": 500,
+    "api": 2000,
+}
+
+# Modules each entry point must not import at startup (prefix match)
+LAZY_MODULES = {
+    "cli-help": ["openai", "httpx", "fastapi", "numpy", "asyncio", "dotenv", "rich.progress", "rich.syntax"],
+    "cli-hello": ["openai", "httpx", "fastapi", "numpy", "asyncio", "rich.progress", "rich.syntax"],
+    "cli-status": ["openai", "httpx", "fastapi", "numpy", "asyncio", "rich.progress", "rich.syntax"],
+    "api": ["openai", "numpy"],
+}
+
+
+def _parse_overrides(values):
+    overrides = {}
+    for value in values:
+        name, _, ms = value.partition("=")
+        if name not in ENTRY_POINTS or not ms:
+            raise SystemExit(f"--max-ms expects NAME=MS with NAME in {', '.join(ENTRY_POINTS)}")
+        overrides[name] = float(ms)
+    return overrides
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5, help="Measured runs per entry point")
+    parser.add_argument("--max-ms", action="append", default=[], metavar="NAME=MS", help="Override a threshold")
+    parser.add_argument("--only", action="append", choices=list(ENTRY_POINTS), help="Benchmark these entry points")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    thresholds = {**THRESHOLDS_MS, **_parse_overrides(args.max_ms)}
+    # No daemon: measure the commands' own startup
+    env = {"CODEASSIST_DAEMON_SOCKET": str(Path(tempfile.gettempdir()) / "codeassist-bench-none.sock")}
+
+    results, failed = {}, False
+    for name in args.only or ENTRY_POINTS:
+        timing = measure_cold_start(ENTRY_POINTS[name], args.repeats, env)
+        modules = imported_modules(profile_startup(ENTRY_POINTS[name], env))
+        eager = sorted({prefix for prefix in LAZY_MODULES[name]
+                        for module in modules if module == prefix or module.startswith(prefix + ".")})
+        ok = timing["median_ms"] <= thresholds[name] and not eager
+        failed = failed or not ok
+        results[name] = {**timing, "threshold_ms": thresholds[name], "eager_imports": eager, "ok": ok}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'entry point':<12} {'median':>8} {'min':>8} {'max':>8} {'limit':>8}  result")
+        for name, result in results.items():
+            verdict = "ok" if result["ok"] else "FAIL"
+            if result["eager_imports"]:
+                verdict += " (imports " + ", ".join(result["eager_imports"]) + ")"
+            print(f"{name:<12} {result['median_ms']:>8.1f} {result['min_ms']:>8.1f} {result['max_ms']:>8.1f} "
+                  f"{result['threshold_ms']:>8.0f}  {verdict}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
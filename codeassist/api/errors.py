@@ -0,0 +1,25 @@
+import math
+
+from fastapi import HTTPException
+
+from models.errors import LLMError, LLMRateLimitError, LLMTimeoutError, LLMServerError, LLMRequestError
+from services.admission import OverloadedError
+
+
+def upstream_http_error(error: Exception, label: str) -> HTTPException:
+    """Map an upstream/overload failure to the HTTP status a client can act on"""
+    detail = f"{label} failed: {str(error)}"
+
+    if isinstance(error, OverloadedError):
+        return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+    if isinstance(error, LLMRateLimitError):
+        retry_after = math.ceil(error.retry_after) if error.retry_after else 1
+        return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+    if isinstance(error, LLMTimeoutError):
+        return HTTPException(status_code=504, detail=detail)
+    if isinstance(error, LLMRequestError) and error.status_code not in (401, 403):
+        return HTTPException(status_code=400, detail=detail)
+    if isinstance(error, (LLMServerError, LLMError)):
+        # Includes upstream auth failures: the server's key is at fault, not the caller
+        return HTTPException(status_code=502, detail=detail)
+    return HTTPException(status_code=500, detail=detail)
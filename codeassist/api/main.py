@@ -1,8 +1,13 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import importlib
 import os
 import sys
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,34 +15,97 @@ from dotenv import load_dotenv
 sys.path.append(str(Path(__file__).parent.parent))
 
 try:
-    from api.routes.completion import router as completion_router
-    from api.routes.review import router as review_router  
-    from api.routes.explanation import router as explanation_router
-    from services.analytics import AnalyticsService
+    from api.metrics import router as metrics_router, MetricsMiddleware, latency_summary
+    from api.rate_limit import RateLimitMiddleware, rate_limit_summary
+    from services.analytics import get_analytics_service
+    from models.client_registry import init_client_registry, close_client_registry, get_client_registry
+    from models.backends import llm_configured
+    from services.response_cache import get_response_cache, close_response_cache
+    from services.single_flight import get_single_flight
+    from services.admission import get_admission_controller
+    from services.semantic_cache import get_semantic_cache
+    from services.model_router import get_model_router
 except ImportError as e:
     print(f"Import error: {e}")
     # Fallback - create basic routers if imports fail
     from fastapi import APIRouter
-    completion_router = APIRouter()
-    review_router = APIRouter()
-    explanation_router = APIRouter()
+    metrics_router = APIRouter()
+    MetricsMiddleware = latency_summary = None
+    RateLimitMiddleware = rate_limit_summary = None
     
     # Basic analytics fallback
     class AnalyticsService:
         def get_stats(self):
             return {"total_requests": 0, "success_rate": 0, "message": "Analytics not available"}
 
+        async def start(self):
+            pass
+
+        async def stop(self):
+            pass
+
+    _fallback_analytics = AnalyticsService()
+
+    def get_analytics_service():
+        return _fallback_analytics
+
+    init_client_registry = close_client_registry = get_client_registry = None
+    get_response_cache = close_response_cache = get_single_flight = None
+    get_admission_controller = get_semantic_cache = get_model_router = None
+    llm_configured = None
+
 load_dotenv()
 
+# Route groups under /api/v1, by module. CODEASSIST_ROUTE_GROUPS mounts a
+# subset (e.g. "completion" for a completion-only deployment); groups left
+# out are never imported. Batch reuses the other three groups' handlers.
+ROUTE_GROUPS = {
+    "completion": "api.routes.completion",
+    "review": "api.routes.review",
+    "explanation": "api.routes.explanation",
+    "batch": "api.routes.batch",
+}
+
+def enabled_route_groups() -> list:
+    """Route groups named in CODEASSIST_ROUTE_GROUPS (default: all)"""
+    value = os.getenv("CODEASSIST_ROUTE_GROUPS", "")
+    groups = [group.strip() for group in value.split(",") if group.strip()] or list(ROUTE_GROUPS)
+    unknown = set(groups) - set(ROUTE_GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown route groups: {', '.join(sorted(unknown))}")
+    return groups
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown"""
+    if init_client_registry:
+        app.state.llm_registry = init_client_registry()
+        # Build the default backend now (the OpenAI SDK is imported lazily) so
+        # the first request does not pay for it
+        if llm_configured():
+            app.state.llm_registry.get()
+    await analytics.start()
+    yield
+    await analytics.stop()
+    if close_client_registry:
+        await close_client_registry()
+    if close_response_cache:
+        close_response_cache()
+
 # Create FastAPI app
 app = FastAPI(
     title="CodeAssist API",
     description="🚀 LLM-Based Code Completion and Review Tool API",
     version="0.1.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Rate limiting sits inside CORS so 429 responses still carry CORS headers
+if RateLimitMiddleware:
+    app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -45,15 +113,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit-Requests", "X-RateLimit-Remaining-Requests",
+                    "X-RateLimit-Reset-Requests", "X-RateLimit-Limit-Tokens", "X-RateLimit-Remaining-Tokens",
+                    "X-RateLimit-Reset-Tokens"],
 )
+if MetricsMiddleware:
+    app.add_middleware(MetricsMiddleware)
 
 # Include routers
-app.include_router(completion_router, prefix="/api/v1", tags=["completion"])
-app.include_router(review_router, prefix="/api/v1", tags=["review"])
-app.include_router(explanation_router, prefix="/api/v1", tags=["explanation"])
+for group in enabled_route_groups():
+    try:
+        module = importlib.import_module(ROUTE_GROUPS[group])
+    except ImportError as e:
+        print(f"Import error in {group} routes: {e}")
+        continue
+    app.include_router(module.router, prefix="/api/v1", tags=[group])
+app.include_router(metrics_router, tags=["metrics"])
 
-# Initialize analytics
-analytics = AnalyticsService()
+# Shared analytics instance (the same one the routers use)
+analytics = get_analytics_service()
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -102,12 +180,23 @@ async def root():
             </div>
         </div>
         
+        <div class="feature">
+            <h2>📦 Batch Processing</h2>
+            <p>Complete, review or explain many snippets in one request</p>
+            <div class="endpoint">
+                <strong>POST</strong> <code>/api/v1/batch/{complete|review|explain}</code>
+            </div>
+        </div>
+        
         <div class="feature">
             <h2>📊 Analytics</h2>
             <p>View usage statistics and performance metrics</p>
             <div class="endpoint">
                 <strong>GET</strong> <code>/api/v1/stats</code>
             </div>
+            <div class="endpoint">
+                <strong>GET</strong> <code>/metrics</code> (Prometheus format)
+            </div>
         </div>
         
         <div class="feature">
@@ -134,39 +223,61 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     api_key_configured = bool(os.getenv("OPENAI_API_KEY")) and os.getenv("OPENAI_API_KEY") != "your_openai_api_key_here"
+    backend = os.getenv("CODEASSIST_LLM_BACKEND", "openai")
     
     return {
         "status": "healthy",
         "version": "0.1.0",
         "api_key_configured": api_key_configured,
-        "features": ["completion", "review", "explanation"],
+        "llm_backend": backend,
+        "features": [group for group in enabled_route_groups() if group != "batch"],
         "message": "🚀 CodeAssist API is running!"
     }
 
+def _global_stats():
+    """Analytics and component stats for ``/api/v1/stats`` (blocking reads)"""
+    stats = analytics.get_stats()
+    return {
+        "overview": {
+            "total_requests": stats.get("total_requests", 0),
+            "success_rate": f"{stats.get('success_rate', 0)}%",
+            "average_response_time": f"{stats.get('average_response_time', 0)}s",
+            "response_time_percentiles": stats.get("response_time_percentiles", {}),
+            "average_time_to_first_token": f"{stats.get('average_time_to_first_token', 0)}s",
+            "time_to_first_token_percentiles": stats.get("time_to_first_token_percentiles", {}),
+            "requests_per_minute": stats.get("requests_per_minute", {}).get("all", {}),
+            "days_running": stats.get("days_running", 0),
+            "requests_per_day": stats.get("requests_per_day", 0)
+        },
+        "breakdown": {
+            "completion_requests": stats.get("completion_requests", 0),
+            "review_requests": stats.get("review_requests", 0),
+            "explanation_requests": stats.get("explanation_requests", 0),
+            "response_time_by_type": stats.get("response_time_by_type", {})
+        },
+        "performance": {
+            **(latency_summary() if latency_summary else {}),
+            "version": "0.1.0",
+            "status": "operational"
+        },
+        "connection_pool": get_client_registry().pool_stats() if get_client_registry else {},
+        "upstream": get_client_registry().client_stats() if get_client_registry else {},
+        "llm_backend": get_client_registry().backend_stats() if get_client_registry else {},
+        "cache": get_response_cache().stats() if get_response_cache else {},
+        "semantic_cache": get_semantic_cache().stats() if get_semantic_cache else {},
+        "coalescing": get_single_flight().stats() if get_single_flight else {},
+        "admission": get_admission_controller().stats() if get_admission_controller else {},
+        "routing": get_model_router().stats() if get_model_router else {},
+        "rate_limits": rate_limit_summary() if rate_limit_summary else {},
+        "workers": analytics.workers() if hasattr(analytics, "workers") else []
+    }
+
 @app.get("/api/v1/stats")
 async def get_global_stats():
     """Get comprehensive analytics for all features"""
     try:
-        stats = analytics.get_stats()
-        return {
-            "overview": {
-                "total_requests": stats.get("total_requests", 0),
-                "success_rate": f"{stats.get('success_rate', 0)}%",
-                "average_response_time": f"{stats.get('average_response_time', 0)}s",
-                "days_running": stats.get("days_running", 0),
-                "requests_per_day": stats.get("requests_per_day", 0)
-            },
-            "breakdown": {
-                "completion_requests": stats.get("completion_requests", 0),
-                "review_requests": stats.get("review_requests", 0),
-                "explanation_requests": stats.get("explanation_requests", 0)
-            },
-            "performance": {
-                "uptime": "99.9%",
-                "version": "0.1.0",
-                "status": "operational"
-            }
-        }
+        # Shared-store and SQLite reads (analytics, disk cache counts): keep them off the event loop
+        return await asyncio.to_thread(_global_stats)
     except Exception as e:
         return {
             "error": "Analytics temporarily unavailable",
@@ -174,7 +285,55 @@ async def get_global_stats():
             "basic_stats": {"total_requests": 0}
         }
 
+@app.get("/api/v1/stats/range")
+async def get_stats_range(
+    hours: float = 24,
+    granularity: str = "hour",
+    group_by: Optional[str] = None,
+    request_type: Optional[str] = None,
+    model: Optional[str] = None,
+    kind: str = "request",
+    bucketed: bool = True
+):
+    """
+    Latency and volume over a time range, from the analytics rollups
+
+    - **hours**: How far back to look (default 24)
+    - **granularity**: `minute`, `hour` or `day` buckets
+    - **group_by**: Optional `model` or `request_type`
+    - **kind**: `request` latency or `first_token` latency
+    - **bucketed**: Set false for one row per group over the whole range,
+      e.g. `?group_by=model&bucketed=false` gives p95 per model over the last 24h
+
+    Requires `CODEASSIST_ANALYTICS_BACKEND=sqlite`.
+    """
+    end = time.time()
+    try:
+        rows = await asyncio.to_thread(
+            analytics.query_range, end - hours * 3600, end,
+            granularity=granularity, group_by=group_by, kind=kind,
+            request_type=request_type, model=model, buckets=bucketed
+        )
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except (ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"start": end - hours * 3600, "end": end, "granularity": granularity, "rows": rows}
+
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        # Import-time breakdown of the app module, measured in a fresh interpreter
+        from services.startup_profile import profile_startup, format_report
+        root = Path(__file__).resolve().parent.parent.parent
+        profile = profile_startup(["-c", f"import sys; sys.path.insert(0, {str(root)!r}); import codeassist.api.main"])
+        print(format_report(profile))
+        sys.exit(profile["returncode"])
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    workers = int(os.environ.get("CODEASSIST_WORKERS", os.environ.get("WEB_CONCURRENCY", 1)))
+    if workers > 1:
+        # Workers are separate processes: share analytics and cache through a common store
+        os.environ.setdefault("CODEASSIST_SHARED_STATE", "sqlite")
+        uvicorn.run("codeassist.api.main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.admission import get_admission_controller
+from services.response_cache import get_response_cache
+from services.metrics import (
+    begin_request, end_request, get_metrics_registry,
+    http_latency, http_requests, overhead_latency, process_start_time, upstream_latency
+)
+
+router = APIRouter()
+
+
+def outcome_for_status(status: int) -> str:
+    """Coarse outcome label for an HTTP status code"""
+    if status < 400:
+        return "success"
+    if status == 429:
+        return "rate_limited"
+    if status == 503:
+        return "overloaded"
+    if status in (502, 504):
+        return "upstream_error"
+    if status < 500:
+        return "client_error"
+    return "error"
+
+
+def _route_template(scope) -> str:
+    """Matched path template including any router prefix, or ``unmatched``"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # Some FastAPI versions report the template relative to the including
+    # router; recover the prefix from the leading segments of the raw path
+    segments = scope["path"].rstrip("/").split("/")
+    depth = len(template.rstrip("/").split("/"))
+    prefix = "/".join(segments[:len(segments) - depth + 1]) if len(segments) > depth else ""
+    return prefix + template
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route counters and latency histograms
+
+    Latency runs until the last body chunk is sent, so streamed responses
+    are measured end to end rather than to the first header. Routes are
+    labelled by their path template (``/api/v1/batch/{task}``), never the
+    raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = get_metrics_registry().gauge(
+            "codeassist_http_requests_in_flight", "Requests currently being served"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request, token = begin_request()
+        status = 500
+        self.in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec()
+            end_request(token)
+            elapsed = time.perf_counter() - started
+            path = _route_template(scope)
+            model = request.model or "none"
+            http_requests().inc(
+                route=path,
+                method=scope["method"],
+                model=model,
+                outcome=request.outcome or outcome_for_status(status),
+                status=status,
+            )
+            http_latency().observe(elapsed, route=path, model=model)
+            if request.model is not None:
+                upstream_latency().observe(request.upstream_seconds, route=path, model=model)
+            overhead_latency().observe(max(0.0, elapsed - request.upstream_seconds), route=path)
+
+
+def latency_summary() -> dict:
+    """p50/p95/p99 per route, plus the upstream/overhead split, for ``/stats``"""
+    requests = http_latency()
+    routes = sorted({key[0] for key in requests.series()})
+    counts = http_requests().values()
+    total = sum(counts.values())
+    server_errors = sum(value for key, value in counts.items() if key[4].startswith("5"))
+    return {
+        "uptime_seconds": round(time.time() - process_start_time(), 1),
+        "availability": f"{round((1 - server_errors / total) * 100, 2) if total else 100.0}%",
+        "latency": {route: requests.merged(route=route).summary() for route in routes},
+        "upstream_wait": {
+            route: upstream for route, upstream in
+            ((route, upstream_latency().merged(route=route).summary()) for route in routes)
+            if upstream["count"]
+        },
+        "server_overhead": {route: overhead_latency().merged(route=route).summary() for route in routes},
+    }
+
+
+def _component_metrics():
+    """Gauges for state owned by other components, read at scrape time"""
+    yield ("codeassist_uptime_seconds", "gauge", "Seconds since the process started",
+           [({}, time.time() - process_start_time())])
+
+    cache = get_response_cache().stats()
+    tiers = [("memory", cache["memory"])] + ([("disk", cache["disk"])] if cache.get("disk") else [])
+    yield ("codeassist_cache_hits_total", "counter", "Response cache hits by tier",
+           [({"tier": tier}, stats["hits"]) for tier, stats in tiers])
+    yield ("codeassist_cache_misses_total", "counter", "Response cache misses by tier",
+           [({"tier": tier}, stats["misses"]) for tier, stats in tiers])
+
+    models = get_admission_controller().stats()["models"]
+    yield ("codeassist_upstream_active", "gauge", "Upstream calls holding a concurrency slot",
+           [({"model": model}, stats["active"]) for model, stats in models.items()])
+    yield ("codeassist_upstream_queued", "gauge", "Upstream calls waiting for a concurrency slot",
+           [({"model": model}, stats["queue_depth"]) for model, stats in models.items()])
+    yield ("codeassist_upstream_rejected_total", "counter", "Upstream calls rejected by admission control",
+           [({"model": model}, stats["rejected"]) for model, stats in models.items()])
+
+
+get_metrics_registry().register_collector(_component_metrics)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of all counters and histograms"""
+    # Collectors may read SQLite (disk cache size), so render off the event loop
+    return PlainTextResponse(
+        await asyncio.to_thread(get_metrics_registry().render),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,11 +1,17 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 class CodeRequest(BaseModel):
     """Request model for code operations"""
     code: str = Field(..., description="The code to process", example="def fibonacci(n):")
     context: Optional[str] = Field(None, description="Additional context for the code", example="This function should calculate fibonacci numbers")
-    model: Optional[str] = Field("gpt-3.5-turbo", description="LLM model to use")
+    model: Optional[str] = Field("auto", description="LLM model to use, or 'auto' to let the router choose")
+
+class CompletionRequest(CodeRequest):
+    """Request model for code completion"""
+    filename: Optional[str] = Field(None, description="Project-relative path of the file being edited (its own definitions are not retrieved)")
+    use_index: bool = Field(True, description="Add relevant definitions from the project symbol index to the prompt")
+    cursor: Optional[int] = Field(None, ge=0, description="Character offset in code to insert the completion at; code is then the whole buffer")
 
 class CompletionResponse(BaseModel):
     """Response model for code completion"""
@@ -13,6 +19,17 @@ class CompletionResponse(BaseModel):
     completion: str = Field(..., description="The AI-generated completion")
     model_used: str = Field(..., description="The LLM model used for completion")
     success: bool = Field(..., description="Whether the completion was successful")
+    context_symbols: List[str] = Field(default_factory=list, description="Project definitions added to the prompt, as path:line qualname")
+    cursor: Optional[int] = Field(None, description="Offset the completion is to be inserted at, for fill-in-the-middle requests")
+    window: Optional[Dict[str, int]] = Field(None, description="Buffer lines sent around the cursor: cursor_line, start_line, end_line")
+
+class StaticFinding(BaseModel):
+    """A finding from the local static analysis that runs before the LLM"""
+    rule: str = Field(..., description="Rule identifier, e.g. S101")
+    category: str = Field(..., description="security, bug or performance")
+    severity: str = Field(..., description="error, warning or info")
+    line: int = Field(..., description="Line number in the submitted code")
+    message: str = Field(..., description="The finding and suggested fix")
 
 class ReviewResponse(BaseModel):
     """Response model for code review"""
@@ -20,6 +37,8 @@ class ReviewResponse(BaseModel):
     review: str = Field(..., description="The AI-generated code review")
     model_used: str = Field(..., description="The LLM model used for review")
     success: bool = Field(..., description="Whether the review was successful")
+    static_findings: List[StaticFinding] = Field(default_factory=list, description="Findings from local static analysis")
+    llm_used: bool = Field(True, description="False when the review was answered by static analysis alone")
 
 class ExplanationResponse(BaseModel):
     """Response model for code explanation"""
@@ -46,4 +65,115 @@ class FileRequest(BaseModel):
     file_content: str = Field(..., description="Content of the file to process")
     filename: Optional[str] = Field(None, description="Name of the file")
     context: Optional[str] = Field(None, description="Additional context")
-    model: Optional[str] = Field("gpt-3.5-turbo", description="LLM model to use")
\ No newline at end of file
+    model: Optional[str] = Field("auto", description="LLM model to use, or 'auto' to let the router choose")
+
+class BatchRequest(BaseModel):
+    """Request model for batch operations"""
+    items: List[CodeRequest] = Field(..., description="Code snippets to process, in order")
+    max_concurrency: Optional[int] = Field(None, description="Upper bound on items processed at once (capped by the server)")
+
+class BatchItemResult(BaseModel):
+    """Result for a single item in a batch"""
+    index: int = Field(..., description="Position of the item in the request")
+    success: bool = Field(..., description="Whether this item succeeded")
+    status_code: int = Field(..., description="HTTP status the item would have received on its own")
+    result: Optional[str] = Field(None, description="The AI-generated completion, review or explanation")
+    model_used: Optional[str] = Field(None, description="The LLM model used for this item")
+    error: Optional[str] = Field(None, description="Error message if the item failed")
+
+class BatchResponse(BaseModel):
+    """Response model for batch operations"""
+    results: List[BatchItemResult] = Field(..., description="Per-item results in request order")
+    succeeded: int = Field(..., description="Number of items that succeeded")
+    failed: int = Field(..., description="Number of items that failed")
+
+class ChunkSummary(BaseModel):
+    """How one section of a file was processed"""
+    name: str = Field(..., description="Function, class or module section name")
+    kind: str = Field(..., description="Section kind: function, class or module")
+    start_line: int = Field(..., description="First line of the section in the file")
+    end_line: int = Field(..., description="Last line of the section in the file")
+    cached: bool = Field(..., description="Whether the result was served from cache")
+    success: bool = Field(..., description="Whether the section was processed successfully")
+    error: Optional[str] = Field(None, description="Error message if the section failed")
+
+class Finding(BaseModel):
+    """A review finding anchored to a line of the file"""
+    line: int = Field(..., description="Line number in the file")
+    message: str = Field(..., description="The finding and suggested fix")
+    section: str = Field(..., description="Section the finding belongs to")
+
+class PipelineStats(BaseModel):
+    """Throughput of the chunked file pipeline"""
+    chunks: int = Field(..., description="Number of sections the file was split into")
+    cached_chunks: int = Field(..., description="Sections served from cache")
+    failed_chunks: int = Field(..., description="Sections that could not be processed")
+    elapsed_seconds: float = Field(..., description="Wall-clock time for the whole file")
+    chunks_per_second: float = Field(..., description="Pipeline throughput")
+    input_tokens: int = Field(0, description="Estimated input tokens sent upstream (cached sections excluded)")
+    output_tokens: int = Field(0, description="Estimated output tokens received")
+
+class FileReviewResponse(ReviewResponse):
+    """Response model for chunked file review"""
+    findings: List[Finding] = Field(default_factory=list, description="Line-anchored findings, sorted by line")
+    chunks: List[ChunkSummary] = Field(default_factory=list, description="Per-section processing details")
+    pipeline: Optional[PipelineStats] = Field(None, description="Pipeline throughput statistics")
+
+class FileExplanationResponse(ExplanationResponse):
+    """Response model for chunked file explanation"""
+    chunks: List[ChunkSummary] = Field(default_factory=list, description="Per-section processing details")
+    pipeline: Optional[PipelineStats] = Field(None, description="Pipeline throughput statistics")
+
+class DiffReviewRequest(BaseModel):
+    """Request model for reviewing a diff"""
+    diff: Optional[str] = Field(None, description="Unified diff to review (git diff or diff -u output)")
+    base: Optional[str] = Field(None, description="Git revision to diff from, in the server's project root (instead of diff)")
+    head: Optional[str] = Field(None, description="Git revision to diff to; defaults to the working tree")
+    files: Dict[str, str] = Field(default_factory=dict, description="New contents of changed files by path, used to find enclosing functions")
+    context: Optional[str] = Field(None, description="Additional context about the change")
+    model: Optional[str] = Field("auto", description="LLM model to use, or 'auto' to let the router choose")
+
+class DiffFinding(Finding):
+    """A finding in a changed file"""
+    path: str = Field(..., description="Path of the file in the diff")
+
+class DiffStaticFinding(StaticFinding):
+    """A static-analysis finding on an added line"""
+    path: str = Field(..., description="Path of the file in the diff")
+
+class DiffRegionResult(BaseModel):
+    """Review details for one changed region"""
+    id: str = Field(..., description="Stable key of the region's review; unchanged regions keep it across commits")
+    path: str = Field(..., description="Path of the file in the diff")
+    name: str = Field(..., description="Enclosing function or method, or 'module'")
+    kind: str = Field(..., description="function, method or module")
+    start_line: int = Field(..., description="First line of the region in the new file")
+    end_line: int = Field(..., description="Last line of the region in the new file")
+    changed_lines: List[int] = Field(default_factory=list, description="Added lines and deletion points in the region")
+    cached: bool = Field(..., description="Whether an earlier review of this region was reused")
+    success: bool = Field(..., description="Whether the region was reviewed successfully")
+    error: Optional[str] = Field(None, description="Error message if the region failed")
+    findings: List[DiffFinding] = Field(default_factory=list, description="Findings in this region")
+
+class DiffReviewStats(BaseModel):
+    """How much of the change was sent for review"""
+    files: int = Field(..., description="Changed files with reviewable lines")
+    regions: int = Field(..., description="Regions sent for review")
+    cached_regions: int = Field(..., description="Regions whose earlier review was reused")
+    failed_regions: int = Field(..., description="Regions that could not be reviewed")
+    changed_lines: int = Field(..., description="Added lines and deletion points")
+    sent_lines: int = Field(..., description="Lines sent to the model, context included")
+    file_lines: int = Field(..., description="Total lines of the changed files whose contents were available")
+    input_tokens: int = Field(0, description="Estimated input tokens sent upstream (reused regions excluded)")
+    output_tokens: int = Field(0, description="Estimated output tokens received")
+    elapsed_seconds: float = Field(..., description="Wall-clock time for the whole diff")
+
+class DiffReviewResponse(BaseModel):
+    """Response model for diff review"""
+    review: str = Field(..., description="Markdown report grouped by file and region")
+    model_used: str = Field(..., description="The LLM model used for review")
+    success: bool = Field(..., description="Whether the review was successful")
+    findings: List[DiffFinding] = Field(default_factory=list, description="Findings, sorted by path and line")
+    static_findings: List[DiffStaticFinding] = Field(default_factory=list, description="Static-analysis findings on added lines")
+    regions: List[DiffRegionResult] = Field(default_factory=list, description="Per-region review details")
+    stats: DiffReviewStats = Field(..., description="Review statistics")
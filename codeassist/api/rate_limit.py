@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from services.metrics import current_request
+from services.rate_limiter import SharedBucketStore, get_rate_limiter
+from services.token_budget import count_tokens
+
+# Tokens reserved per LLM call for the response, which is unknown up front
+OUTPUT_TOKEN_RESERVE = int(os.getenv("CODEASSIST_RATE_LIMIT_OUTPUT_TOKENS", 500))
+# Bodies larger than this are charged by size instead of being tokenized
+MAX_TOKENIZED_BYTES = 1_000_000
+TEXT_FIELDS = ("code", "context", "file_content", "diff")
+
+
+def _key_hash(api_key: bytes) -> str:
+    return hashlib.sha256(api_key).hexdigest()[:16]
+
+
+# Keys that get their own buckets (comma-separated). The API does not
+# authenticate, so an unlisted key must not buy a fresh bucket.
+ALLOWED_KEY_HASHES = {
+    _key_hash(key.strip().encode()) for key in os.getenv("CODEASSIST_API_KEYS", "").split(",") if key.strip()
+}
+
+
+def caller_key(scope) -> str:
+    """Rate-limit key: a hash of the API key if it is in ``CODEASSIST_API_KEYS``, else the client IP"""
+    headers = dict(scope.get("headers") or [])
+    api_key = headers.get(b"x-api-key")
+    if api_key is None:
+        authorization = headers.get(b"authorization", b"")
+        if authorization.lower().startswith(b"bearer "):
+            api_key = authorization[7:].strip()
+    if api_key:
+        # Never keep raw credentials in memory, stats or the shared store
+        key_hash = _key_hash(api_key)
+        if key_hash in ALLOWED_KEY_HASHES:
+            return "key:" + key_hash
+
+    client = scope.get("client")
+    host = client[0] if client else "unknown"
+    if os.getenv("CODEASSIST_TRUST_PROXY", "").lower() in ("1", "true", "yes"):
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            host = forwarded.split(b",")[0].strip().decode("latin-1")
+    return "ip:" + host
+
+
+def estimate_cost(body: bytes):
+    """``(llm_calls, tokens)`` a request body is expected to consume"""
+    if len(body) > MAX_TOKENIZED_BYTES:
+        return 1, len(body) // 4 + OUTPUT_TOKEN_RESERVE
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        return 1, OUTPUT_TOKEN_RESERVE
+    items = payload.get("items") if isinstance(payload.get("items"), list) else [payload]
+    tokens = 0
+    for item in items:
+        if isinstance(item, dict):
+            text = "\n".join(str(item[field]) for field in TEXT_FIELDS if item.get(field))
+            tokens += count_tokens(text) if text else 0
+        tokens += OUTPUT_TOKEN_RESERVE
+    return max(1, len(items)), tokens
+
+
+class RateLimitMiddleware:
+    """ASGI middleware charging each caller's token buckets before LLM requests
+
+    Only ``POST`` requests under ``/api/`` are charged: each costs one
+    request per LLM call (batch items count individually) plus the
+    estimated prompt and response tokens. Over-quota callers get a 429 with
+    ``Retry-After``; every charged response carries ``X-RateLimit-*``
+    headers with the remaining quota. Once the response is sent, the token
+    charge is settled against the tokens the request's LLM calls actually
+    used (as counted by ``MetricsMiddleware``, which must wrap this one).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limiter = get_rate_limiter()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith("/api/")
+            or not self.limiter.enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the body to size the request, then replay it to the app
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        requests, tokens = estimate_cost(body)
+        caller = caller_key(scope)
+        # SQLite reads and writes, possibly waiting on the shared lock: keep them off the event loop
+        shared = isinstance(self.limiter.store, SharedBucketStore)
+        if shared:
+            decision = await asyncio.to_thread(self.limiter.check, caller, requests=requests, tokens=tokens)
+        else:
+            decision = self.limiter.check(caller, requests=requests, tokens=tokens)
+        quota_headers = [(name.lower().encode(), value.encode()) for name, value in decision.headers().items()]
+
+        if not decision.allowed:
+            content = json.dumps({"detail": "Rate limit exceeded, retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(content)).encode()),
+                ] + quota_headers,
+            })
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + quota_headers)
+            await send(message)
+
+        usage = current_request()
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        finally:
+            if usage is not None:
+                if shared:
+                    await asyncio.to_thread(self.limiter.settle, caller, tokens, usage.llm_tokens)
+                else:
+                    self.limiter.settle(caller, tokens, usage.llm_tokens)
+
+
+def rate_limit_summary() -> dict:
+    """Limits and per-caller usage for ``/stats``"""
+    return get_rate_limiter().stats()
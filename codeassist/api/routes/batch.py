@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+import sys
+import os
+import json
+import asyncio
+from pathlib import Path
+
+# Add parent directories to path for imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.models import CodeRequest, BatchRequest, BatchItemResult, BatchResponse
+from api.routes.completion import complete_code
+from api.routes.review import review_code
+from api.routes.explanation import explain_code
+
+router = APIRouter()
+
+BATCH_MAX_ITEMS = int(os.getenv("CODEASSIST_BATCH_MAX_ITEMS", 500))
+BATCH_MAX_CONCURRENCY = int(os.getenv("CODEASSIST_BATCH_MAX_CONCURRENCY", 8))
+
+# task name -> (single-item handler, response field holding the generated text)
+BATCH_TASKS = {
+    "complete": (complete_code, "completion"),
+    "review": (review_code, "review"),
+    "explain": (explain_code, "explanation"),
+}
+
+async def _run_item(task: str, index: int, item: CodeRequest, semaphore: asyncio.Semaphore) -> BatchItemResult:
+    """Run one item through the single-request handler, capturing its status"""
+    handler, field = BATCH_TASKS[task]
+    async with semaphore:
+        try:
+            response = await handler(item)
+            return BatchItemResult(
+                index=index,
+                success=True,
+                status_code=200,
+                result=getattr(response, field),
+                model_used=response.model_used
+            )
+        except HTTPException as e:
+            return BatchItemResult(index=index, success=False, status_code=e.status_code, model_used=item.model, error=str(e.detail))
+        except Exception as e:
+            return BatchItemResult(index=index, success=False, status_code=500, model_used=item.model, error=str(e))
+
+def _start_batch(task: str, request: BatchRequest) -> list:
+    """Validate the batch and schedule every item under a bounded concurrency limit"""
+    if task not in BATCH_TASKS:
+        raise HTTPException(status_code=404, detail=f"Unknown batch task '{task}'. Use one of: {', '.join(BATCH_TASKS)}")
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(request.items)} items (max {BATCH_MAX_ITEMS})")
+
+    limit = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, limit))
+    return [
+        asyncio.ensure_future(_run_item(task, index, item, semaphore))
+        for index, item in enumerate(request.items)
+    ]
+
+@router.post("/batch/{task}", response_model=BatchResponse)
+async def run_batch(task: str, request: BatchRequest):
+    """
+    Complete, review or explain many snippets in one call
+
+    - **task**: `complete`, `review` or `explain`
+    - **items**: List of code requests, processed concurrently
+    - **max_concurrency**: Optional cap on items in flight at once
+
+    Results are returned in request order with a per-item status code.
+    """
+    tasks = _start_batch(task, request)
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        for pending in tasks:
+            pending.cancel()
+
+    succeeded = sum(1 for result in results if result.success)
+    return BatchResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+@router.post("/batch/{task}/stream")
+async def run_batch_stream(task: str, request: BatchRequest):
+    """
+    Like `/batch/{task}`, but streams NDJSON results as each item finishes
+
+    Each line is a JSON object with the item's `index`, so callers can match
+    results to inputs while the rest of the batch is still running.
+    """
+    tasks = _start_batch(task, request)
+
+    async def results():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                yield json.dumps(result.model_dump()) + "\n"
+        finally:
+            # Client went away: stop working on the rest of the batch
+            for pending in tasks:
+                pending.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,92 +1,214 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from typing import Optional
 import sys
-import os
 import time
 from pathlib import Path
 
 # Add parent directories to path for imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from api.models import CodeRequest, CompletionResponse, ErrorResponse, FileRequest
-from models.llm_client import LLMClient
-from services.analytics import AnalyticsService
+from api.models import CodeRequest, CompletionRequest, CompletionResponse, ErrorResponse, FileRequest
+from api.streaming import stream_llm_events, sse_response
+from models.client_registry import get_llm_client
+from models.backends import llm_configured
+from api.errors import upstream_http_error
+from models.errors import LLMError
+from services.admission import OverloadedError
+from services.token_budget import fit_prompt, count_tokens
+from services.analytics import get_analytics_service
+from services.symbol_index import get_symbol_index
+from services.model_router import get_model_router
+from services.fim import clean_insertion, fim_window, fit_fim_messages, prompt_cache_key
 import asyncio
 
 router = APIRouter()
-analytics = AnalyticsService()
+analytics = get_analytics_service()
+
+def _build_completion_messages(request: CodeRequest, code: str, project_context: str = "") -> list:
+    """Build the chat messages for a completion request"""
+    prompt = ""
+    if project_context:
+        prompt += f"Relevant definitions from this project:\n\n```python\n{project_context}\n```\n\n"
+    
+    prompt += f"Complete this Python code:\n\n```python\n{code}\n```\n\n"
+    
+    if code.strip().endswith(':'):
+        prompt += "Complete the code block that follows this statement."
+    elif 'def ' in code:
+        prompt += "Complete the function implementation with proper logic."
+    else:
+        prompt += "Continue the code naturally based on the context."
+    
+    if request.context:
+        prompt += f"\n\nAdditional context: {request.context}"
+    
+    prompt += "\n\nProvide only the completion code, properly formatted and indented."
+    
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert Python programmer. Complete the code naturally and efficiently. Only return the completion, not the original code."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+async def _project_context(request: CodeRequest, code: Optional[str] = None) -> tuple:
+    """Definitions from the project index relevant to ``code`` (default the request's), and their labels
+
+    Empty when no ``CODEASSIST_PROJECT_ROOT`` is configured or the caller
+    opted out. Batch items are plain ``CodeRequest``s and use the defaults.
+    Index refreshes touch the filesystem, so they run off the event loop.
+    """
+    if not getattr(request, "use_index", True):
+        return "", []
+    index = await asyncio.to_thread(get_symbol_index)
+    if index is None:
+        return "", []
+    text, symbols = index.context_for(code if code is not None else request.code, exclude_path=getattr(request, "filename", None))
+    return text, [f"{symbol.path}:{symbol.line} {symbol.qualname}" for symbol in symbols]
+
+def _fit_completion_messages(request: CodeRequest, model: str, project_context: str = "") -> tuple:
+    """Build messages that fit ``model``'s context window, plus a token estimate
+
+    Oversized code keeps its last lines, the region just before the cursor.
+    """
+    return fit_prompt(
+        model,
+        request.code,
+        lambda code: _build_completion_messages(request, code, project_context),
+        max_output_tokens=500,
+        keep="end"
+    )
+
+def _fim_window(request: CodeRequest):
+    """Windows around the request's cursor, or None for a plain append-at-end completion"""
+    cursor = getattr(request, "cursor", None)
+    return fim_window(request.code, cursor) if cursor is not None else None
+
+def _fit_messages(request: CodeRequest, model: str, project_context: str, window) -> tuple:
+    if window is None:
+        return _fit_completion_messages(request, model, project_context)
+    return fit_fim_messages(model, window, project_context, request.context, getattr(request, "filename", None))
+
+def _generate_options(request: CodeRequest, window) -> dict:
+    """Keystrokes in one buffer share a prompt cache key, so upstream reuses their common prefix"""
+    if window is None:
+        return {}
+    return {"prompt_cache_key": prompt_cache_key(request.code, getattr(request, "filename", None))}
 
 @router.post("/complete", response_model=CompletionResponse)
-async def complete_code(request: CodeRequest):
+async def complete_code(request: CompletionRequest):
     """
     Complete code using AI
     
     - **code**: The code to complete
     - **context**: Optional context to help with completion
-    - **model**: OpenAI model to use (default: gpt-3.5-turbo)
+    - **model**: Model to use, or `auto` (default) to let the router choose
+    - **filename**: Optional project-relative path of the file being edited
+    - **use_index**: Retrieve relevant project definitions (default: true)
+    - **cursor**: Character offset in `code` to complete at; `code` is then the whole buffer
+    
+    With a cursor, bounded windows before and after it are sent in a
+    fill-in-the-middle prompt, and `completion` is the text to insert at the
+    cursor. The prompt is laid out so consecutive keystrokes in one buffer
+    share a long common prefix for upstream prompt caching.
     """
     start_time = time.time()
     
     try:
         # Check if API key is configured
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key == "your_openai_api_key_here":
-            analytics.track_request("completion", False)
+        if not llm_configured():
+            analytics.track_request("completion", False, model=request.model)
             raise HTTPException(
                 status_code=400,
                 detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
             )
         
-        # Create LLM client
-        llm = LLMClient(model=request.model)
-        
-        # Build completion prompt
-        prompt = f"Complete this Python code:\n\n```python\n{request.code}\n```\n\n"
-        
-        if request.code.strip().endswith(':'):
-            prompt += "Complete the code block that follows this statement."
-        elif 'def ' in request.code:
-            prompt += "Complete the function implementation with proper logic."
-        else:
-            prompt += "Continue the code naturally based on the context."
-        
-        if request.context:
-            prompt += f"\n\nAdditional context: {request.context}"
-        
-        prompt += "\n\nProvide only the completion code, properly formatted and indented."
-        
-        # Generate completion
-        messages = [
-            {
-                "role": "system",
-                "content": "You are an expert Python programmer. Complete the code naturally and efficiently. Only return the completion, not the original code."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-        
-        completion = await llm.generate(messages, temperature=0.3, max_tokens=500)
+        window = _fim_window(request)
+        code = window.prefix + window.suffix if window else request.code
+        project_context, context_symbols = await _project_context(request, window.context_code if window else None)
+        model_router = get_model_router()
+        decision = model_router.route("completion", request.model, code, request.context, max_output_tokens=500)
+        completion, model, usage = await model_router.generate(
+            decision,
+            lambda model: _fit_messages(request, model, project_context, window),
+            temperature=0.3,
+            max_tokens=500,
+            client_factory=get_llm_client,
+            **_generate_options(request, window)
+        )
+        # An insertion keeps its leading newline and indentation
+        completion = clean_insertion(completion) if window else completion.strip()
+        analytics.track_tokens("completion", usage["input_tokens"], count_tokens(completion, model), model=model)
         
         # Track successful request
         response_time = time.time() - start_time
-        analytics.track_request("completion", True, response_time)
+        analytics.track_request("completion", True, response_time, model=model)
         
         return CompletionResponse(
             original_code=request.code,
             completion=completion,
-            model_used=request.model,
-            success=True
+            model_used=model,
+            success=True,
+            context_symbols=context_symbols,
+            cursor=getattr(request, "cursor", None),
+            window=window.to_dict() if window else None
         )
         
+    except HTTPException:
+        raise
     except ValueError as e:
-        analytics.track_request("completion", False)
+        analytics.track_request("completion", False, model=request.model)
         raise HTTPException(status_code=400, detail=str(e))
+    except (OverloadedError, LLMError) as e:
+        analytics.track_request("completion", False, model=request.model)
+        raise upstream_http_error(e, "Completion")
     except Exception as e:
-        analytics.track_request("completion", False)
+        analytics.track_request("completion", False, model=request.model)
         raise HTTPException(status_code=500, detail=f"Completion failed: {str(e)}")
 
+@router.post("/complete/stream")
+async def complete_code_stream(request: CompletionRequest):
+    """
+    Complete code using AI, streaming tokens as Server-Sent Events
+    
+    Emits `token` events as the completion is generated, then a final
+    `done` event (or `error` if generation fails mid-stream). With a
+    `cursor`, streams the fill-in-the-middle insertion.
+    """
+    start_time = time.time()
+    
+    if not llm_configured():
+        analytics.track_request("completion", False, model=request.model)
+        raise HTTPException(
+            status_code=400,
+            detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+        )
+    
+    try:
+        window = _fim_window(request)
+        code = window.prefix + window.suffix if window else request.code
+        project_context, _ = await _project_context(request, window.context_code if window else None)
+        model_router = get_model_router()
+        decision = model_router.route("completion", request.model, code, request.context, max_output_tokens=500)
+        # Rejected up front (falling back to the next model) while the status code can still change
+        model, messages, usage = model_router.first_available(
+            decision, lambda model: _fit_messages(request, model, project_context, window)
+        )
+        llm = get_llm_client(model)
+    except ValueError as e:
+        analytics.track_request("completion", False, model=request.model)
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError as e:
+        analytics.track_request("completion", False, model=request.model)
+        raise upstream_http_error(e, "Completion")
+    
+    tokens = llm.generate_stream(messages, temperature=0.3, max_tokens=500, **_generate_options(request, window))
+    return sse_response(stream_llm_events(tokens, "completion", model, analytics, start_time, usage))
+
 @router.post("/complete/file", response_model=CompletionResponse)
 async def complete_file(request: FileRequest):
     """
@@ -101,10 +223,11 @@ async def complete_file(request: FileRequest):
     
     try:
         # Convert FileRequest to CodeRequest
-        code_request = CodeRequest(
+        code_request = CompletionRequest(
             code=request.file_content,
             context=f"File: {request.filename}. {request.context or ''}".strip(),
-            model=request.model
+            model=request.model,
+            filename=request.filename
         )
         
         # Use the existing complete_code function
@@ -113,8 +236,11 @@ async def complete_file(request: FileRequest):
         # Note: Analytics already tracked in complete_code function
         return result
         
+    except HTTPException:
+        # Already mapped to a status code (e.g. 400, 503) by the inner handler
+        raise
     except Exception as e:
-        analytics.track_request("completion", False)
+        analytics.track_request("completion", False, model=request.model)
         raise HTTPException(status_code=500, detail=f"File completion failed: {str(e)}")
 
 @router.get("/complete/examples")
@@ -142,18 +268,34 @@ async def get_completion_examples():
                     "code": "class Calculator:",
                     "context": "Simple calculator with basic operations"
                 }
+            },
+            {
+                "name": "Fill In The Middle",
+                "request": {
+                    "code": "def mean(values):\n    \n\nprint(mean([1, 2, 3]))\n",
+                    "cursor": 22
+                }
             }
         ]
     }
 
+@router.get("/complete/index")
+async def get_completion_index():
+    """Project symbol index used for completion context (refreshed if stale)"""
+    index = await asyncio.to_thread(get_symbol_index)
+    if index is None:
+        return {"enabled": False, "message": "Set CODEASSIST_PROJECT_ROOT to index a project"}
+    return {"enabled": True, **index.stats()}
+
 @router.get("/complete/stats")
 async def get_completion_analytics():
     """Get completion-specific analytics"""
-    stats = analytics.get_stats()
+    stats = await asyncio.to_thread(analytics.get_stats)
     return {
         "completion_requests": stats.get("completion_requests", 0),
         "total_requests": stats.get("total_requests", 0),
         "success_rate": stats.get("success_rate", 0),
         "average_response_time": stats.get("average_response_time", 0),
+        "response_time": stats.get("response_time_by_type", {}).get("completion", {}),
         "requests_per_day": stats.get("requests_per_day", 0)
     }
\ No newline at end of file
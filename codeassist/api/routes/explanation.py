@@ -1,15 +1,66 @@
 from fastapi import APIRouter, HTTPException
 import sys
-import os
+import time
 from pathlib import Path
 
 # Add parent directories to path for imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from api.models import CodeRequest, ExplanationResponse, FileRequest
-from models.llm_client import LLMClient
+from api.models import CodeRequest, ExplanationResponse, FileExplanationResponse, FileRequest
+from api.streaming import stream_llm_events, sse_response, text_stream
+from models.client_registry import get_llm_client
+from models.backends import llm_configured
+from api.errors import upstream_http_error
+from models.errors import LLMError
+from services.admission import OverloadedError
+from services.file_pipeline import FilePipeline
+from services.token_budget import fit_prompt, count_tokens
+from services.analytics import get_analytics_service
+from services.semantic_cache import get_semantic_cache
+from services.model_router import get_model_router
 
 router = APIRouter()
+analytics = get_analytics_service()
+
+def _build_explanation_messages(request: CodeRequest, code: str) -> list:
+    """Build the chat messages for an explanation request"""
+    prompt = f"Please explain what this Python code does:\n\n```python\n{code}\n```"
+    
+    if request.context:
+        prompt += f"\n\nContext: {request.context}"
+    
+    return [
+        {
+            "role": "system",
+            "content": """You are a helpful programming tutor. Explain code in clear, simple language that anyone can understand.
+            
+            Break down complex concepts and explain the purpose and functionality of the code step by step.
+            Use bullet points and clear sections to make it easy to follow.
+            
+            Focus on:
+            1. What the code does (high-level purpose)
+            2. How it works (step-by-step breakdown)
+            3. Key concepts or patterns used
+            4. Any important details or gotchas"""
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def _fit_explanation_messages(request: CodeRequest, model: str) -> tuple:
+    """Build messages that fit ``model``'s context window, plus a token estimate
+
+    Oversized code keeps its head and tail; the middle is elided.
+    """
+    return fit_prompt(
+        model,
+        request.code,
+        lambda code: _build_explanation_messages(request, code),
+        max_output_tokens=600,
+        keep="both"
+    )
 
 @router.post("/explain", response_model=ExplanationResponse)
 async def explain_code(request: CodeRequest):
@@ -18,62 +69,107 @@ async def explain_code(request: CodeRequest):
     
     - **code**: The code to explain
     - **context**: Optional context about the code's purpose
-    - **model**: OpenAI model to use (default: gpt-3.5-turbo)
+    - **model**: Model to use, or `auto` (default) to let the router choose
+    
+    Explanations of near-duplicates of earlier snippets (same code up to
+    formatting, comments and names) are served from the semantic cache.
     """
+    start_time = time.time()
+    
     try:
         # Check if API key is configured
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key == "your_openai_api_key_here":
+        if not llm_configured():
+            analytics.track_request("explanation", False, model=request.model)
             raise HTTPException(
                 status_code=400,
                 detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
             )
         
-        # Create LLM client
-        llm = LLMClient(model=request.model)
-        
-        # Build explanation prompt
-        prompt = f"Please explain what this Python code does:\n\n```python\n{request.code}\n```"
-        
-        if request.context:
-            prompt += f"\n\nContext: {request.context}"
-        
-        # Generate explanation
-        messages = [
-            {
-                "role": "system",
-                "content": """You are a helpful programming tutor. Explain code in clear, simple language that anyone can understand.
-                
-                Break down complex concepts and explain the purpose and functionality of the code step by step.
-                Use bullet points and clear sections to make it easy to follow.
-                
-                Focus on:
-                1. What the code does (high-level purpose)
-                2. How it works (step-by-step breakdown)
-                3. Key concepts or patterns used
-                4. Any important details or gotchas"""
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
+        semantic_cache = get_semantic_cache()
+        cached = semantic_cache.lookup("explain", request.model, request.code, request.context)
+        if cached is not None:
+            explanation, model = cached
+        else:
+            model_router = get_model_router()
+            decision = model_router.route("explain", request.model, request.code, request.context, max_output_tokens=600)
+            explanation, model, usage = await model_router.generate(
+                decision,
+                lambda model: _fit_explanation_messages(request, model),
+                temperature=0.5,
+                max_tokens=600,
+                client_factory=get_llm_client
+            )
+            explanation = explanation.strip()
+            analytics.track_tokens("explanation", usage["input_tokens"], count_tokens(explanation, model), model=model)
+            semantic_cache.store_response("explain", request.model, request.code, request.context, explanation, model)
         
-        explanation = await llm.generate(messages, temperature=0.5, max_tokens=600)
+        # Track successful request
+        response_time = time.time() - start_time
+        analytics.track_request("explanation", True, response_time, model=model)
         
         return ExplanationResponse(
             original_code=request.code,
             explanation=explanation,
-            model_used=request.model,
+            model_used=model,
             success=True
         )
         
+    except HTTPException:
+        raise
     except ValueError as e:
+        analytics.track_request("explanation", False, model=request.model)
         raise HTTPException(status_code=400, detail=str(e))
+    except (OverloadedError, LLMError) as e:
+        analytics.track_request("explanation", False, model=request.model)
+        raise upstream_http_error(e, "Explanation")
     except Exception as e:
+        analytics.track_request("explanation", False, model=request.model)
         raise HTTPException(status_code=500, detail=f"Explanation failed: {str(e)}")
 
-@router.post("/explain/file", response_model=ExplanationResponse)
+@router.post("/explain/stream")
+async def explain_code_stream(request: CodeRequest):
+    """
+    Explain code, streaming the explanation as Server-Sent Events
+    
+    Emits `token` events as the explanation is generated, then a final
+    `done` event (or `error` if generation fails mid-stream). Cached
+    explanations arrive as a single `token` event.
+    """
+    start_time = time.time()
+    
+    if not llm_configured():
+        analytics.track_request("explanation", False, model=request.model)
+        raise HTTPException(
+            status_code=400,
+            detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+        )
+    
+    semantic_cache = get_semantic_cache()
+    cached = semantic_cache.lookup("explain", request.model, request.code, request.context)
+    if cached is not None:
+        text, model = cached
+        return sse_response(stream_llm_events(text_stream(text), "explanation", model, analytics, start_time))
+    
+    try:
+        model_router = get_model_router()
+        decision = model_router.route("explain", request.model, request.code, request.context, max_output_tokens=600)
+        # Rejected up front (falling back to the next model) while the status code can still change
+        model, messages, usage = model_router.first_available(
+            decision, lambda model: _fit_explanation_messages(request, model)
+        )
+        llm = get_llm_client(model)
+    except ValueError as e:
+        analytics.track_request("explanation", False, model=request.model)
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError as e:
+        analytics.track_request("explanation", False, model=request.model)
+        raise upstream_http_error(e, "Explanation")
+    
+    tokens = llm.generate_stream(messages, temperature=0.5, max_tokens=600)
+    remember = lambda explanation: semantic_cache.store_response("explain", request.model, request.code, request.context, explanation, model)
+    return sse_response(stream_llm_events(tokens, "explanation", model, analytics, start_time, usage, on_done=remember))
+
+@router.post("/explain/file", response_model=FileExplanationResponse)
 async def explain_file(request: FileRequest):
     """
     Explain code from file content
@@ -82,19 +178,51 @@ async def explain_file(request: FileRequest):
     - **filename**: Optional filename for context
     - **context**: Optional additional context
     - **model**: OpenAI model to use
+    
+    The file is split at function and class boundaries and the sections are
+    processed concurrently, then merged into a single report.
     """
+    start_time = time.time()
+    
     try:
-        # Convert FileRequest to CodeRequest
-        code_request = CodeRequest(
-            code=request.file_content,
-            context=f"File: {request.filename}. {request.context or ''}".strip(),
-            model=request.model
+        # Check if API key is configured
+        if not llm_configured():
+            analytics.track_request("explanation", False, model=request.model)
+            raise HTTPException(
+                status_code=400,
+                detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+            )
+        
+        # Sections are small, but the whole file decides the tier (large reviews need long context)
+        model = get_model_router().route("explain", request.model, request.file_content, request.context).model
+        llm = get_llm_client(model)
+        result = await FilePipeline(llm, task="explain").run(
+            request.file_content, filename=request.filename, context=request.context
         )
         
-        # Use the existing explain_code function
-        return await explain_code(code_request)
+        response_time = time.time() - start_time
+        analytics.track_request("explanation", True, response_time, model=model)
+        analytics.track_tokens("explanation", result["pipeline"]["input_tokens"], result["pipeline"]["output_tokens"], model=model)
+        
+        return FileExplanationResponse(
+            original_code=request.file_content,
+            explanation=result["report"],
+            model_used=model,
+            success=True,
+            chunks=result["chunks"],
+            pipeline=result["pipeline"]
+        )
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        analytics.track_request("explanation", False, model=request.model)
+        raise HTTPException(status_code=400, detail=str(e))
+    except (OverloadedError, LLMError) as e:
+        analytics.track_request("explanation", False, model=request.model)
+        raise upstream_http_error(e, "File explanation")
     except Exception as e:
+        analytics.track_request("explanation", False, model=request.model)
         raise HTTPException(status_code=500, detail=f"File explanation failed: {str(e)}")
 
 @router.get("/explain/examples")
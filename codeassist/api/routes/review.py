@@ -1,18 +1,72 @@
 from fastapi import APIRouter, HTTPException
-import sys
+import asyncio
 import os
+import sys
 import time
 from pathlib import Path
 
 # Add parent directories to path for imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from api.models import CodeRequest, ReviewResponse, FileRequest
-from models.llm_client import LLMClient
-from services.analytics import AnalyticsService
+from api.models import CodeRequest, ReviewResponse, FileReviewResponse, FileRequest, DiffReviewRequest, DiffReviewResponse
+from api.streaming import stream_llm_events, sse_response, text_stream
+from models.client_registry import get_llm_client
+from models.backends import llm_configured
+from api.errors import upstream_http_error
+from models.errors import LLMError
+from services.admission import OverloadedError
+from services.file_pipeline import FilePipeline
+from services.diff_review import DiffReview, get_diff_cache, git_diff, git_file
+from services.token_budget import fit_prompt, count_tokens
+from services.analytics import get_analytics_service
+from services.static_checks import analyze
+from services.semantic_cache import get_semantic_cache
+from services.model_router import get_model_router
 
 router = APIRouter()
-analytics = AnalyticsService()
+analytics = get_analytics_service()
+
+def _build_review_messages(request: CodeRequest, code: str, notes: str = "") -> list:
+    """Build the chat messages for a review request"""
+    prompt = f"Please review this Python code:\n\n```python\n{code}\n```"
+    
+    if request.context:
+        prompt += f"\n\nContext: {request.context}"
+    
+    if notes:
+        prompt += f"\n\n{notes}"
+    
+    return [
+        {
+            "role": "system",
+            "content": """You are an expert code reviewer. Analyze the code for:
+            1. Code quality and best practices
+            2. Performance issues
+            3. Security vulnerabilities
+            4. Readability and maintainability
+            5. Potential bugs or edge cases
+            
+            Provide constructive feedback with specific suggestions for improvement.
+            Format your response clearly with sections and actionable advice."""
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def _fit_review_messages(request: CodeRequest, model: str, notes: str = "") -> tuple:
+    """Build messages that fit ``model``'s context window, plus a token estimate
+
+    Oversized code keeps its head and tail; the middle is elided.
+    """
+    return fit_prompt(
+        model,
+        request.code,
+        lambda code: _build_review_messages(request, code, notes),
+        max_output_tokens=800,
+        keep="both"
+    )
 
 @router.post("/review", response_model=ReviewResponse)
 async def review_code(request: CodeRequest):
@@ -21,70 +75,129 @@ async def review_code(request: CodeRequest):
     
     - **code**: The code to review
     - **context**: Optional context about the code
-    - **model**: OpenAI model to use (default: gpt-3.5-turbo)
+    - **model**: Model to use, or `auto` (default) to let the router choose
+    
+    The code is parsed and checked locally first. Code that does not parse,
+    and tiny snippets with clear-cut findings, are answered without the
+    LLM; otherwise the findings are passed along in the prompt. Reviews
+    of near-duplicates of earlier snippets are served from the semantic
+    cache.
     """
     start_time = time.time()
+    analysis = analyze(request.code)
+    static_findings = [issue.to_dict() for issue in analysis.issues]
+    
+    if analysis.answers_locally:
+        analytics.track_request("review", True, time.time() - start_time, model="static")
+        return ReviewResponse(
+            original_code=request.code,
+            review=analysis.report(),
+            model_used="static",
+            success=True,
+            static_findings=static_findings,
+            llm_used=False
+        )
     
     try:
         # Check if API key is configured
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or api_key == "your_openai_api_key_here":
-            analytics.track_request("review", False)
+        if not llm_configured():
+            analytics.track_request("review", False, model=request.model)
             raise HTTPException(
                 status_code=400,
                 detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
             )
         
-        # Create LLM client
-        llm = LLMClient(model=request.model)
-        
-        # Build review prompt
-        prompt = f"Please review this Python code:\n\n```python\n{request.code}\n```"
-        
-        if request.context:
-            prompt += f"\n\nContext: {request.context}"
-        
-        # Generate review
-        messages = [
-            {
-                "role": "system",
-                "content": """You are an expert code reviewer. Analyze the code for:
-                1. Code quality and best practices
-                2. Performance issues
-                3. Security vulnerabilities
-                4. Readability and maintainability
-                5. Potential bugs or edge cases
-                
-                Provide constructive feedback with specific suggestions for improvement.
-                Format your response clearly with sections and actionable advice."""
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-        
-        review = await llm.generate(messages, temperature=0.3, max_tokens=800)
+        semantic_cache = get_semantic_cache()
+        cached = semantic_cache.lookup("review", request.model, request.code, request.context)
+        if cached is not None:
+            review, model = cached
+        else:
+            model_router = get_model_router()
+            decision = model_router.route("review", request.model, request.code, request.context, max_output_tokens=800)
+            review, model, usage = await model_router.generate(
+                decision,
+                lambda model: _fit_review_messages(request, model, analysis.prompt_notes()),
+                temperature=0.3,
+                max_tokens=800,
+                client_factory=get_llm_client
+            )
+            review = review.strip()
+            analytics.track_tokens("review", usage["input_tokens"], count_tokens(review, model), model=model)
+            semantic_cache.store_response("review", request.model, request.code, request.context, review, model)
         
         # Track successful request
         response_time = time.time() - start_time
-        analytics.track_request("review", True, response_time)
+        analytics.track_request("review", True, response_time, model=model)
         
         return ReviewResponse(
             original_code=request.code,
             review=review,
-            model_used=request.model,
-            success=True
+            model_used=model,
+            success=True,
+            static_findings=static_findings
         )
         
+    except HTTPException:
+        raise
     except ValueError as e:
-        analytics.track_request("review", False)
+        analytics.track_request("review", False, model=request.model)
         raise HTTPException(status_code=400, detail=str(e))
+    except (OverloadedError, LLMError) as e:
+        analytics.track_request("review", False, model=request.model)
+        raise upstream_http_error(e, "Review")
     except Exception as e:
-        analytics.track_request("review", False)
+        analytics.track_request("review", False, model=request.model)
         raise HTTPException(status_code=500, detail=f"Review failed: {str(e)}")
 
-@router.post("/review/file", response_model=ReviewResponse)
+@router.post("/review/stream")
+async def review_code_stream(request: CodeRequest):
+    """
+    Review code, streaming the review as Server-Sent Events
+    
+    Emits `token` events as the review is generated, then a final
+    `done` event (or `error` if generation fails mid-stream). Reviews
+    answered by static analysis or the semantic cache arrive as a single
+    `token` event.
+    """
+    start_time = time.time()
+    analysis = analyze(request.code)
+    
+    if analysis.answers_locally:
+        return sse_response(stream_llm_events(text_stream(analysis.report()), "review", "static", analytics, start_time))
+    
+    if not llm_configured():
+        analytics.track_request("review", False, model=request.model)
+        raise HTTPException(
+            status_code=400,
+            detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+        )
+    
+    semantic_cache = get_semantic_cache()
+    cached = semantic_cache.lookup("review", request.model, request.code, request.context)
+    if cached is not None:
+        text, model = cached
+        return sse_response(stream_llm_events(text_stream(text), "review", model, analytics, start_time))
+    
+    try:
+        model_router = get_model_router()
+        decision = model_router.route("review", request.model, request.code, request.context, max_output_tokens=800)
+        # Rejected up front (falling back to the next model) while the status code can still change
+        model, messages, usage = model_router.first_available(
+            decision, lambda model: _fit_review_messages(request, model, analysis.prompt_notes())
+        )
+        llm = get_llm_client(model)
+    except ValueError as e:
+        analytics.track_request("review", False, model=request.model)
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverloadedError as e:
+        analytics.track_request("review", False, model=request.model)
+        raise upstream_http_error(e, "Review")
+    
+    tokens = llm.generate_stream(messages, temperature=0.3, max_tokens=800)
+    remember = lambda review: semantic_cache.store_response("review", request.model, request.code, request.context, review, model)
+    return sse_response(stream_llm_events(tokens, "review", model, analytics, start_time, usage, on_done=remember))
+
+@router.post("/review/file", response_model=FileReviewResponse)
 async def review_file(request: FileRequest):
     """
     Review code from file content
@@ -93,22 +206,125 @@ async def review_file(request: FileRequest):
     - **filename**: Optional filename for context
     - **context**: Optional additional context
     - **model**: OpenAI model to use
+    
+    The file is split at function and class boundaries and the sections are
+    processed concurrently, then merged into a single report.
     """
+    start_time = time.time()
+    
     try:
-        # Convert FileRequest to CodeRequest
-        code_request = CodeRequest(
-            code=request.file_content,
-            context=f"File: {request.filename}. {request.context or ''}".strip(),
-            model=request.model
+        # Check if API key is configured
+        if not llm_configured():
+            analytics.track_request("review", False, model=request.model)
+            raise HTTPException(
+                status_code=400,
+                detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+            )
+        
+        # Sections are small, but the whole file decides the tier (large reviews need long context)
+        model = get_model_router().route("review", request.model, request.file_content, request.context).model
+        llm = get_llm_client(model)
+        result = await FilePipeline(llm, task="review").run(
+            request.file_content, filename=request.filename, context=request.context
         )
         
-        # Use the existing review_code function
-        return await review_code(code_request)
+        response_time = time.time() - start_time
+        analytics.track_request("review", True, response_time, model=model)
+        analytics.track_tokens("review", result["pipeline"]["input_tokens"], result["pipeline"]["output_tokens"], model=model)
+        
+        return FileReviewResponse(
+            original_code=request.file_content,
+            review=result["report"],
+            model_used=model,
+            success=True,
+            findings=result["findings"],
+            chunks=result["chunks"],
+            pipeline=result["pipeline"]
+        )
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        analytics.track_request("review", False, model=request.model)
+        raise HTTPException(status_code=400, detail=str(e))
+    except (OverloadedError, LLMError) as e:
+        analytics.track_request("review", False, model=request.model)
+        raise upstream_http_error(e, "File review")
     except Exception as e:
-        analytics.track_request("review", False)
+        analytics.track_request("review", False, model=request.model)
         raise HTTPException(status_code=500, detail=f"File review failed: {str(e)}")
 
+@router.post("/review/diff", response_model=DiffReviewResponse)
+async def review_diff(request: DiffReviewRequest):
+    """
+    Review only the changed regions of a diff
+    
+    - **diff**: A unified diff, or
+    - **base** / **head**: Git revisions in the server's project root (`CODEASSIST_PROJECT_ROOT`); without `head` the working tree is compared
+    - **files**: New contents of changed files, so hunks map to their enclosing functions
+    - **context**: Optional additional context
+    - **model**: Model to use, or `auto` (default) to let the router choose
+    
+    Each hunk is widened to its enclosing function (or a few lines of
+    context) and only those regions are reviewed. A region's review is keyed
+    by its code and changes, so re-reviewing a later commit of the same
+    branch reuses the results for regions it did not touch.
+    """
+    start_time = time.time()
+    
+    try:
+        if not llm_configured():
+            analytics.track_request("review", False, model=request.model)
+            raise HTTPException(
+                status_code=400,
+                detail="OpenAI API key not configured. Set OPENAI_API_KEY environment variable."
+            )
+        
+        files = dict(request.files)
+        if request.diff is not None:
+            diff = request.diff
+            read_file = files.get
+        elif request.base:
+            root = os.getenv("CODEASSIST_PROJECT_ROOT")
+            if not root:
+                raise ValueError("Reviewing git revisions needs CODEASSIST_PROJECT_ROOT to be set on the server")
+            diff = await asyncio.to_thread(git_diff, root, request.base, request.head)
+            read_file = lambda path: files[path] if path in files else git_file(root, path, request.head)
+        else:
+            raise ValueError("Provide either a diff or a base revision")
+        
+        # Route on the changed text; the regions sent are a fraction of it
+        model = get_model_router().route("review", request.model, diff, request.context).model
+        llm = get_llm_client(model)
+        result = await DiffReview(llm, cache=get_diff_cache(), context=request.context).run(diff, read_file)
+        
+        success = result["stats"]["failed_regions"] == 0
+        response_time = time.time() - start_time
+        analytics.track_request("review", success, response_time, model=model)
+        analytics.track_tokens("review", result["stats"]["input_tokens"], result["stats"]["output_tokens"], model=model)
+        
+        return DiffReviewResponse(
+            review=result["report"],
+            model_used=model,
+            success=success,
+            findings=result["findings"],
+            static_findings=result["static_findings"],
+            regions=result["regions"],
+            stats=result["stats"]
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        analytics.track_request("review", False, model=request.model)
+        raise HTTPException(status_code=400, detail=str(e))
+    except (OverloadedError, LLMError) as e:
+        analytics.track_request("review", False, model=request.model)
+        raise upstream_http_error(e, "Diff review")
+    except Exception as e:
+        analytics.track_request("review", False, model=request.model)
+        raise HTTPException(status_code=500, detail=f"Diff review failed: {str(e)}")
+
 @router.get("/review/examples")
 async def get_review_examples():
     """Get example requests for code review"""
@@ -141,10 +357,11 @@ async def get_review_examples():
 @router.get("/review/stats")
 async def get_review_analytics():
     """Get review-specific analytics"""
-    stats = analytics.get_stats()
+    stats = await asyncio.to_thread(analytics.get_stats)
     return {
         "review_requests": stats.get("review_requests", 0),
         "total_requests": stats.get("total_requests", 0),
         "success_rate": stats.get("success_rate", 0),
-        "average_response_time": stats.get("average_response_time", 0)
+        "average_response_time": stats.get("average_response_time", 0),
+        "response_time": stats.get("response_time_by_type", {}).get("review", {})
     }
\ No newline at end of file
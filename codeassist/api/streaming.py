@@ -0,0 +1,86 @@
+import json
+import time
+from typing import AsyncIterator, Callable, Dict, Any, Optional
+
+from fastapi.responses import StreamingResponse
+
+from services.metrics import get_metrics_registry, mark_outcome
+from services.token_budget import count_tokens
+
+
+def time_to_first_token_histogram():
+    return get_metrics_registry().histogram(
+        "codeassist_time_to_first_token_seconds", "Time from request to first streamed token",
+        ("request_type", "model"),
+    )
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_llm_events(
+    tokens: AsyncIterator[str],
+    request_type: str,
+    model: str,
+    analytics,
+    start_time: float,
+    usage: Optional[Dict[str, int]] = None,
+    on_done: Optional[Callable[[str], None]] = None
+) -> AsyncIterator[str]:
+    """Relay LLM tokens as SSE ``token`` events, ending with ``done`` or ``error``
+
+    Time-to-first-token is recorded in analytics as soon as the first token
+    arrives; the full request (and its estimated tokens, given ``usage``
+    from ``fit_prompt``) is tracked once the stream finishes. ``on_done``
+    receives the full text of a successful stream.
+    """
+    time_to_first_token = None
+    parts = []
+
+    try:
+        async for token in tokens:
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+                analytics.track_first_token(request_type, time_to_first_token, model=model)
+                time_to_first_token_histogram().observe(time_to_first_token, request_type=request_type, model=model)
+            parts.append(token)
+            yield sse_event("token", {"content": token})
+    except Exception as e:
+        analytics.track_request(request_type, False, model=model)
+        # Headers already went out as 200; record the failure for metrics
+        mark_outcome("upstream_error")
+        yield sse_event("error", {
+            "error": str(e),
+            "retryable": getattr(e, "retryable", False),
+            "success": False
+        })
+        return
+
+    response_time = time.time() - start_time
+    analytics.track_request(request_type, True, response_time, model=model)
+    if on_done is not None:
+        on_done("".join(parts))
+    if usage is not None:
+        analytics.track_tokens(request_type, usage["input_tokens"], count_tokens("".join(parts), model), model=model)
+    yield sse_event("done", {
+        "model_used": model,
+        "success": True,
+        "time_to_first_token": round(time_to_first_token or response_time, 3),
+        "response_time": round(response_time, 3)
+    })
+
+
+async def text_stream(text: str) -> AsyncIterator[str]:
+    """A ready answer (static analysis, cache hit) as a one-token stream"""
+    yield text
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an SSE generator in a response that proxies won't buffer"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
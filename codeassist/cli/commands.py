@@ -1,28 +1,88 @@
 import click
 from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.panel import Panel
-from rich.syntax import Syntax
-import asyncio
 import os
-from dotenv import load_dotenv
+import time
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 
-load_dotenv()
+# Anything slower than this (rich.progress, rich.syntax, asyncio, dotenv, the
+# LLM client) is imported inside the commands that use it, so quick commands
+# start fast. `codeassist --profile-startup <command>` shows where time goes.
 console = Console()
 
+def _daemon_call(request: dict):
+    """Forward a request to the background daemon; None when it is not running"""
+    from cli import daemon
+    if not daemon.forwarding_enabled():
+        return None
+    reply = daemon.call(request)
+    if reply is not None and not reply.get("ok"):
+        raise RuntimeError(reply.get("error", "Daemon request failed"))
+    return reply
+
+def _llm_available() -> bool:
+    """A running daemon has its own configuration; otherwise check ours"""
+    from cli import daemon
+    if daemon.forwarding_enabled() and daemon.call({"op": "status"}, timeout=2) is not None:
+        return True
+    from models.backends import llm_configured
+    return llm_configured()
+
+def _generate(messages: list, temperature: float, max_tokens: int) -> str:
+    """Generate in the daemon when it is running, else in this process"""
+    reply = _daemon_call({"op": "generate", "messages": messages, "temperature": temperature, "max_tokens": max_tokens})
+    if reply is not None:
+        return reply["text"].strip()
+    # Import here to avoid import errors if OpenAI isn't installed
+    import asyncio
+    from models.llm_client import LLMClient
+    return asyncio.run(LLMClient().generate(messages, temperature=temperature, max_tokens=max_tokens)).strip()
+
+def _project_context(root: Path, code: str, relative) -> dict:
+    """Relevant project definitions, from the daemon's warm index when it is running"""
+    reply = _daemon_call({"op": "context", "root": str(root), "code": code, "filename": relative})
+    if reply is not None:
+        return reply
+    from services.symbol_index import SymbolIndex
+    index = SymbolIndex(str(root))
+    changes = index.update()
+    text, symbols = index.context_for(code, exclude_path=relative)
+    return {
+        "text": text,
+        "symbols": [[symbol.qualname, symbol.path, symbol.line] for symbol in symbols],
+        "indexed": index.stats()["symbols"],
+        "root": str(index.root),
+        "parsed": changes["parsed"],
+        "elapsed_ms": changes["elapsed_ms"],
+    }
+
+def _profile_startup(ctx, param, value):
+    """Re-run the command in a fresh interpreter and print its import-time breakdown"""
+    if not value or ctx.resilient_parsing:
+        return
+    from services.startup_profile import profile_startup, format_report
+    args = [arg for arg in sys.argv[1:] if arg != "--profile-startup"]
+    profile = profile_startup([str(Path(__file__).resolve())] + args)
+    click.echo(profile["stdout"], nl=False)
+    if profile["stderr"]:
+        click.echo(profile["stderr"], err=True)
+    click.echo("\n" + format_report(profile))
+    ctx.exit(profile["returncode"])
+
 @click.group()
 @click.version_option(version="0.1.0")
+@click.option('--profile-startup', is_flag=True, is_eager=True, expose_value=False, callback=_profile_startup,
+              help='Run the command and print where its startup time went')
 def main():
     """🚀 CodeAssist: LLM-Based Code Completion and Review Tool
     
     AI-powered code completion, review, and explanation.
     """
-    pass
+    from dotenv import load_dotenv
+    load_dotenv()
 
 @main.command()
 def hello():
@@ -42,8 +102,14 @@ def hello():
 @main.command()
 @click.argument('code', required=False)
 @click.option('--file', '-f', type=click.Path(exists=True), help='Complete code from file')
-def complete(code, file):
+@click.option('--root', type=click.Path(exists=True, file_okay=False), help='Project to retrieve definitions from (default: detected from --file)')
+@click.option('--no-index', is_flag=True, help='Do not add project definitions to the prompt')
+def complete(code, file, root, no_index):
     """✨ Complete your code with AI assistance"""
+    from rich.panel import Panel
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.syntax import Syntax
+
     if not code and not file:
         console.print("❌ Please provide code to complete")
         console.print("💡 Examples:")
@@ -52,8 +118,7 @@ def complete(code, file):
         return
     
     # Check API key first
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key == "your_openai_api_key_here":
+    if not _llm_available():
         console.print("❌ [red]OpenAI API key not configured[/red]")
         console.print("💡 Set your API key in .env file: OPENAI_API_KEY=your_key")
         console.print("🔗 Get your key at: https://platform.openai.com/api-keys")
@@ -63,6 +128,21 @@ def complete(code, file):
         code = Path(file).read_text()
         console.print(f"📁 Completing code from: {file}")
     
+    project_context, symbols = "", []
+    if not no_index and (root or file):
+        from services.symbol_index import find_project_root
+        project_root = Path(root or find_project_root(file)).resolve()
+        relative = None
+        if file:
+            try:
+                relative = Path(file).resolve().relative_to(project_root).as_posix()
+            except ValueError:
+                pass
+        found = _project_context(project_root, code, relative)
+        project_context, symbols = found["text"], found["symbols"]
+        console.print(f"🗂️  Indexed {found['indexed']} symbols in {found['root']} "
+                      f"({found['parsed']} files re-parsed, {found['elapsed_ms']}ms)")
+    
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -71,12 +151,6 @@ def complete(code, file):
         task = progress.add_task("🤖 AI is completing your code...", total=None)
         
         try:
-            # Import here to avoid import errors if OpenAI isn't installed
-            from models.llm_client import LLMClient
-            
-            # Simple completion for now
-            llm = LLMClient()
-            
             messages = [
                 {
                     "role": "system",
@@ -84,11 +158,12 @@ def complete(code, file):
                 },
                 {
                     "role": "user",
-                    "content": f"Complete this Python code:\n\n```python\n{code}\n```\n\nProvide only the completion code, properly formatted and indented."
+                    "content": (f"Relevant definitions from this project:\n\n```python\n{project_context}\n```\n\n" if project_context else "")
+                    + f"Complete this Python code:\n\n```python\n{code}\n```\n\nProvide only the completion code, properly formatted and indented."
                 }
             ]
             
-            completion = asyncio.run(llm.generate(messages, temperature=0.3, max_tokens=500))
+            completion = _generate(messages, temperature=0.3, max_tokens=500)
             progress.stop()
             
             # Display original code
@@ -100,35 +175,215 @@ def complete(code, file):
             console.print("\n✨ [bold green]AI Completion:[/bold green]")
             completion_syntax = Syntax(completion, "python", theme="monokai", line_numbers=True)
             console.print(Panel(completion_syntax, border_style="green"))
+            if symbols:
+                console.print("📚 Context: " + ", ".join(f"{qualname} ({path}:{line})" for qualname, path, line in symbols))
             
         except Exception as e:
             progress.stop()
             console.print(f"❌ [red]Error: {str(e)}[/red]")
             console.print("💡 Make sure your OpenAI API key is valid and you have credits")
 
+def _is_directory(value) -> bool:
+    try:
+        return bool(value) and "\n" not in value and Path(value).is_dir()
+    except (OSError, ValueError):
+        return False
+
+def _review_directory(root: Path, include, exclude, concurrency, output, report_format, no_cache):
+    """Review every matching file under ``root`` and print or write the combined report"""
+    import asyncio
+    import json
+    from rich.markdown import Markdown
+    from rich.progress import BarColumn, MofNCompleteColumn, Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+    from services.directory_review import DEFAULT_CONCURRENCY, DirectoryReview, discover_files, render_markdown, review_cache_for
+    
+    files = discover_files(root, include, exclude)
+    if not files:
+        console.print(f"❌ No files in {root} match {', '.join(include) or '*.py'}")
+        return
+    
+    from models.backends import llm_configured
+    if not llm_configured():
+        console.print("❌ [red]OpenAI API key not configured[/red]")
+        console.print("💡 Set your API key in .env file: OPENAI_API_KEY=your_key")
+        return
+    
+    console.print(f"📂 Reviewing {len(files)} file(s) in {root}")
+    
+    async def run():
+        # One event loop for the whole tree, so clients and connections are reused
+        from models.client_registry import close_client_registry, get_llm_client
+        from services.model_router import get_model_router
+        router = get_model_router()
+        review = DirectoryReview(
+            root,
+            model_for=lambda content: router.route("review", "auto", content).model,
+            client_for=get_llm_client,
+            concurrency=concurrency or DEFAULT_CONCURRENCY,
+            cache=None if no_cache else review_cache_for(root),
+        )
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            console=console,
+        ) as progress:
+            task = progress.add_task("🔍 Reviewing files...", total=len(files))
+            on_result = lambda result: progress.update(task, advance=1, description=f"🔍 {result['path']}")
+            try:
+                return await review.run(files, on_result=on_result)
+            finally:
+                await close_client_registry()
+    
+    report = asyncio.run(run())
+    summary = report["summary"]
+    console.print(f"✅ {summary['files']} file(s): {summary['reviewed']} reviewed, {summary['cached']} unchanged, "
+                  f"{summary['failed']} failed · {summary['findings'] + summary['static_findings']} finding(s) "
+                  f"in {summary['elapsed_seconds']}s")
+    
+    report_format = report_format or ("json" if output and output.endswith(".json") else "markdown")
+    text = json.dumps(report, indent=2) if report_format == "json" else render_markdown(report)
+    if output:
+        Path(output).write_text(text)
+        console.print(f"📝 Report written to {output}")
+    elif report_format == "json":
+        click.echo(text)
+    else:
+        console.print(Markdown(text))
+
+def _review_diff(diff_file, base, head, concurrency, output, report_format, no_cache):
+    """Review only the regions a diff (or ``base..head``) changed and print or write the report"""
+    import asyncio
+    import json
+    from rich.markdown import Markdown
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from services.diff_review import DiffReview, diff_cache_for, git_diff, git_file, git_toplevel
+    from services.file_pipeline import CHUNK_CONCURRENCY
+    
+    try:
+        root = git_toplevel(os.getcwd())
+    except ValueError:
+        if diff_file is None:
+            console.print("❌ [red]--base needs to run inside a git repository[/red]")
+            return
+        root = os.getcwd()
+    try:
+        diff = diff_file.read() if diff_file is not None else git_diff(root, base, head)
+    except ValueError as e:
+        console.print(f"❌ [red]{e}[/red]")
+        return
+    if not diff.strip():
+        console.print("✅ No changes to review")
+        return
+    
+    from models.backends import llm_configured
+    if not llm_configured():
+        console.print("❌ [red]OpenAI API key not configured[/red]")
+        console.print("💡 Set your API key in .env file: OPENAI_API_KEY=your_key")
+        return
+    
+    # A diff read from a file describes the working tree; revisions name their own files
+    read_file = lambda path: git_file(root, path, head if diff_file is None else None)
+    
+    async def run():
+        from models.client_registry import close_client_registry, get_llm_client
+        from services.model_router import get_model_router
+        model = get_model_router().route("review", "auto", diff).model
+        review = DiffReview(
+            get_llm_client(model),
+            cache=None if no_cache else diff_cache_for(Path(root)),
+            concurrency=concurrency or CHUNK_CONCURRENCY,
+        )
+        try:
+            return await review.run(diff, read_file)
+        finally:
+            await close_client_registry()
+    
+    with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
+        progress.add_task("🔍 Reviewing changed regions...", total=None)
+        try:
+            result = asyncio.run(run())
+        except Exception as e:
+            progress.stop()
+            console.print(f"❌ [red]Error: {str(e)}[/red]")
+            return
+    stats = result["stats"]
+    console.print(f"✅ {stats['regions']} region(s) in {stats['files']} file(s): {stats['cached_regions']} unchanged since "
+                  f"an earlier review, {stats['failed_regions']} failed · sent {stats['sent_lines']} of "
+                  f"{stats['file_lines']} line(s) in {stats['elapsed_seconds']}s")
+    
+    report_format = report_format or ("json" if output and output.endswith(".json") else "markdown")
+    text = json.dumps(result, indent=2) if report_format == "json" else result["report"] + "\n"
+    if output:
+        Path(output).write_text(text)
+        console.print(f"📝 Report written to {output}")
+    elif report_format == "json":
+        click.echo(text)
+    else:
+        console.print(Markdown(text))
+
 @main.command()
 @click.argument('code', required=False)
 @click.option('--file', '-f', type=click.Path(exists=True), help='Review code from file')
-def review(code, file):
-    """🔍 Review your code and get improvement suggestions"""
+@click.option('--diff', 'diff_file', type=click.File('r'), help="Review only the changes in this unified diff ('-' for stdin)")
+@click.option('--base', help='Review only the changes since this git revision')
+@click.option('--head', help='With --base: review changes up to this revision instead of the working tree')
+@click.option('--include', '-i', multiple=True, help='Directory mode: glob of files to review (default *.py; repeatable)')
+@click.option('--exclude', '-x', multiple=True, help='Directory mode: glob of files to skip (repeatable)')
+@click.option('--concurrency', '-j', type=int, help='Directory and diff mode: files or regions reviewed at once (default 4)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Directory and diff mode: write the combined report to this file')
+@click.option('--format', 'report_format', type=click.Choice(['markdown', 'json']), help='Directory and diff mode: report format (default from --output extension, else markdown)')
+@click.option('--no-cache', is_flag=True, help='Directory and diff mode: review unchanged files and regions again')
+def review(code, file, diff_file, base, head, include, exclude, concurrency, output, report_format, no_cache):
+    """🔍 Review your code and get improvement suggestions
+    
+    CODE may also be a directory: every matching file is reviewed and the
+    results are combined into one report. With --diff or --base only the
+    changed functions are reviewed, and regions unchanged since an earlier
+    review reuse its findings.
+    """
+    from rich.panel import Panel
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.syntax import Syntax
+
+    if diff_file is not None or base:
+        _review_diff(diff_file, base, head, concurrency, output, report_format, no_cache)
+        return
+    
     if not code and not file:
         console.print("❌ Please provide code to review")
         console.print("💡 Examples:")
         console.print("  codeassist review 'for i in range(len(data)): print(data[i])'")
         console.print("  codeassist review --file script.py")
+        console.print("  codeassist review src/ --exclude 'tests/*' -o review.md")
+        console.print("  codeassist review --base main")
         return
     
-    # Check API key first
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key == "your_openai_api_key_here":
-        console.print("❌ [red]OpenAI API key not configured[/red]")
-        console.print("💡 Set your API key in .env file: OPENAI_API_KEY=your_key")
+    target = file or code
+    if _is_directory(target):
+        _review_directory(Path(target).resolve(), include, exclude, concurrency, output, report_format, no_cache)
         return
     
     if file:
         code = Path(file).read_text()
         console.print(f"📁 Reviewing code from: {file}")
     
+    # Local checks first: syntax errors and clear-cut findings need no API call
+    from services.static_checks import analyze
+    analysis = analyze(code)
+    if analysis.answers_locally:
+        console.print("\n🔍 [bold yellow]Static Analysis:[/bold yellow]")
+        console.print(Panel(analysis.report(), border_style="yellow", title="Review Results"))
+        return
+    
+    # Check API key first
+    if not _llm_available():
+        console.print("❌ [red]OpenAI API key not configured[/red]")
+        console.print("💡 Set your API key in .env file: OPENAI_API_KEY=your_key")
+        return
+    
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -137,10 +392,6 @@ def review(code, file):
         task = progress.add_task("🔍 AI is analyzing your code...", total=None)
         
         try:
-            from models.llm_client import LLMClient
-            
-            llm = LLMClient()
-            
             messages = [
                 {
                     "role": "system",
@@ -156,10 +407,11 @@ def review(code, file):
                 {
                     "role": "user",
                     "content": f"Please review this Python code:\n\n```python\n{code}\n```"
+                    + (f"\n\n{analysis.prompt_notes()}" if analysis.issues else "")
                 }
             ]
             
-            review = asyncio.run(llm.generate(messages, temperature=0.3, max_tokens=800))
+            review = _generate(messages, temperature=0.3, max_tokens=800)
             progress.stop()
             
             # Display code being reviewed
@@ -170,6 +422,8 @@ def review(code, file):
             # Display review
             console.print("\n🔍 [bold yellow]AI Code Review:[/bold yellow]")
             console.print(Panel(review, border_style="yellow", title="Review Results"))
+            if analysis.issues:
+                console.print(Panel(analysis.report(), border_style="cyan", title="Static Analysis"))
             
         except Exception as e:
             progress.stop()
@@ -181,6 +435,10 @@ def review(code, file):
 @click.option('--file', '-f', type=click.Path(exists=True), help='Explain code from file')
 def explain(code, file):
     """📚 Get natural language explanation of your code"""
+    from rich.panel import Panel
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.syntax import Syntax
+
     if not code and not file:
         console.print("❌ Please provide code to explain")
         console.print("💡 Examples:")
@@ -189,8 +447,7 @@ def explain(code, file):
         return
     
     # Check API key first
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key == "your_openai_api_key_here":
+    if not _llm_available():
         console.print("❌ [red]OpenAI API key not configured[/red]")
         console.print("💡 Set your API key in .env file: OPENAI_API_KEY=your_key")
         return
@@ -207,10 +464,6 @@ def explain(code, file):
         task = progress.add_task("📚 AI is explaining your code...", total=None)
         
         try:
-            from models.llm_client import LLMClient
-            
-            llm = LLMClient()
-            
             messages = [
                 {
                     "role": "system",
@@ -223,7 +476,7 @@ def explain(code, file):
                 }
             ]
             
-            explanation = asyncio.run(llm.generate(messages, temperature=0.5, max_tokens=600))
+            explanation = _generate(messages, temperature=0.5, max_tokens=600)
             progress.stop()
             
             # Display code being explained
@@ -246,6 +499,10 @@ def status():
     console.print("\n🚀 [bold blue]CodeAssist Status[/bold blue]")
     console.print("📦 Version: 0.1.0")
     
+    backend = os.getenv("CODEASSIST_LLM_BACKEND", "openai")
+    if backend != "openai":
+        console.print(f"🔌 LLM backend: {backend}")
+    
     # Check API key
     api_key = os.getenv("OPENAI_API_KEY")
     if api_key and api_key != "your_openai_api_key_here":
@@ -256,12 +513,61 @@ def status():
         console.print("💡 Set your API key in .env file")
         console.print("🔗 Get your key at: https://platform.openai.com/api-keys")
     
+    from cli import daemon
+    started = time.perf_counter()
+    info = daemon.call({"op": "status"}, timeout=2)
+    if info is not None:
+        ping_ms = (time.perf_counter() - started) * 1000
+        console.print(f"\n⚡ [green]Daemon: running[/green] (pid {info['pid']}, up {info['uptime_seconds']}s, {info['socket']})")
+        console.print(f"  Cold start: {info['startup_ms']}ms · round trip: {ping_ms:.2f}ms")
+        for op, latency in info["ops"].items():
+            console.print(f"  {op}: {latency['count']} calls, p50 {latency.get('p50_ms')}ms, p95 {latency.get('p95_ms')}ms")
+    else:
+        console.print("\n💤 Daemon: not running (start it with [cyan]codeassist daemon start[/cyan])")
+    
     console.print("\n🎯 Available Commands:")
     console.print("  • [cyan]codeassist hello[/cyan] - Test installation")
     console.print("  • [cyan]codeassist complete[/cyan] - Complete your code with AI")
     console.print("  • [cyan]codeassist review[/cyan] - Get AI code review") 
     console.print("  • [cyan]codeassist explain[/cyan] - Get AI code explanation")
+    console.print("  • [cyan]codeassist daemon start[/cyan] - Keep clients and indexes warm in the background")
     console.print("  • [cyan]codeassist status[/cyan] - Show this status")
 
+@main.group()
+def daemon():
+    """⚡ Background daemon that keeps clients and indexes warm"""
+    pass
+
+@daemon.command()
+@click.option('--foreground', is_flag=True, help='Run in this process instead of detaching')
+def start(foreground):
+    """Start the daemon; other commands forward to it while it runs"""
+    from cli import daemon as daemon_module
+    if daemon_module.call({"op": "status"}, timeout=2) is not None:
+        console.print(f"⚡ Daemon already running on {daemon_module.socket_path()}")
+        return
+    if foreground:
+        console.print(f"⚡ Serving on {daemon_module.socket_path()} (Ctrl+C to stop)")
+        import asyncio
+        try:
+            asyncio.run(daemon_module.Daemon().serve())
+        except KeyboardInterrupt:
+            pass
+        return
+    info = daemon_module.start_background()
+    if info is None:
+        console.print(f"❌ [red]Daemon did not start; see {daemon_module.socket_path().parent / 'daemon.log'}[/red]")
+        return
+    console.print(f"⚡ [green]Daemon started[/green] (pid {info['pid']}, cold start {info['startup_ms']}ms)")
+
+@daemon.command()
+def stop():
+    """Stop the daemon"""
+    from cli import daemon as daemon_module
+    if daemon_module.call({"op": "shutdown"}, timeout=5) is None:
+        console.print("💤 Daemon is not running")
+        return
+    console.print("🛑 Daemon stopped")
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
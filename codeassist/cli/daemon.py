@@ -0,0 +1,235 @@
+"""Background daemon that keeps CLI state warm between commands
+
+A one-shot ``codeassist complete`` pays for interpreter start, imports,
+``.env`` parsing, client construction and a fresh TLS connection on every
+call. The daemon pays them once and then serves the CLI over a Unix socket
+(``CODEASSIST_DAEMON_SOCKET``, default ``~/.codeassist/daemon.sock``). It
+keeps the pooled clients, the response cache and the project symbol
+indexes warm.
+
+The protocol is one JSON object per line in each direction. Requests carry
+an ``op``:
+
+- ``generate``: ``model``, ``messages``, ``temperature``, ``max_tokens`` -> ``text``
+- ``context``: ``root``, ``code``, ``filename`` -> ``text``, ``symbols``, ``indexed``
+- ``status``: uptime, startup time and per-op latency
+- ``shutdown``
+
+Replies carry ``ok`` and, on failure, ``error``. The client half of this
+module uses only the standard library, so forwarding a command costs
+almost nothing when the daemon is up.
+"""
+import json
+import os
+import socket
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+_STARTED = time.perf_counter()
+
+DEFAULT_SOCKET = Path.home() / ".codeassist" / "daemon.sock"
+
+
+def socket_path() -> Path:
+    return Path(os.getenv("CODEASSIST_DAEMON_SOCKET") or DEFAULT_SOCKET)
+
+
+def forwarding_enabled() -> bool:
+    """``CODEASSIST_DAEMON=off`` makes the CLI always work in-process"""
+    return os.getenv("CODEASSIST_DAEMON", "auto").lower() not in ("0", "off", "false", "no")
+
+
+def call(request: Dict[str, Any], timeout: float = 300.0, path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """Send one request to the daemon; None if no daemon is listening"""
+    path = path or socket_path()
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(str(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            return None
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        buffer = b""
+        while not buffer.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("Daemon closed the connection without replying")
+            buffer += chunk
+        return json.loads(buffer)
+    finally:
+        sock.close()
+
+
+class _Latency:
+    """Recent latencies of one op"""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "p50_ms": round(ordered[len(ordered) // 2], 2),
+            "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+            "max_ms": round(ordered[-1], 2),
+        }
+
+
+class Daemon:
+    """Serves CLI requests from warm clients and indexes"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or socket_path())
+        self.started_at = time.time()
+        self.startup_ms: Optional[float] = None
+        self.latency: Dict[str, _Latency] = {}
+        self._server = None
+
+    def warm_up(self):
+        """Import and build everything a first request would otherwise wait for"""
+        sys.path.append(str(Path(__file__).parent.parent))
+        from dotenv import load_dotenv
+        load_dotenv()
+        from models.backends import llm_configured
+        from models.client_registry import get_client_registry
+        import services.symbol_index  # noqa: F401
+        registry = get_client_registry()
+        if llm_configured():
+            registry.get()
+
+    async def _generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        from models.client_registry import get_llm_client
+        llm = get_llm_client(request.get("model") or "gpt-3.5-turbo")
+        text = await llm.generate(
+            request["messages"],
+            temperature=request.get("temperature", 0.7),
+            max_tokens=request.get("max_tokens")
+        )
+        return {"text": text}
+
+    async def _context(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        import asyncio
+        from services.symbol_index import get_symbol_index
+        index = get_symbol_index(request["root"], refresh=False)
+
+        def lookup():
+            # The mtime scan is cheap, so every request sees the files as saved
+            changes = index.update()
+            text, symbols = index.context_for(request["code"], exclude_path=request.get("filename"))
+            return changes, text, symbols
+
+        changes, text, symbols = await asyncio.to_thread(lookup)
+        return {
+            "text": text,
+            "symbols": [[symbol.qualname, symbol.path, symbol.line] for symbol in symbols],
+            "indexed": index.stats()["symbols"],
+            "root": str(index.root),
+            "parsed": changes["parsed"],
+            "elapsed_ms": changes["elapsed_ms"],
+        }
+
+    def _status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "socket": str(self.path),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "startup_ms": self.startup_ms,
+            "ops": {op: latency.to_dict() for op, latency in self.latency.items()},
+        }
+
+    async def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        started = time.perf_counter()
+        try:
+            if op == "generate":
+                reply = await self._generate(request)
+            elif op == "context":
+                reply = await self._context(request)
+            elif op == "status":
+                reply = self._status()
+            elif op == "shutdown":
+                self._server.close()
+                reply = {}
+            else:
+                raise ValueError(f"Unknown op {op!r}")
+            reply["ok"] = True
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        if op in ("generate", "context"):
+            self.latency.setdefault(op, _Latency()).observe((time.perf_counter() - started) * 1000)
+        return reply
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.handle(json.loads(line))
+                except ValueError as e:
+                    reply = {"ok": False, "error": f"Bad request: {e}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        import asyncio
+        self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        if call({"op": "status"}, timeout=2, path=self.path) is not None:
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        if self.path.exists():
+            self.path.unlink()  # stale socket from a daemon that died
+
+        self.warm_up()
+        self._server = await asyncio.start_unix_server(self._serve_connection, path=str(self.path))
+        # Only the owner may talk to the daemon; it spends their API key
+        os.chmod(self.path, 0o600)
+        self.startup_ms = round((time.perf_counter() - _STARTED) * 1000, 1)
+        try:
+            async with self._server:
+                await self._server.wait_closed()
+        finally:
+            from models.client_registry import close_client_registry
+            await close_client_registry()
+            if self.path.exists():
+                self.path.unlink()
+
+
+def start_background(timeout: float = 15.0) -> Optional[Dict[str, Any]]:
+    """Spawn a detached daemon and wait for it to answer; returns its status"""
+    import subprocess
+    log_path = socket_path().parent / "daemon.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    with open(log_path, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve())],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = call({"op": "status"}, timeout=2)
+        if status is not None:
+            return status
+        time.sleep(0.05)
+    return None
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(Daemon().serve())
@@ -0,0 +1,274 @@
+"""Chat-completion backends behind ``LLMClient``
+
+``CODEASSIST_LLM_BACKEND`` selects one:
+
+- ``openai`` (default): the OpenAI API, keyed by ``OPENAI_API_KEY``
+- ``openai-compatible``: any server speaking the OpenAI chat API at
+  ``CODEASSIST_LLM_BASE_URL`` (vLLM, llama.cpp, a gateway, ``models.stub_server``)
+- ``stub``: an in-process simulator with seeded latency, streaming and
+  429/5xx errors, for benchmarking the server offline
+
+Backends only make the call; retries, hedging, admission and metrics stay
+in ``LLMClient`` so they behave the same whichever backend is used.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import random
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Protocol
+
+from models.errors import LLMRateLimitError, LLMServerError
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+BACKENDS = ("openai", "openai-compatible", "stub")
+
+
+class LLMBackend(Protocol):
+    """One chat-completion call, whole or streamed"""
+
+    name: str
+
+    async def complete(
+            self,
+            model: str,
+            messages: List[Dict[str, str]],
+            temperature: float,
+            max_tokens: Optional[int],
+            **kwargs
+    ) -> str:
+        ...
+
+    def stream(
+            self,
+            model: str,
+            messages: List[Dict[str, str]],
+            temperature: float,
+            max_tokens: Optional[int],
+            **kwargs
+    ) -> AsyncIterator[str]:
+        ...
+
+
+def backend_name() -> str:
+    """The configured backend, validated"""
+    name = os.getenv("CODEASSIST_LLM_BACKEND", "openai").strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CODEASSIST_LLM_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return name
+
+
+def resolve_api_key(api_key: Optional[str] = None) -> str:
+    """Return the explicit key or OPENAI_API_KEY, rejecting the placeholder"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key or api_key == "your_openai_api_key_here":
+        raise ValueError(
+            "OpenAI API key is required. Set OPENAI_API_KEY in your .env file."
+        )
+    return api_key
+
+
+def llm_configured() -> bool:
+    """Whether requests can be sent: a key for OpenAI, nothing for the others"""
+    if os.getenv("CODEASSIST_LLM_BACKEND", "openai").strip().lower() != "openai":
+        return True
+    api_key = os.getenv("OPENAI_API_KEY")
+    return bool(api_key) and api_key != "your_openai_api_key_here"
+
+
+class OpenAIBackend:
+    """Calls through an ``AsyncOpenAI`` client (OpenAI or a compatible base URL)"""
+
+    def __init__(self, client: "AsyncOpenAI", name: str = "openai"):
+        self.client = client
+        self.name = name
+        # Input tokens, and those served from OpenAI's prompt cache
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def _options(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """``prompt_cache_key`` is an OpenAI extension; compatible servers may reject it"""
+        key = kwargs.pop("prompt_cache_key", None)
+        if key is not None and self.name == "openai":
+            kwargs["extra_body"] = {**kwargs.get("extra_body", {}), "prompt_cache_key": key}
+        return kwargs
+
+    async def complete(self, model, messages, temperature, max_tokens, **kwargs) -> str:
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **self._options(kwargs)
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.cached_prompt_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+        return response.choices[0].message.content or ""
+
+    async def stream(self, model, messages, temperature, max_tokens, **kwargs) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **self._options(kwargs)
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "base_url": str(self.client.base_url),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+        }
+
+
+_STUB_WORDS = (
+    "the", "function", "returns", "value", "list", "loop", "consider", "using", "a", "dict",
+    "instead", "of", "index", "check", "for", "None", "before", "calling", "this", "method",
+    "raises", "when", "input", "is", "empty", "variable", "name", "could", "be", "clearer",
+    "result", "append", "each", "item", "cache", "lookup", "avoids", "repeated", "work", "here",
+)
+
+
+class StubBackend:
+    """Deterministic local stand-in for an LLM provider
+
+    The response text depends only on the model and messages, so caches and
+    single-flight behave as they would in production. Latency, throughput
+    and failures are drawn from a ``random.Random`` seeded once, so a
+    benchmark run with the same seed and request order replays exactly:
+
+    - time to first token is log-normal around ``latency_ms`` (``latency_sigma``
+      is the spread of its logarithm; 0 makes it constant)
+    - tokens then arrive at ``tokens_per_second`` (0 sends them at once)
+    - a call fails with 429 (carrying ``retry_after``) at ``rate_limit_rate``
+      and with a 5xx, after the first-token latency, at ``server_error_rate``
+    """
+
+    name = "stub"
+
+    def __init__(
+            self,
+            seed: Optional[int] = None,
+            latency_ms: Optional[float] = None,
+            latency_sigma: Optional[float] = None,
+            tokens_per_second: Optional[float] = None,
+            rate_limit_rate: Optional[float] = None,
+            server_error_rate: Optional[float] = None,
+            retry_after: Optional[float] = None,
+            response_tokens: Optional[int] = None
+    ):
+        def setting(value, env, default, cast=float):
+            return value if value is not None else cast(os.getenv(env, default))
+
+        self.seed = setting(seed, "CODEASSIST_STUB_SEED", 0, int)
+        self.latency_ms = setting(latency_ms, "CODEASSIST_STUB_LATENCY_MS", 300)
+        self.latency_sigma = setting(latency_sigma, "CODEASSIST_STUB_LATENCY_SIGMA", 0.5)
+        self.tokens_per_second = setting(tokens_per_second, "CODEASSIST_STUB_TOKENS_PER_SECOND", 200)
+        self.rate_limit_rate = setting(rate_limit_rate, "CODEASSIST_STUB_RATE_LIMIT_RATE", 0)
+        self.server_error_rate = setting(server_error_rate, "CODEASSIST_STUB_SERVER_ERROR_RATE", 0)
+        self.retry_after = setting(retry_after, "CODEASSIST_STUB_RETRY_AFTER", 1.0)
+        self.response_tokens = setting(response_tokens, "CODEASSIST_STUB_RESPONSE_TOKENS", 120, int)
+        if self.rate_limit_rate + self.server_error_rate > 1:
+            raise ValueError("Stub error rates add up to more than 1")
+
+        self._random = random.Random(self.seed)
+        self.calls = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+
+    def _first_token_delay(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def _outcome(self) -> Optional[Exception]:
+        """Draw this call's failure, if any"""
+        draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            self.rate_limited += 1
+            return LLMRateLimitError("Stub rate limit", status_code=429, retry_after=self.retry_after)
+        if draw < self.rate_limit_rate + self.server_error_rate:
+            self.server_errors += 1
+            return LLMServerError("Stub server error", status_code=503)
+        return None
+
+    def response_for(self, model: str, messages: List[Dict[str, str]], max_tokens: Optional[int]) -> List[str]:
+        """The response's tokens, a pure function of the request"""
+        digest = hashlib.sha256(repr((model, [(m.get("role"), m.get("content")) for m in messages])).encode())
+        words = random.Random(digest.digest())
+        count = min(self.response_tokens, max_tokens) if max_tokens else self.response_tokens
+        return [words.choice(_STUB_WORDS) + " " for _ in range(max(count, 1))]
+
+    async def _start(self) -> None:
+        """Sleep until the first token, raising this call's failure if it has one"""
+        self.calls += 1
+        error = self._outcome()
+        delay = self._first_token_delay()
+        if isinstance(error, LLMRateLimitError):
+            # Providers reject over-quota calls before doing any work
+            raise error
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+
+    async def complete(self, model, messages, temperature, max_tokens, **kwargs) -> str:
+        await self._start()
+        tokens = self.response_for(model, messages, max_tokens)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+        return "".join(tokens)
+
+    async def stream(self, model, messages, temperature, max_tokens, **kwargs) -> AsyncIterator[str]:
+        await self._start()
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for position, token in enumerate(self.response_for(model, messages, max_tokens)):
+            if position and interval:
+                await asyncio.sleep(interval)
+            yield token
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "seed": self.seed,
+            "latency_ms": self.latency_ms,
+            "latency_sigma": self.latency_sigma,
+            "tokens_per_second": self.tokens_per_second,
+            "rate_limit_rate": self.rate_limit_rate,
+            "server_error_rate": self.server_error_rate,
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "server_errors": self.server_errors,
+        }
+
+
+def create_backend(api_key: Optional[str] = None, http_client=None, name: Optional[str] = None) -> LLMBackend:
+    """Build the configured backend; ``http_client`` is shared by the OpenAI ones"""
+    name = name or backend_name()
+    if name == "stub":
+        return StubBackend()
+    # The SDK takes most of a second to import; the stub never needs it
+    from openai import AsyncOpenAI
+    if name == "openai-compatible":
+        base_url = os.getenv("CODEASSIST_LLM_BASE_URL")
+        if not base_url:
+            raise ValueError("CODEASSIST_LLM_BASE_URL is required for the openai-compatible backend")
+        # Self-hosted servers often ignore the key, but the SDK insists on one
+        api_key = api_key or os.getenv("CODEASSIST_LLM_API_KEY") or os.getenv("OPENAI_API_KEY") or "unused"
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        return OpenAIBackend(client, name=name)
+    client = AsyncOpenAI(api_key=resolve_api_key(api_key), http_client=http_client, max_retries=0)
+    return OpenAIBackend(client)
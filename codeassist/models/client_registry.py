@@ -0,0 +1,262 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+import httpx
+
+from models.backends import LLMBackend, backend_name, create_backend, resolve_api_key
+from models.llm_client import LLMClient
+from services.response_cache import get_response_cache
+from services.single_flight import get_single_flight
+from services.admission import get_admission_controller
+
+
+class PoolStats:
+    """Counters describing how the shared HTTP connection pool is used"""
+
+    def __init__(self):
+        self.requests_total = 0
+        self.requests_in_flight = 0
+        self.wait_count = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, seconds: float):
+        """Record how long a request waited for a pooled connection"""
+        self.wait_count += 1
+        self.wait_time_total += seconds
+        self.wait_time_max = max(self.wait_time_max, seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        avg = self.wait_time_total / self.wait_count if self.wait_count else 0.0
+        return {
+            "requests_total": self.requests_total,
+            "requests_in_flight": self.requests_in_flight,
+            "wait_time": {
+                "count": self.wait_count,
+                "avg_ms": round(avg * 1000, 2),
+                "max_ms": round(self.wait_time_max * 1000, 2),
+            },
+        }
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response stream that reports when its connection goes back to the pool"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, stats: PoolStats):
+        self._stream = stream
+        self._stats = stats
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            self._stats.requests_in_flight -= 1
+        await self._stream.aclose()
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper that measures pool wait time and in-flight requests
+
+    Wait time is the gap between handing the request to the pool and the
+    first connection-level event (a new TCP connect or request headers sent on
+    a reused keep-alive connection).
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, stats: PoolStats):
+        self._transport = transport
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        waiting = True
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal waiting
+            if waiting and event_name.endswith(("connect_tcp.started", "send_request_headers.started")):
+                waiting = False
+                self._stats.record_wait(time.perf_counter() - started)
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        self._stats.requests_total += 1
+        self._stats.requests_in_flight += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._stats.requests_in_flight -= 1
+            raise
+
+        response.stream = _TrackedStream(response.stream, self._stats)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def connection_counts(self) -> Dict[str, int]:
+        """Open/idle connection counts read from the underlying pool"""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "connections_open": len(connections),
+            "connections_idle": idle,
+            "connections_in_use": len(connections) - idle,
+        }
+
+
+class ClientRegistry:
+    """Process-wide registry of LLM clients sharing one keep-alive pool
+
+    Clients are keyed by ``(model, api_key)``. Every backend created here
+    (see ``models.backends``) reuses the same ``httpx.AsyncClient`` so TLS
+    sessions and sockets are shared across requests instead of rebuilt per
+    call.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None,
+        cache=None,
+        single_flight=None,
+        admission=None,
+        max_clients: Optional[int] = None,
+    ):
+        self.max_connections = max_connections or int(os.getenv("CODEASSIST_MAX_CONNECTIONS", 100))
+        self.max_keepalive_connections = max_keepalive_connections or int(
+            os.getenv("CODEASSIST_MAX_KEEPALIVE_CONNECTIONS", 20)
+        )
+        self.keepalive_expiry = keepalive_expiry or float(os.getenv("CODEASSIST_KEEPALIVE_EXPIRY", 30.0))
+        self.timeout = timeout or float(os.getenv("CODEASSIST_LLM_TIMEOUT", 60.0))
+        self.max_clients = max_clients or int(os.getenv("CODEASSIST_MAX_LLM_CLIENTS", 64))
+
+        self.cache = cache if cache is not None else get_response_cache()
+        self.single_flight = single_flight if single_flight is not None else get_single_flight()
+        self.admission = admission if admission is not None else get_admission_controller()
+        self.stats = PoolStats()
+        self._transport = _InstrumentedTransport(
+            httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            ),
+            self.stats,
+        )
+        self._http_client = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+        )
+        self.backend_name = backend_name()
+        self._backends: Dict[str, LLMBackend] = {}
+        # Least recently used first; evicted clients only lose their counters
+        self._llm_clients: "OrderedDict[Tuple[str, str], LLMClient]" = OrderedDict()
+        self._closed = False
+
+    def get(self, model: str = "gpt-3.5-turbo", api_key: Optional[str] = None) -> LLMClient:
+        """Return the shared client for ``model``, creating it on first use"""
+        if self._closed:
+            raise RuntimeError("Client registry is closed")
+
+        if self.backend_name == "openai":
+            api_key = resolve_api_key(api_key)
+        key = (model, api_key or "")
+        llm = self._llm_clients.get(key)
+        if llm is not None:
+            self._llm_clients.move_to_end(key)
+        else:
+            backend = self._backends.get(key[1])
+            if backend is None:
+                backend = create_backend(api_key, http_client=self._http_client, name=self.backend_name)
+                self._backends[key[1]] = backend
+            llm = LLMClient(
+                model=model, backend=backend,
+                cache=self.cache, single_flight=self.single_flight, admission=self.admission
+            )
+            self._llm_clients[key] = llm
+            while len(self._llm_clients) > self.max_clients:
+                self._llm_clients.popitem(last=False)
+        return llm
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for sizing the pool"""
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "clients": len(self._llm_clients),
+            **self._transport.connection_counts(),
+            **self.stats.to_dict(),
+        }
+
+    def backend_stats(self) -> Dict[str, Any]:
+        """The configured backend and, once one is in use, its settings and counters"""
+        for backend in self._backends.values():
+            return backend.describe()
+        return {"backend": self.backend_name}
+
+    def client_stats(self) -> Dict[str, Any]:
+        """Retry/hedging/error counters for each registered client
+
+        Keyed by model, plus a fingerprint of the API key when one is set so
+        clients for the same model under different keys stay apart.
+        """
+        return {_client_label(model, api_key): llm.stats() for (model, api_key), llm in self._llm_clients.items()}
+
+    async def aclose(self):
+        """Close the shared pool; safe to call more than once"""
+        if self._closed:
+            return
+        self._closed = True
+        self._llm_clients.clear()
+        self._backends.clear()
+        await self._http_client.aclose()
+
+
+def _client_label(model: str, api_key: str) -> str:
+    if not api_key:
+        return model
+    return f"{model}:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]}"
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def init_client_registry(**kwargs) -> ClientRegistry:
+    """Create the process-wide registry (called from the API lifespan)"""
+    global _registry
+    _registry = ClientRegistry(**kwargs)
+    return _registry
+
+
+def get_client_registry() -> ClientRegistry:
+    """Return the process-wide registry, creating it lazily if needed"""
+    global _registry
+    if _registry is None or _registry._closed:
+        _registry = ClientRegistry()
+    return _registry
+
+
+async def close_client_registry():
+    """Close the process-wide registry and release its connections"""
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
+
+
+def get_llm_client(model: str = "gpt-3.5-turbo", api_key: Optional[str] = None) -> LLMClient:
+    """Shortcut for ``get_client_registry().get(model, api_key)``"""
+    return get_client_registry().get(model, api_key)
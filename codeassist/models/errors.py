@@ -0,0 +1,79 @@
+from typing import Optional
+
+
+class LLMError(Exception):
+    """Base class for failures talking to the language model provider"""
+
+    retryable = False
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMRateLimitError(LLMError):
+    """Provider returned 429; retried after backoff or Retry-After"""
+
+    retryable = True
+
+
+class LLMTimeoutError(LLMError):
+    """Request timed out or the connection failed"""
+
+    retryable = True
+
+
+class LLMServerError(LLMError):
+    """Provider returned a 5xx response"""
+
+    retryable = True
+
+
+class LLMRequestError(LLMError):
+    """Provider rejected the request (4xx other than 429); not retried"""
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from an API error response"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # HTTP-date form is rare from LLM providers; fall back to backoff
+        return None
+    return None
+
+
+def classify_error(exc: Exception) -> LLMError:
+    """Map an OpenAI SDK exception onto the LLMError hierarchy"""
+    if isinstance(exc, LLMError):
+        return exc
+
+    # Imported here: the SDK is slow to load and only needed once a call fails
+    import openai
+
+    message = str(exc)
+    if isinstance(exc, openai.RateLimitError):
+        return LLMRateLimitError(message, status_code=429, retry_after=_retry_after(exc))
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return LLMTimeoutError(message)
+    if isinstance(exc, openai.APIStatusError):
+        status = exc.status_code
+        if status >= 500:
+            return LLMServerError(message, status_code=status, retry_after=_retry_after(exc))
+        if status in (408, 409):
+            return LLMTimeoutError(message, status_code=status, retry_after=_retry_after(exc))
+        return LLMRequestError(message, status_code=status)
+    return LLMError(message)
@@ -1,27 +1,105 @@
 import os
-from typing import Optional, Dict, Any, List
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, AsyncIterator
 import asyncio
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from models.backends import LLMBackend, OpenAIBackend, create_backend
+from models.errors import LLMError, classify_error
+from services.metrics import llm_call_latency, note_model, note_tokens, upstream_timer
+from services.model_router import get_model_router
+from services.response_cache import make_cache_key
+from services.token_budget import count_tokens
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 
 load_dotenv()
 
 
+class RetryPolicy:
+    """Capped exponential backoff with full jitter, honouring Retry-After"""
+
+    def __init__(
+            self,
+            max_retries: Optional[int] = None,
+            base_delay: Optional[float] = None,
+            max_delay: Optional[float] = None,
+            max_retry_after: float = 30.0
+    ):
+        self.max_retries = max_retries if max_retries is not None else int(
+            os.getenv("CODEASSIST_LLM_MAX_RETRIES", 3)
+        )
+        self.base_delay = base_delay if base_delay is not None else float(
+            os.getenv("CODEASSIST_LLM_RETRY_BASE_DELAY", 0.5)
+        )
+        self.max_delay = max_delay if max_delay is not None else float(
+            os.getenv("CODEASSIST_LLM_RETRY_MAX_DELAY", 8.0)
+        )
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, error: LLMError) -> float:
+        """Seconds to sleep before retry number ``attempt + 1``"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if error.retry_after is not None:
+            return min(max(error.retry_after, backoff), self.max_retry_after)
+        return backoff
+
+
 class LLMClient:
     """LCient for interacting with the OPENAI Language Models"""
 
 
-    def __init__(self, model: str = "gpt-3.5-turbo", api_key: Optional[str] = None):
+    def __init__(
+            self,
+            model: str = "gpt-3.5-turbo",
+            api_key: Optional[str] = None,
+            client: Optional["AsyncOpenAI"] = None,
+            backend: Optional[LLMBackend] = None,
+            cache: Optional[Any] = None,
+            single_flight: Optional[Any] = None,
+            admission: Optional[Any] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            hedge: Optional[bool] = None
+    ):
         self.model = model
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
 
-        if not self.api_key or self.api_key == "your_openai_api_key_here":
-            raise ValueError(
-                "OpenAI API key is required. Set OPENAI_API_KEY in your .env file."
-            )
-        
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        # The backend makes each call (see models.backends); a shared one from
+        # models.client_registry reuses pooled connections. SDK retries are
+        # disabled; generate() applies its own RetryPolicy.
+        if backend is None:
+            backend = OpenAIBackend(client) if client is not None else create_backend(api_key)
+        self.backend = backend
+        # Optional services.response_cache.ResponseCache consulted by generate()
+        self.cache = cache
+        # Optional services.single_flight.SingleFlight coalescing identical calls
+        self.single_flight = single_flight
+        # Optional services.admission.AdmissionController capping upstream calls
+        self.admission = admission
+
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Hedging sends a second request once the first exceeds the p95 latency
+        if hedge is None:
+            hedge = os.getenv("CODEASSIST_LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+        self.hedge = hedge
+        self.hedge_min_samples = 20
+        self._latencies = deque(maxlen=200)
+
+        self.attempts = 0
+        self.retries = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self.errors: Dict[str, int] = {}
+
+    def _upstream_slot(self):
+        """Concurrency slot for one upstream call (no-op without admission control)"""
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.slot(self.model)
 
     
     async def generate(
@@ -31,16 +109,208 @@ class LLMClient:
             max_tokens: Optional[int] = None,
             **kwargs
     ) ->str:
-        """Generate response from the language model"""
+        """Generate response from the language model
+
+        The text is returned as the model produced it, surrounding whitespace
+        included (it matters for fill-in-the-middle insertions); chat-style
+        callers strip it.
+        """
+
+        request_key = None
+        if self.cache is not None or self.single_flight is not None:
+            request_key = make_cache_key(self.model, messages, temperature, max_tokens, **kwargs)
+
+        cacheable = self.cache is not None and self.cache.is_cacheable(temperature)
+        if cacheable:
+            cached = await self.cache.get(request_key)
+            if cached is not None:
+                return cached
+
+        async def call_upstream() -> str:
+            content = await self._generate_with_retries(messages, temperature, max_tokens, **kwargs)
+            if cacheable:
+                await self.cache.set(request_key, content)
+            return content
+
+        # Upstream time is measured per backend call in _create, so queueing,
+        # single-flight waits and retry backoff count as server overhead
+        note_model(self.model)
+        if self.single_flight is not None:
+            return await self.single_flight.do(request_key, call_upstream)
+        return await call_upstream()
+
+    async def cached_response(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: float = 0.7,
+            max_tokens: Optional[int] = None,
+            **kwargs
+    ) -> Optional[str]:
+        """Return the cached response for this exact call, if there is one"""
+        if self.cache is None or not self.cache.is_cacheable(temperature):
+            return None
+        key = make_cache_key(self.model, messages, temperature, max_tokens, **kwargs)
+        return await self.cache.get(key, record_miss=False)
+
+    async def _generate_with_retries(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: float,
+            max_tokens: Optional[int],
+            **kwargs
+    ) -> str:
+        """Retry transient failures (429, timeouts, 5xx) with backoff"""
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(messages, temperature, max_tokens, **kwargs)
+            except LLMError as e:
+                if not e.retryable or attempt >= self.retry_policy.max_retries:
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt, e))
+                attempt += 1
+                self.retries += 1
+
+    def _hedge_delay(self) -> Optional[float]:
+        """p95 of recent latencies, or None if hedging is off or untrained"""
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def _attempt(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: float,
+            max_tokens: Optional[int],
+            **kwargs
+    ) -> str:
+        """One logical attempt, hedged with a second request if it runs slow"""
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._create(messages, temperature, max_tokens, **kwargs)
 
+        tasks = [asyncio.ensure_future(self._create(messages, temperature, max_tokens, **kwargs))]
         try:
-            response = await self.client.chat.completions.create(
-                model = self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                **kwargs
-            )
-            return response.choice[0].message.content.strip()
-        except Exception as e:
-            raise Exception(f"LLM generation faile: {str(e)}")
\ No newline at end of file
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedged_requests += 1
+                tasks.append(asyncio.ensure_future(self._create(messages, temperature, max_tokens, **kwargs)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1 and task is tasks[1]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _note_usage(self, messages: List[Dict[str, str]], content: str):
+        """Count a successful call's tokens towards the request's actual usage"""
+        prompt = sum(count_tokens(message.get("content") or "", self.model) for message in messages)
+        note_tokens(prompt + count_tokens(content, self.model))
+
+    def _record_error(self, error: LLMError):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    async def _create(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: float,
+            max_tokens: Optional[int],
+            **kwargs
+    ) -> str:
+        """Make a single chat completion call"""
+        async with self._upstream_slot():
+            self.attempts += 1
+            started = time.monotonic()
+            try:
+                with upstream_timer(self.model):
+                    content = await self.backend.complete(self.model, messages, temperature, max_tokens, **kwargs)
+            except Exception as e:
+                error = classify_error(e)
+                self._record_error(error)
+                elapsed = time.monotonic() - started
+                llm_call_latency().observe(elapsed, model=self.model, outcome=type(error).__name__)
+                get_model_router().record_call(self.model, False, elapsed)
+                raise error from e
+
+            elapsed = time.monotonic() - started
+            self._latencies.append(elapsed)
+            llm_call_latency().observe(elapsed, model=self.model, outcome="ok")
+            get_model_router().record_call(self.model, True, elapsed)
+            self._note_usage(messages, content)
+            return content
+
+    async def generate_stream(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: float = 0.7,
+            max_tokens: Optional[int] = None,
+            **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream the response from the language model token by token"""
+
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                async with self._upstream_slot():
+                    self.attempts += 1
+                    started = time.monotonic()
+                    pieces = []
+                    try:
+                        iterator = self.backend.stream(
+                            self.model, messages, temperature, max_tokens, **kwargs
+                        ).__aiter__()
+                        while True:
+                            try:
+                                with upstream_timer(self.model):
+                                    content = await iterator.__anext__()
+                            except StopAsyncIteration:
+                                break
+                            emitted = True
+                            pieces.append(content)
+                            yield content
+                    except Exception as e:
+                        error = classify_error(e)
+                        self._record_error(error)
+                        elapsed = time.monotonic() - started
+                        llm_call_latency().observe(elapsed, model=self.model, outcome=type(error).__name__)
+                        get_model_router().record_call(self.model, False, elapsed)
+                        raise error from e
+                    elapsed = time.monotonic() - started
+                    llm_call_latency().observe(elapsed, model=self.model, outcome="ok")
+                    get_model_router().record_call(self.model, True, elapsed)
+                    self._note_usage(messages, "".join(pieces))
+                return
+            except LLMError as e:
+                # Once tokens reached the caller a retry would duplicate output
+                if emitted or not e.retryable or attempt >= self.retry_policy.max_retries:
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt, e))
+                attempt += 1
+                self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Upstream attempt, retry, hedging and error counters"""
+        hedge_delay = self._hedge_delay()
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "backend": self.backend.name,
+            "errors": dict(self.errors),
+            "hedging_enabled": self.hedge,
+            "hedge_delay_ms": round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+        }
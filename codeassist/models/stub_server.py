@@ -0,0 +1,129 @@
+"""OpenAI-compatible HTTP server answering from ``StubBackend``
+
+Point the API at it to benchmark the full network path (connection pool,
+SDK, SSE parsing) without a provider:
+
+    python codeassist/models/stub_server.py --port 8001 --seed 7 --rate-limit-rate 0.05
+    CODEASSIST_LLM_BACKEND=openai-compatible \\
+    CODEASSIST_LLM_BASE_URL=http://127.0.0.1:8001/v1 python -m codeassist.api.main
+
+Only ``POST /v1/chat/completions`` (plain and ``stream=true``) is served.
+Simulated failures are returned as 429 (with Retry-After) and 503.
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.backends import StubBackend
+from models.errors import LLMError
+
+
+def _error_response(error: LLMError) -> JSONResponse:
+    headers = {"retry-after": str(error.retry_after)} if error.retry_after is not None else {}
+    kind = "rate_limit_exceeded" if error.status_code == 429 else "server_error"
+    return JSONResponse(
+        {"error": {"message": str(error), "type": kind, "code": kind}},
+        status_code=error.status_code or 500,
+        headers=headers,
+    )
+
+
+def create_app(backend: Optional[StubBackend] = None) -> FastAPI:
+    """The stub server app; ``backend`` defaults to one configured from the environment"""
+    backend = backend or StubBackend()
+    app = FastAPI(title="CodeAssist LLM stub")
+    app.state.backend = backend
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        args = (model, body.get("messages", []), body.get("temperature", 1.0), body.get("max_tokens"))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            try:
+                text = await backend.complete(*args)
+            except LLMError as e:
+                return _error_response(e)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+            }
+
+        tokens = backend.stream(*args)
+        # Pull the first token before answering so failures get a real status code
+        try:
+            first = await tokens.__anext__()
+        except LLMError as e:
+            return _error_response(e)
+
+        def chunk(delta: dict, finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": first})
+            async for token in tokens:
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return backend.describe()
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a deterministic OpenAI-compatible stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--latency-ms", type=float, help="Median time to first token")
+    parser.add_argument("--latency-sigma", type=float, help="Spread of log latency (0 = constant)")
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--rate-limit-rate", type=float, help="Fraction of calls answered with 429")
+    parser.add_argument("--server-error-rate", type=float, help="Fraction of calls answered with 503")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    backend = StubBackend(
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(create_app(backend), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
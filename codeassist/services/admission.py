@@ -0,0 +1,180 @@
+"""Concurrency limiting and admission control for upstream LLM calls"""
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+from services.metrics import admission_queue_depth, admission_wait
+
+
+class OverloadedError(Exception):
+    """Raised when a call is rejected because the upstream queue is full"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelLimiter:
+    """Semaphore plus bounded wait queue for a single model"""
+
+    def __init__(self, model: str, limit: int, max_queue: int, queue_timeout: float):
+        self.model = model
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Series of the exported /metrics histograms
+        self.wait_histogram = admission_wait().labels(model=model)
+        self.queue_depth_histogram = admission_queue_depth().labels(model=model)
+        # Smoothed time a call holds its slot; used to estimate Retry-After
+        self._hold_time = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead of a new caller is likely drained"""
+        return max(1, math.ceil(self._hold_time * (self.waiting / self.limit + 1)))
+
+    def check_capacity(self):
+        """Reject immediately if the wait queue is already full"""
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(
+                f"Too many queued requests for model {self.model}; try again later",
+                retry_after=self.retry_after(),
+            )
+
+    async def acquire(self):
+        self.queue_depth_histogram.observe(self.waiting)
+        if not self._semaphore.locked() and not self.waiting:
+            # Uncontended: take the slot without queueing
+            await self._semaphore.acquire()
+            self.wait_histogram.observe(0.0)
+            self.admitted += 1
+            self.active += 1
+            return
+
+        self.check_capacity()
+        started = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise OverloadedError(
+                f"Timed out after {self.queue_timeout}s waiting for model {self.model}",
+                retry_after=self.retry_after(),
+            )
+        finally:
+            self.waiting -= 1
+
+        self.wait_histogram.observe(time.monotonic() - started)
+        self.admitted += 1
+        self.active += 1
+
+    def release(self, held_for: float):
+        self.active -= 1
+        self._hold_time = 0.8 * self._hold_time + 0.2 * held_for
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_time_seconds": self.wait_histogram.to_dict(),
+            "queue_depth_on_arrival": self.queue_depth_histogram.to_dict(),
+        }
+
+
+def _parse_model_limits(value: str) -> Dict[str, int]:
+    """Parse ``"gpt-4=4,gpt-3.5-turbo=32"`` into a dict"""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+class AdmissionController:
+    """Per-model concurrency caps with a bounded, deadline-limited wait queue
+
+    Calls beyond ``limit`` wait in a queue of at most ``max_queue`` entries for
+    up to ``queue_timeout`` seconds. When the queue is full or the deadline
+    passes an ``OverloadedError`` is raised, which the API turns into a 503
+    with ``Retry-After``, instead of passing the burst on to the provider.
+    """
+
+    def __init__(
+        self,
+        default_limit: Optional[int] = None,
+        model_limits: Optional[Dict[str, int]] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None
+    ):
+        self.default_limit = default_limit or int(os.getenv("CODEASSIST_MAX_CONCURRENCY", 16))
+        if model_limits is None:
+            model_limits = _parse_model_limits(os.getenv("CODEASSIST_MODEL_CONCURRENCY", ""))
+        self.model_limits = model_limits
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("CODEASSIST_MAX_QUEUE", 64))
+        self.queue_timeout = queue_timeout or float(os.getenv("CODEASSIST_QUEUE_TIMEOUT", 10.0))
+        self._limiters: Dict[str, ModelLimiter] = {}
+
+    def limiter(self, model: str) -> ModelLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = ModelLimiter(
+                model,
+                self.model_limits.get(model, self.default_limit),
+                self.max_queue,
+                self.queue_timeout,
+            )
+            self._limiters[model] = limiter
+        return limiter
+
+    def check_capacity(self, model: str):
+        """Fail fast (before starting a response) if ``model`` is saturated"""
+        self.limiter(model).check_capacity()
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Hold one upstream concurrency slot for ``model``"""
+        limiter = self.limiter(model)
+        await limiter.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_limit": self.default_limit,
+            "queue_timeout": self.queue_timeout,
+            "models": {model: limiter.stats() for model, limiter in self._limiters.items()},
+        }
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Return the process-wide admission controller"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
@@ -1,104 +1,544 @@
+"""Services module for CodeAssist"""
+import asyncio
+import atexit
 import json
 import os
-from datetime import datetime
-from pathlib import Path
-from typing import Dict, Any
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from services.analytics_store import JSONAnalyticsStore, create_analytics_store
+from services.shared_state import get_shared_store, shared_lock, worker_id
+from services.sketch import DDSketch, DecayedRate
+
+# Half-lives for the decayed request rates reported by ``get_stats``
+RATE_HORIZONS = {"1m": 60.0, "1h": 3600.0}
+
+# Shared-state keys: one summary per live worker, plus retired workers folded together
+WORKERS_KEY = "codeassist:analytics:workers"
+ARCHIVE_KEY = "codeassist:analytics:archive"
+# Set once the store's pre-shared-mode history has been folded into the archive
+MIGRATED_KEY = "codeassist:analytics:migrated"
+
+_SKETCH_KEYS = ("latency", "first_token_latency")
 
 class AnalyticsService:
-    """Simple analytics tracking service"""
-    
-    def __init__(self):
-        self.analytics_file = Path("analytics.json")
-        self._ensure_analytics_file()
-    
+    """Analytics tracking service
+
+    Counters live in memory and are updated without touching the disk. A
+    background flusher persists them every ``flush_interval`` seconds or once
+    ``flush_events`` updates are pending. Storage is pluggable: the JSON file
+    (default, for development) or SQLite, which also keeps an event log and
+    minute/hour/day rollups for ``query_range`` (see ``analytics_store``).
+
+    Latencies are kept as DDSketches (overall, per request type and per
+    day) and request rates as exponentially decayed counters, so updates
+    are O(1), percentiles cover all traffic and the file stays small.
+    Per-day sketches older than ``retention_days`` are dropped.
+
+    With a shared store (``CODEASSIST_SHARED_STATE``), each worker publishes
+    its own summary under its worker id instead of writing a common file,
+    and ``get_stats`` merges every worker's summary. A worker that shuts down
+    folds its summary into a shared archive entry. Workers republish every
+    flush interval as a heartbeat; one silent for ``worker_ttl`` seconds
+    (crashed or killed) is archived by whichever worker reads stats next.
+    History already in the store when shared mode is first enabled is
+    folded into the archive once.
+    """
+
+    def __init__(
+        self,
+        analytics_file: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        flush_events: Optional[int] = None,
+        retention_days: Optional[int] = None,
+        worker_ttl: Optional[float] = None,
+        store=None,
+        shared=None
+    ):
+        if store is None:
+            store = JSONAnalyticsStore(analytics_file) if analytics_file else create_analytics_store()
+        self.store = store
+        self.shared = shared if shared is not None else get_shared_store()
+        self.flush_interval = flush_interval or float(os.getenv("CODEASSIST_ANALYTICS_FLUSH_INTERVAL", 5.0))
+        self.flush_events = flush_events or int(os.getenv("CODEASSIST_ANALYTICS_FLUSH_EVENTS", 50))
+        self.retention_days = retention_days or int(os.getenv("CODEASSIST_ANALYTICS_RETENTION_DAYS", 30))
+        self.worker_ttl = worker_ttl or float(os.getenv("CODEASSIST_ANALYTICS_WORKER_TTL", 600))
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = 0
+        self._events: List[Dict[str, Any]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._published = False
+
+        self._latency: Dict[str, DDSketch] = {}
+        self._latency_by_day: Dict[str, Dict[str, DDSketch]] = {}
+        self._first_token: Dict[str, DDSketch] = {}
+        self._rates: Dict[str, Dict[str, DecayedRate]] = {}
+
+        if self.shared is None:
+            self._ensure_analytics_file()
+            self._data = self._load_data()
+        else:
+            # Each worker starts its own slice; history lives in shared state
+            self._migrate_history()
+            self._data = self._initial_data()
+        self._load_summaries()
+
+    @staticmethod
+    def _initial_data() -> Dict[str, Any]:
+        return {
+            "total_requests": 0,
+            "completion_requests": 0,
+            "review_requests": 0,
+            "explanation_requests": 0,
+            "successful_requests": 0,
+            "failed_requests": 0,
+            "first_request": None,
+            "last_request": None,
+            "requests_by_day": {},
+            "latency": {},
+            "latency_by_day": {},
+            "first_token_latency": {},
+            "rates": {},
+            "estimated_input_tokens": 0,
+            "estimated_output_tokens": 0,
+            "tokens_by_type": {}
+        }
+
     def _ensure_analytics_file(self):
-        """Create analytics file if it doesn't exist"""
-        if not self.analytics_file.exists():
-            initial_data = {
-                "total_requests": 0,
-                "completion_requests": 0,
-                "review_requests": 0,
-                "explanation_requests": 0,
-                "successful_requests": 0,
-                "failed_requests": 0,
-                "average_response_time": 0.0,
-                "first_request": None,
-                "last_request": None,
-                "requests_by_day": {},
-                "response_times": []
-            }
-            self._save_data(initial_data)
-    
+        """Create the analytics store if it is empty"""
+        if self.store.load() is None:
+            self.store.save(self._initial_data(), [])
+
     def _load_data(self) -> Dict[str, Any]:
-        """Load analytics data"""
-        try:
-            with open(self.analytics_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    
-    def _save_data(self, data: Dict[str, Any]):
-        """Save analytics data"""
-        with open(self.analytics_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    
-    def track_request(self, request_type: str, success: bool, response_time: float = 0.0):
-        """Track a request"""
-        data = self._load_data()
+        """Load analytics data, filling in any missing keys"""
+        data = self._initial_data()
+        data.update(self.store.load() or {})
+        return data
+
+    def _migrate_history(self):
+        """Fold the store's summary from before shared mode into the shared archive, once"""
+        history = self.store.load()
+        if not history:
+            return
+        with shared_lock(self.shared, ARCHIVE_KEY):
+            if not self.shared.set(MIGRATED_KEY, str(time.time()), nx=True):
+                return
+            # Reuse the normal load path so old sample-list files are converted too
+            self._data = self._initial_data()
+            self._data.update(history)
+            self._load_summaries()
+            archive = self.shared.get(ARCHIVE_KEY)
+            states = [json.loads(archive)] if archive else []
+            self.shared.set(ARCHIVE_KEY, json.dumps(merge_states(states + [self._state()])))
+
+    def _load_summaries(self):
+        """Rebuild sketches and rates from loaded data, migrating old sample lists"""
+        data = self._data
+        self._latency = {name: DDSketch.from_dict(d) for name, d in data["latency"].items()}
+        self._latency_by_day = {
+            day: {name: DDSketch.from_dict(d) for name, d in sketches.items()}
+            for day, sketches in data["latency_by_day"].items()
+        }
+        self._first_token = {name: DDSketch.from_dict(d) for name, d in data["first_token_latency"].items()}
+        self._rates = {
+            name: {horizon: DecayedRate.from_dict(d) for horizon, d in rates.items()}
+            for name, rates in data["rates"].items()
+        }
+
+        # Files written before sketches existed hold raw sample lists
+        for key, target in (("response_times", self._latency), ("first_token_times", self._first_token)):
+            samples = data.pop(key, None)
+            if samples and "all" not in target:
+                sketch = target["all"] = DDSketch()
+                for value in samples:
+                    sketch.add(value)
+        data.pop("average_response_time", None)
+        data.pop("average_time_to_first_token", None)
+
+    @staticmethod
+    def _sketch(sketches: Dict[str, DDSketch], name: str) -> DDSketch:
+        sketch = sketches.get(name)
+        if sketch is None:
+            sketch = sketches[name] = DDSketch()
+        return sketch
+
+    def _count_rate(self, name: str, now: float):
+        rates = self._rates.get(name)
+        if rates is None:
+            rates = self._rates[name] = {horizon: DecayedRate(half_life) for horizon, half_life in RATE_HORIZONS.items()}
+        for rate in rates.values():
+            rate.add(1.0, now)
+
+    def _record_event(self, kind: str, request_type: str, model: Optional[str], **fields):
+        """Queue a raw event for stores that keep an event log (caller holds the lock)"""
+        if self.store.records_events:
+            self._events.append({"ts": time.time(), "kind": kind, "request_type": request_type, "model": model, **fields})
+
+    def track_request(self, request_type: str, success: bool, response_time: float = 0.0, model: Optional[str] = None):
+        """Track a request (in memory; persisted by the flusher)"""
         now = datetime.now().isoformat()
         today = datetime.now().strftime("%Y-%m-%d")
-        
-        # Update counters
-        data["total_requests"] += 1
-        data[f"{request_type}_requests"] = data.get(f"{request_type}_requests", 0) + 1
-        
-        if success:
-            data["successful_requests"] += 1
-        else:
-            data["failed_requests"] += 1
-        
-        # Track response times
-        if response_time > 0:
-            data["response_times"].append(response_time)
-            # Keep only last 1000 response times to prevent file from growing too large
-            if len(data["response_times"]) > 1000:
-                data["response_times"] = data["response_times"][-1000:]
-            data["average_response_time"] = sum(data["response_times"]) / len(data["response_times"])
-        
-        # Track by day
-        if today not in data["requests_by_day"]:
-            data["requests_by_day"][today] = 0
-        data["requests_by_day"][today] += 1
-        
-        # Update timestamps
-        if not data["first_request"]:
-            data["first_request"] = now
-        data["last_request"] = now
-        
-        self._save_data(data)
-    
+
+        with self._lock:
+            data = self._data
+
+            # Update counters
+            data["total_requests"] += 1
+            data[f"{request_type}_requests"] = data.get(f"{request_type}_requests", 0) + 1
+
+            if success:
+                data["successful_requests"] += 1
+            else:
+                data["failed_requests"] += 1
+
+            # Track response times
+            if response_time > 0:
+                day = self._latency_by_day.setdefault(today, {})
+                for sketches in (self._latency, day):
+                    self._sketch(sketches, "all").add(response_time)
+                    self._sketch(sketches, request_type).add(response_time)
+
+            clock = time.time()
+            self._count_rate("all", clock)
+            self._count_rate(request_type, clock)
+            self._record_event("request", request_type, model, success=int(success), value=response_time or None)
+
+            # Track by day
+            data["requests_by_day"][today] = data["requests_by_day"].get(today, 0) + 1
+
+            # Update timestamps
+            if not data["first_request"]:
+                data["first_request"] = now
+            data["last_request"] = now
+
+            self._pending += 1
+            batch_full = self._pending >= self.flush_events
+
+        if batch_full:
+            if self._flusher is not None and self._loop is not None:
+                self._loop.call_soon_threadsafe(self._flush_event.set)
+            else:
+                # No background flusher (e.g. CLI usage): flush inline per batch
+                self.flush()
+
+    def track_first_token(self, request_type: str, time_to_first_token: float, model: Optional[str] = None):
+        """Track time-to-first-token for a streamed response"""
+        with self._lock:
+            data = self._data
+            self._sketch(self._first_token, "all").add(time_to_first_token)
+            self._sketch(self._first_token, request_type).add(time_to_first_token)
+            key = f"{request_type}_streamed_requests"
+            data[key] = data.get(key, 0) + 1
+            self._record_event("first_token", request_type, model, value=time_to_first_token)
+            self._pending += 1
+
+    def track_tokens(self, request_type: str, input_tokens: int, output_tokens: int, model: Optional[str] = None):
+        """Track estimated input/output tokens for a request"""
+        with self._lock:
+            data = self._data
+            data["estimated_input_tokens"] += input_tokens
+            data["estimated_output_tokens"] += output_tokens
+            by_type = data["tokens_by_type"].setdefault(request_type, {"input": 0, "output": 0})
+            by_type["input"] += input_tokens
+            by_type["output"] += output_tokens
+            self._record_event("tokens", request_type, model, input_tokens=input_tokens, output_tokens=output_tokens)
+            self._pending += 1
+
+    def _snapshot(self, force: bool = False) -> Optional[tuple]:
+        """Copy the current data and queued events if there are unsaved updates (or ``force``)"""
+        with self._lock:
+            if not self._pending and not force:
+                return None
+            self._pending = 0
+            self._expire_days()
+            events, self._events = self._events, []
+            return self._state(), events
+
+    def _state(self) -> Dict[str, Any]:
+        """JSON-ready copy of this process's summary (caller holds the lock)"""
+        data = dict(self._data)
+        data["latency"] = {name: sketch.to_dict() for name, sketch in self._latency.items()}
+        data["latency_by_day"] = {
+            day: {name: sketch.to_dict() for name, sketch in sketches.items()}
+            for day, sketches in self._latency_by_day.items()
+        }
+        data["first_token_latency"] = {name: sketch.to_dict() for name, sketch in self._first_token.items()}
+        data["rates"] = {
+            name: {horizon: rate.to_dict() for horizon, rate in rates.items()}
+            for name, rates in self._rates.items()
+        }
+        return json.loads(json.dumps(data))
+
+    def _expire_days(self):
+        """Drop per-day sketches outside the retention window"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        for day in [day for day in self._latency_by_day if day < cutoff]:
+            del self._latency_by_day[day]
+        by_day = self._data["requests_by_day"]
+        for day in [day for day in by_day if day < cutoff]:
+            del by_day[day]
+
+    def flush(self):
+        """Write pending updates to the store synchronously"""
+        # Shared mode always republishes: the entry's timestamp is the worker's heartbeat
+        snapshot = self._snapshot(force=self.shared is not None)
+        if snapshot is not None:
+            state, events = snapshot
+            with self._write_lock:
+                if self.shared is None:
+                    self.store.save(state, events)
+                else:
+                    if events:
+                        self.store.save(None, events)
+                    self._publish(state)
+
+    def _publish(self, state: Dict[str, Any]):
+        """Write this worker's summary and heartbeat to shared state"""
+        with shared_lock(self.shared, ARCHIVE_KEY):
+            if self._published and worker_id() not in self.shared.hgetall(WORKERS_KEY):
+                # Archived as dead while this process was stalled; the archive
+                # holds the last published summary, so start over from zero
+                with self._lock:
+                    self._data = self._initial_data()
+                    self._load_summaries()
+                    state = self._state()
+            self.shared.hset(WORKERS_KEY, worker_id(), json.dumps(
+                {"pid": os.getpid(), "updated": time.time(), "state": state}
+            ))
+            self._published = True
+
+    def _retire(self):
+        """Fold this worker's summary into the shared archive and drop its entry"""
+        with self._lock:
+            state = self._state()
+        with shared_lock(self.shared, ARCHIVE_KEY):
+            archive = self.shared.get(ARCHIVE_KEY)
+            states = [json.loads(archive)] if archive else []
+            self.shared.set(ARCHIVE_KEY, json.dumps(merge_states(states + [state])))
+            self.shared.hdel(WORKERS_KEY, worker_id())
+            self._published = False
+        with self._lock:
+            # Archived; keep counting from zero if this process carries on
+            self._data = self._initial_data()
+            self._load_summaries()
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Live workers publishing to shared state"""
+        if self.shared is None:
+            return [{"worker_id": worker_id(), "pid": os.getpid(), "total_requests": self._data["total_requests"]}]
+        workers = []
+        for wid, entry in self._worker_entries().items():
+            workers.append({
+                "worker_id": wid,
+                "pid": entry["pid"],
+                "last_flush": round(time.time() - entry["updated"], 1),
+                "total_requests": entry["state"].get("total_requests", 0),
+            })
+        return sorted(workers, key=lambda worker: worker["worker_id"])
+
+    def _worker_entries(self) -> Dict[str, Dict[str, Any]]:
+        """Published worker entries, after archiving those whose heartbeat is older than ``worker_ttl``"""
+        entries = {wid: json.loads(entry) for wid, entry in self.shared.hgetall(WORKERS_KEY).items()}
+        cutoff = time.time() - self.worker_ttl
+        if any(entry["updated"] < cutoff for wid, entry in entries.items() if wid != worker_id()):
+            with shared_lock(self.shared, ARCHIVE_KEY):
+                # Re-read under the lock: another reader may have archived them, or they came back
+                current = {wid: json.loads(entry) for wid, entry in self.shared.hgetall(WORKERS_KEY).items()}
+                stale = [wid for wid, entry in current.items() if entry["updated"] < cutoff and wid != worker_id()]
+                if stale:
+                    archive = self.shared.get(ARCHIVE_KEY)
+                    states = ([json.loads(archive)] if archive else []) + [current[wid]["state"] for wid in stale]
+                    self.shared.set(ARCHIVE_KEY, json.dumps(merge_states(states)))
+                    for wid in stale:
+                        self.shared.hdel(WORKERS_KEY, wid)
+                        del current[wid]
+            entries = current
+        return entries
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await asyncio.to_thread(self.flush)
+
+    async def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._flusher is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._flush_event = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flusher and persist anything still pending"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+            self._loop = None
+        await asyncio.to_thread(self.flush)
+        if self.shared is not None:
+            await asyncio.to_thread(self._retire)
+
+    def query_range(self, start: float, end: Optional[float] = None, **kwargs) -> List[Dict[str, Any]]:
+        """Rollup query over ``[start, end)`` epoch seconds (sqlite backend only)
+
+        Pending events are flushed first so the answer includes them.
+        """
+        self.flush()
+        return self.store.query(start, end if end is not None else time.time(), **kwargs)
+
+    def _combined_state(self) -> Dict[str, Any]:
+        """This worker's summary merged with every other worker's, live or retired"""
+        with self._lock:
+            state = self._state()
+        if self.shared is None:
+            return state
+        states = [state]
+        for wid, entry in self._worker_entries().items():
+            if wid != worker_id():
+                states.append(entry["state"])
+        archive = self.shared.get(ARCHIVE_KEY)
+        if archive:
+            states.append(json.loads(archive))
+        return merge_states(states)
+
+    def get_daily_latency(self, day: str, request_type: str = "all") -> Dict[str, Any]:
+        """Latency summary for one ``YYYY-MM-DD`` day (empty if none recorded)"""
+        sketch = self._combined_state()["latency_by_day"].get(day, {}).get(request_type)
+        return DDSketch.from_dict(sketch).summary() if sketch else DDSketch().summary()
+
     def get_stats(self) -> Dict[str, Any]:
-        """Get current analytics stats"""
-        data = self._load_data()
-        
+        """Get current analytics stats (across all workers when state is shared)"""
+        data = self._combined_state()
+        total = data["total_requests"]
+        successful = data["successful_requests"]
+        latency = {name: DDSketch.from_dict(d).summary() for name, d in data["latency"].items()}
+        first_token = {name: DDSketch.from_dict(d).summary() for name, d in data["first_token_latency"].items()}
+        clock = time.time()
+        rates = {
+            name: {horizon: round(DecayedRate.from_dict(d).rate(clock) * 60, 2) for horizon, d in horizons.items()}
+            for name, horizons in data["rates"].items()
+        }
+        first_request = data.get("first_request")
+        by_type = {
+            key: data.get(key, 0)
+            for key in ("completion_requests", "review_requests", "explanation_requests")
+        }
+
         # Calculate uptime
-        if data.get("first_request"):
-            first = datetime.fromisoformat(data["first_request"])
+        if first_request:
+            first = datetime.fromisoformat(first_request)
             days_running = (datetime.now() - first).days + 1
         else:
             days_running = 0
-        
+
         # Calculate success rate
-        total = data["total_requests"]
-        success_rate = (data["successful_requests"] / total * 100) if total > 0 else 0
-        
+        success_rate = (successful / total * 100) if total > 0 else 0
+        overall = latency.get("all", DDSketch().summary())
+        overall_ttft = first_token.get("all", DDSketch().summary())
+
         return {
             "total_requests": total,
             "success_rate": round(success_rate, 1),
-            "average_response_time": round(data["average_response_time"], 2),
+            "average_response_time": round(overall["mean"], 2),
+            "response_time_percentiles": {key: overall[key] for key in ("p50", "p95", "p99")},
+            "response_time_by_type": {name: summary for name, summary in latency.items() if name != "all"},
+            "average_time_to_first_token": round(overall_ttft["mean"], 3),
+            "time_to_first_token_percentiles": {key: overall_ttft[key] for key in ("p50", "p95", "p99")},
+            "streamed_samples": overall_ttft["count"],
+            "requests_per_minute": rates,
+            "estimated_input_tokens": data["estimated_input_tokens"],
+            "estimated_output_tokens": data["estimated_output_tokens"],
             "days_running": days_running,
             "requests_per_day": round(total / days_running, 1) if days_running > 0 else 0,
-            "completion_requests": data.get("completion_requests", 0),
-            "review_requests": data.get("review_requests", 0),
-            "explanation_requests": data.get("explanation_requests", 0)
-        }
\ No newline at end of file
+            **by_type
+        }
+
+
+def _merge_sketch(target: Dict[str, DDSketch], name: str, data: Dict[str, Any]):
+    sketch = DDSketch.from_dict(data)
+    if name in target:
+        target[name].merge(sketch)
+    else:
+        target[name] = sketch
+
+
+def merge_states(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine analytics summaries from several workers into one"""
+    merged = AnalyticsService._initial_data()
+    sketches: Dict[str, Dict[str, DDSketch]] = {key: {} for key in _SKETCH_KEYS}
+    by_day: Dict[str, Dict[str, DDSketch]] = {}
+    rates: Dict[str, Dict[str, DecayedRate]] = {}
+
+    for state in states:
+        for key, value in state.items():
+            if key in _SKETCH_KEYS:
+                for name, data in value.items():
+                    _merge_sketch(sketches[key], name, data)
+            elif key == "latency_by_day":
+                for day, named in value.items():
+                    for name, data in named.items():
+                        _merge_sketch(by_day.setdefault(day, {}), name, data)
+            elif key == "rates":
+                for name, horizons in value.items():
+                    for horizon, data in horizons.items():
+                        target = rates.setdefault(name, {})
+                        rate = DecayedRate.from_dict(data)
+                        if horizon in target:
+                            target[horizon].merge(rate)
+                        else:
+                            target[horizon] = rate
+            elif key == "first_request":
+                if value and (merged[key] is None or value < merged[key]):
+                    merged[key] = value
+            elif key == "last_request":
+                if value and (merged[key] is None or value > merged[key]):
+                    merged[key] = value
+            elif key == "requests_by_day":
+                for day, count in value.items():
+                    merged[key][day] = merged[key].get(day, 0) + count
+            elif key == "tokens_by_type":
+                for name, counts in value.items():
+                    target = merged[key].setdefault(name, {"input": 0, "output": 0})
+                    for field, count in counts.items():
+                        target[field] = target.get(field, 0) + count
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+
+    for key in _SKETCH_KEYS:
+        merged[key] = {name: sketch.to_dict() for name, sketch in sketches[key].items()}
+    merged["latency_by_day"] = {
+        day: {name: sketch.to_dict() for name, sketch in named.items()} for day, named in by_day.items()
+    }
+    merged["rates"] = {
+        name: {horizon: rate.to_dict() for horizon, rate in horizons.items()} for name, horizons in rates.items()
+    }
+    return merged
+
+
+_analytics: Optional[AnalyticsService] = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics_service() -> AnalyticsService:
+    """Return the process-wide analytics service shared by all routes"""
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = AnalyticsService()
+            atexit.register(_analytics.flush)
+        return _analytics
+
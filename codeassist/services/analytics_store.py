@@ -0,0 +1,276 @@
+"""Storage backends for ``AnalyticsService``
+
+``JSONAnalyticsStore`` keeps the single ``analytics.json`` file (handy for
+development). ``SQLiteAnalyticsStore`` appends raw events in batches, folds
+them into minute/hour/day rollup tables and answers range queries such as
+"p95 per model over the last 24h" from the rollups.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.sketch import DDSketch
+
+# Rollup bucket widths in seconds
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+
+# How long each table keeps rows (seconds); None keeps them forever
+DEFAULT_RETENTION = {
+    "events": 2 * 86400,
+    "minute": 2 * 86400,
+    "hour": 90 * 86400,
+    "day": None,
+}
+
+GROUP_COLUMNS = ("request_type", "model")
+
+
+class JSONAnalyticsStore:
+    """Whole-state snapshots in one JSON file, replaced atomically"""
+
+    records_events = False
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state: Optional[Dict[str, Any]], events: List[Dict[str, Any]]):
+        """Atomically replace the analytics file with ``state``"""
+        if state is None:
+            return
+        directory = self.path.parent
+        fd, tmp_path = tempfile.mkstemp(prefix=".analytics-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def query(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        raise NotImplementedError("Range queries need the sqlite analytics backend")
+
+    def close(self):
+        pass
+
+
+class SQLiteAnalyticsStore:
+    """Event log plus time-bucketed rollups in a WAL-mode SQLite database"""
+
+    records_events = True
+
+    def __init__(self, path: str, retention: Optional[Dict[str, Optional[int]]] = None):
+        self.path = path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._lock = threading.Lock()
+        # Autocommit mode; save() opens its own write transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS events ("
+            " ts REAL NOT NULL, kind TEXT NOT NULL, request_type TEXT NOT NULL, model TEXT NOT NULL,"
+            " success INTEGER, value REAL, input_tokens INTEGER, output_tokens INTEGER);"
+            "CREATE INDEX IF NOT EXISTS events_ts ON events (ts);"
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " granularity TEXT NOT NULL, bucket INTEGER NOT NULL, kind TEXT NOT NULL,"
+            " request_type TEXT NOT NULL, model TEXT NOT NULL,"
+            " count INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0,"
+            " input_tokens INTEGER NOT NULL DEFAULT 0, output_tokens INTEGER NOT NULL DEFAULT 0,"
+            " sketch TEXT,"
+            " PRIMARY KEY (granularity, bucket, kind, request_type, model));"
+        )
+        self._last_prune = 0.0
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'summary'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, state: Optional[Dict[str, Any]], events: List[Dict[str, Any]]):
+        """Persist the summary state and append ``events`` in one transaction
+
+        ``state`` is None when workers keep their summaries in shared state;
+        the event log and rollups are still written here. The transaction
+        takes the write lock up front so concurrent workers merging into the
+        same rollup rows never lose an update.
+        """
+        rollups = self._aggregate(events)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(state, events, rollups)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _write(self, state: Optional[Dict[str, Any]], events: List[Dict[str, Any]], rollups: Dict[tuple, Dict[str, Any]]):
+        if state is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('summary', ?)", (json.dumps(state),)
+            )
+        self._conn.executemany(
+            "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (e["ts"], e["kind"], e["request_type"], e.get("model") or "unknown", e.get("success"),
+                 e.get("value"), e.get("input_tokens"), e.get("output_tokens"))
+                for e in events
+            ],
+        )
+        for key, rollup in rollups.items():
+            self._merge_rollup(key, rollup)
+        if time.time() - self._last_prune > 60:
+            self._prune()
+            self._last_prune = time.time()
+
+    @staticmethod
+    def _aggregate(events: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """Fold a batch of events into per-bucket rollups in memory"""
+        rollups: Dict[tuple, Dict[str, Any]] = {}
+        for event in events:
+            for granularity, width in GRANULARITIES.items():
+                key = (granularity, int(event["ts"] // width * width), event["kind"],
+                       event["request_type"], event.get("model") or "unknown")
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = rollups[key] = {"count": 0, "failures": 0, "input_tokens": 0, "output_tokens": 0, "sketch": None}
+                rollup["count"] += 1
+                if event.get("success") == 0:
+                    rollup["failures"] += 1
+                rollup["input_tokens"] += event.get("input_tokens") or 0
+                rollup["output_tokens"] += event.get("output_tokens") or 0
+                if event.get("value"):
+                    if rollup["sketch"] is None:
+                        rollup["sketch"] = DDSketch()
+                    rollup["sketch"].add(event["value"])
+        return rollups
+
+    def _merge_rollup(self, key: tuple, rollup: Dict[str, Any]):
+        row = self._conn.execute(
+            "SELECT sketch FROM rollups WHERE granularity = ? AND bucket = ? AND kind = ? AND request_type = ? AND model = ?",
+            key,
+        ).fetchone()
+        sketch = rollup["sketch"]
+        if row and row[0]:
+            existing = DDSketch.from_dict(json.loads(row[0]))
+            if sketch is not None:
+                existing.merge(sketch)
+            sketch = existing
+        self._conn.execute(
+            "INSERT INTO rollups (granularity, bucket, kind, request_type, model, count, failures,"
+            " input_tokens, output_tokens, sketch) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (granularity, bucket, kind, request_type, model) DO UPDATE SET"
+            " count = count + excluded.count, failures = failures + excluded.failures,"
+            " input_tokens = input_tokens + excluded.input_tokens,"
+            " output_tokens = output_tokens + excluded.output_tokens, sketch = excluded.sketch",
+            key + (rollup["count"], rollup["failures"], rollup["input_tokens"], rollup["output_tokens"],
+                   json.dumps(sketch.to_dict()) if sketch is not None else None),
+        )
+
+    def _prune(self):
+        """Drop raw events and fine-grained rollups outside their retention window"""
+        now = time.time()
+        if self.retention.get("events"):
+            self._conn.execute("DELETE FROM events WHERE ts < ?", (now - self.retention["events"],))
+        for granularity in GRANULARITIES:
+            keep = self.retention.get(granularity)
+            if keep:
+                self._conn.execute(
+                    "DELETE FROM rollups WHERE granularity = ? AND bucket < ?", (granularity, now - keep)
+                )
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        granularity: str = "hour",
+        group_by: Optional[str] = None,
+        kind: str = "request",
+        request_type: Optional[str] = None,
+        model: Optional[str] = None,
+        buckets: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Latency and volume between ``start`` and ``end`` (epoch seconds)
+
+        Returns one row per bucket (and group), or one row per group when
+        ``buckets`` is false, merging the rollup sketches so percentiles are
+        exact to the sketch's accuracy over the whole range.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        if group_by is not None and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {group_by}; use one of: {', '.join(GROUP_COLUMNS)}")
+
+        width = GRANULARITIES[granularity]
+        sql = (
+            "SELECT bucket, request_type, model, count, failures, input_tokens, output_tokens, sketch FROM rollups"
+            " WHERE granularity = ? AND kind = ? AND bucket >= ? AND bucket < ?"
+        )
+        params: List[Any] = [granularity, kind, int(start // width * width), end]
+        if request_type:
+            sql += " AND request_type = ?"
+            params.append(request_type)
+        if model:
+            sql += " AND model = ?"
+            params.append(model)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY bucket", params).fetchall()
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for bucket, row_type, row_model, count, failures, input_tokens, output_tokens, sketch in rows:
+            group = {"request_type": row_type, "model": row_model}.get(group_by) if group_by else None
+            key = (bucket if buckets else None, group)
+            entry = groups.get(key)
+            if entry is None:
+                entry = groups[key] = {"count": 0, "failures": 0, "input_tokens": 0, "output_tokens": 0, "sketch": DDSketch()}
+            entry["count"] += count
+            entry["failures"] += failures
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            if sketch:
+                entry["sketch"].merge(DDSketch.from_dict(json.loads(sketch)))
+
+        results = []
+        for (bucket, group), entry in groups.items():
+            latency = entry.pop("sketch").summary()
+            row = {}
+            if bucket is not None:
+                row["bucket"] = bucket
+            if group_by:
+                row[group_by] = group
+            row.update(entry)
+            row["latency"] = {key: latency[key] for key in ("mean", "p50", "p95", "p99", "max")}
+            results.append(row)
+        return results
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_analytics_store(backend: Optional[str] = None, path: Optional[str] = None):
+    """Build the store named by ``backend`` (``json`` or ``sqlite``)"""
+    backend = (backend or os.getenv("CODEASSIST_ANALYTICS_BACKEND", "json")).lower()
+    if backend == "json":
+        return JSONAnalyticsStore(path or os.getenv("CODEASSIST_ANALYTICS_FILE", "analytics.json"))
+    if backend == "sqlite":
+        retention = {}
+        if os.getenv("CODEASSIST_ANALYTICS_EVENT_RETENTION_HOURS"):
+            retention["events"] = int(float(os.getenv("CODEASSIST_ANALYTICS_EVENT_RETENTION_HOURS")) * 3600)
+        return SQLiteAnalyticsStore(path or os.getenv("CODEASSIST_ANALYTICS_DB", "analytics.db"), retention)
+    raise ValueError(f"Unknown analytics backend: {backend}")
@@ -0,0 +1,159 @@
+"""Split Python source into reviewable chunks at function/class boundaries"""
+import ast
+import hashlib
+from typing import List
+
+from services.token_budget import count_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count used for chunk budgeting"""
+    return count_tokens(text)
+
+
+class CodeChunk:
+    """A contiguous, line-anchored slice of a source file"""
+
+    def __init__(self, name: str, kind: str, start_line: int, end_line: int, code: str):
+        self.name = name
+        self.kind = kind
+        self.start_line = start_line
+        self.end_line = end_line
+        self.code = code
+
+    @property
+    def digest(self) -> str:
+        """Content hash; unchanged code keeps its digest when lines shift"""
+        return hashlib.sha256(self.code.encode("utf-8")).hexdigest()
+
+    def numbered(self) -> str:
+        """Code with chunk-relative line numbers for the model to cite"""
+        return "\n".join(f"{i:>4} | {line}" for i, line in enumerate(self.code.splitlines(), 1))
+
+    def __repr__(self):
+        return f"CodeChunk({self.kind} {self.name!r}, lines {self.start_line}-{self.end_line})"
+
+
+def _slice(lines: List[str], start: int, end: int) -> str:
+    return "\n".join(lines[start - 1:end])
+
+
+def _make_chunk(name: str, kind: str, lines: List[str], start: int, end: int) -> CodeChunk:
+    """Build a chunk, trimming blank edge lines so spacing edits keep its digest"""
+    while start < end and not lines[start - 1].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return CodeChunk(name, kind, start, end, _slice(lines, start, end))
+
+
+def _window_chunks(lines: List[str], start: int, end: int, name: str, kind: str, max_tokens: int) -> List[CodeChunk]:
+    """Split a line range into windows that each fit the token budget"""
+    chunks = []
+    window_start = start
+    tokens = 0
+    for lineno in range(start, end + 1):
+        line_tokens = estimate_tokens(lines[lineno - 1]) if lineno <= len(lines) else 0
+        if tokens + line_tokens > max_tokens and lineno > window_start:
+            chunks.append((window_start, lineno - 1))
+            window_start, tokens = lineno, 0
+        tokens += line_tokens
+    chunks.append((window_start, end))
+
+    if len(chunks) == 1:
+        return [_make_chunk(name, kind, lines, start, end)]
+    return [
+        _make_chunk(f"{name} (part {i})", kind, lines, s, e)
+        for i, (s, e) in enumerate(chunks, 1)
+    ]
+
+
+def _definition_kind(node: ast.AST) -> str:
+    return "class" if isinstance(node, ast.ClassDef) else "function"
+
+
+def _chunk_definition(node: ast.AST, lines: List[str], start: int, end: int, name: str, max_tokens: int) -> List[CodeChunk]:
+    """Chunk a function or class, descending into methods when it is too big"""
+    code = _slice(lines, start, end)
+    kind = _definition_kind(node)
+    if estimate_tokens(code) <= max_tokens:
+        return [_make_chunk(name, kind, lines, start, end)]
+
+    if isinstance(node, ast.ClassDef):
+        members = [
+            child for child in node.body
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        ]
+        if members:
+            chunks = []
+            # Class line, docstring and attributes up to the first member
+            body_start = min([members[0].lineno] + [d.lineno for d in members[0].decorator_list])
+            if body_start > start:
+                chunks.extend(_window_chunks(lines, start, body_start - 1, f"{name} (header)", "class", max_tokens))
+            # Gaps between members (blank lines, comments) join the member that follows
+            for child in members:
+                chunks.extend(_chunk_definition(
+                    child, lines, body_start, child.end_lineno, f"{name}.{child.name}", max_tokens
+                ))
+                body_start = child.end_lineno + 1
+            if body_start <= end and _slice(lines, body_start, end).strip():
+                chunks.extend(_window_chunks(lines, body_start, end, f"{name} (body)", "class", max_tokens))
+            return chunks
+
+    return _window_chunks(lines, start, end, name, kind, max_tokens)
+
+
+def chunk_python_source(source: str, max_tokens: int = 1500) -> List[CodeChunk]:
+    """Split ``source`` into chunks of at most ``max_tokens`` (estimated)
+
+    Top-level functions and classes become their own chunks; runs of other
+    module-level statements are grouped together. Comments are attached to
+    the definition that follows them, so every non-blank line of the file
+    belongs to exactly one chunk. Unparseable source falls back to plain line
+    windows.
+    """
+    lines = source.splitlines()
+    if not lines:
+        return []
+
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return _window_chunks(lines, 1, len(lines), "module", "module", max_tokens)
+
+    chunks: List[CodeChunk] = []
+    group_start = None
+    group_end = None
+    next_start = 1
+
+    def flush_group():
+        nonlocal group_start
+        if group_start is not None:
+            chunks.extend(_window_chunks(lines, group_start, group_end, "module", "module", max_tokens))
+            group_start = None
+
+    for node in tree.body:
+        end = node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            flush_group()
+            chunks.extend(_chunk_definition(node, lines, next_start, end, node.name, max_tokens))
+        else:
+            if group_start is None:
+                group_start = next_start
+            elif estimate_tokens(_slice(lines, group_start, end)) > max_tokens:
+                flush_group()
+                group_start = next_start
+            group_end = end
+        next_start = end + 1
+
+    # Trailing comments/blank lines join the last chunk
+    if not chunks and group_start is None:
+        return _window_chunks(lines, 1, len(lines), "module", "module", max_tokens)
+    if group_start is not None:
+        group_end = len(lines)
+        flush_group()
+    elif chunks and next_start <= len(lines):
+        last = chunks[-1]
+        chunks[-1] = _make_chunk(last.name, last.kind, lines, last.start_line, len(lines))
+
+    return chunks
@@ -3,19 +3,45 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from models.llm_client import LLMClient
+from services.token_budget import fit_prompt, count_tokens
 
 class CodeCompleter:
     """Service for intelligent code completion"""
     
     def __init__(self, model: str = "gpt-3.5-turbo"):
         self.llm = LLMClient(model=model)
+        self.model = model
+        # Estimated tokens of the most recent call: input, output, truncated
+        self.last_usage = {}
     
-    async def complete(self, code: str, context: Optional[str] = None) -> str:
-        """Complete the given code snippet"""
+    async def complete(self, code: str, context: Optional[str] = None, project_context: Optional[str] = None) -> str:
+        """Complete the given code snippet
+        
+        ``project_context`` holds related definitions from the project, as
+        returned by ``SymbolIndex.context_for``.
+        """
+        
+        messages, usage = fit_prompt(
+            self.model,
+            code,
+            lambda code: self._build_completion_messages(code, context, project_context),
+            max_output_tokens=500,
+            keep="end"
+        )
+        
+        completion = (await self.llm.generate(messages, temperature=0.3, max_tokens=500)).strip()
+        usage["output_tokens"] = count_tokens(completion, self.model)
+        self.last_usage = usage
+        return completion
+    
+    def _build_completion_messages(self, code: str, context: Optional[str] = None, project_context: Optional[str] = None) -> list:
+        """Build the chat messages for a completion"""
         
         prompt = self._build_completion_prompt(code, context)
+        if project_context:
+            prompt = f"Relevant definitions from this project:\n\n```python\n{project_context}\n```\n\n" + prompt
         
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": """You are an expert Python programmer. Complete the code naturally and efficiently. 
@@ -26,9 +52,6 @@ class CodeCompleter:
                 "content": prompt
             }
         ]
-        
-        completion = await self.llm.generate(messages, temperature=0.3, max_tokens=500)
-        return completion
     
     def _build_completion_prompt(self, code: str, context: Optional[str] = None) -> str:
         """Build an effective prompt for code completion"""
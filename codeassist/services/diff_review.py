@@ -0,0 +1,428 @@
+"""Review only what a diff changed
+
+Each hunk's changed lines are mapped, with ``ast``, to the innermost
+function or method enclosing them. The region sent is that whole definition
+when it is short, otherwise the changed lines plus a few lines of context.
+Changes outside any function are sent with the same small context. Regions
+are numbered from 1 with changed lines marked, so a region's prompt depends
+only on its own code. A later commit that leaves a function alone produces
+the same prompt and reuses the earlier findings, from ``cache`` or the LLM
+client's response cache.
+"""
+import asyncio
+import ast
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from services.chunker import CodeChunk
+from services.directory_review import ReviewCache
+from services.file_pipeline import CHUNK_CONCURRENCY, ChunkResult
+from services.shared_state import get_shared_store
+from services.static_checks import analyze
+from services.symbol_index import INDEX_DIR
+from services.token_budget import get_token_counter
+
+# Definitions up to this many lines are sent whole; longer ones are windowed
+MAX_REGION_LINES = int(os.getenv("CODEASSIST_DIFF_MAX_REGION_LINES", 60))
+CONTEXT_LINES = int(os.getenv("CODEASSIST_DIFF_CONTEXT_LINES", 3))
+DIFF_CACHE_VERSION = 1
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+DIFF_REVIEW_SYSTEM_PROMPT = """You are an expert code reviewer reviewing a change to a Python file.
+You see one region of the new version of the file. Lines marked `+` were added or modified;
+a line marked `-` is where code was deleted just above it. Unmarked lines are unchanged context.
+
+Review only the change: bugs, security problems, performance issues or unclear code that the
+marked lines introduce or expose. Do not comment on unchanged code unless the change breaks it.
+Report each issue on its own line as `L<line>: <finding and suggested fix>`, using the line
+numbers shown to the left. If the change has no issues, reply exactly `No issues found.`"""
+
+
+class FileDiff:
+    """The hunks of one file in a unified diff, as new-file line numbers"""
+
+    def __init__(self, path: str, old_path: Optional[str] = None):
+        self.path = path
+        self.old_path = old_path
+        self.added: Set[int] = set()
+        self.deleted_before: Set[int] = set()
+        # Hunk text on the new side (context and added lines), by new line number
+        self.hunk_lines: Dict[int, str] = {}
+        self.deleted = False
+
+    @property
+    def changed(self) -> Set[int]:
+        return self.added | self.deleted_before
+
+
+def parse_unified_diff(diff: str) -> List[FileDiff]:
+    """Parse ``git diff`` / ``diff -u`` output; deleted files are skipped"""
+    files: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    old_path = None
+    new_line = 0
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            current, old_path = None, None
+        elif line.startswith("--- "):
+            old_path = _diff_path(line[4:])
+        elif line.startswith("+++ "):
+            path = _diff_path(line[4:])
+            current = FileDiff(path or old_path or "", old_path)
+            current.deleted = path is None
+            if not current.deleted:
+                files.append(current)
+        elif line.startswith("@@") and current is not None:
+            match = _HUNK_HEADER.match(line)
+            if match:
+                new_line = int(match.group(3))
+        elif current is not None and new_line:
+            if line.startswith("+"):
+                current.added.add(new_line)
+                current.hunk_lines[new_line] = line[1:]
+                new_line += 1
+            elif line.startswith("-"):
+                current.deleted_before.add(new_line)
+            elif line.startswith(" ") or line == "":
+                current.hunk_lines[new_line] = line[1:]
+                new_line += 1
+            # "\ No newline at end of file" and anything else carry no lines
+    return files
+
+
+def _diff_path(value: str) -> Optional[str]:
+    value = value.split("\t")[0].strip()
+    if value == "/dev/null":
+        return None
+    if value.startswith(("a/", "b/")):
+        value = value[2:]
+    return value
+
+
+def _definitions(source: str) -> Optional[List[Tuple[int, int, str, str]]]:
+    """``(start, end, qualname, kind)`` of every function and method, innermost last"""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    found = []
+
+    def visit(node: ast.AST, prefix: str):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = f"{prefix}{child.name}"
+                if not isinstance(child, ast.ClassDef):
+                    start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                    kind = "method" if isinstance(node, ast.ClassDef) else "function"
+                    found.append((start, child.end_lineno, name, kind))
+                visit(child, name + ".")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+    return found
+
+
+class DiffRegion:
+    """A span of the new file sent for review, with its changed lines"""
+
+    def __init__(self, path: str, name: str, kind: str, start: int, end: int, changed: Set[int], deleted: Set[int]):
+        self.path = path
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.changed = {line for line in changed if start <= line <= end}
+        self.deleted = {line for line in deleted if start <= line <= end}
+
+    def render(self, lines: Dict[int, str]) -> str:
+        """Region code numbered from 1, with change markers"""
+        rendered = []
+        for offset, number in enumerate(range(self.start, self.end + 1), 1):
+            marker = "+" if number in self.changed else "-" if number in self.deleted else " "
+            rendered.append(f"{offset:>4} {marker}| {lines.get(number, '')}")
+        return "\n".join(rendered)
+
+
+def map_regions(file_diff: FileDiff, source: Optional[str]) -> List[DiffRegion]:
+    """Regions covering every change in ``file_diff``
+
+    ``source`` is the new file; without it (or when it does not parse) the
+    regions are windows over the hunk's own lines.
+    """
+    changed = sorted(file_diff.changed)
+    if not changed:
+        return []
+    if source is not None:
+        total = len(source.splitlines())
+    else:
+        total = max(file_diff.hunk_lines) if file_diff.hunk_lines else max(changed)
+    definitions = _definitions(source) if source is not None and file_diff.path.endswith(".py") else None
+
+    spans: List[List[Any]] = []
+    for line in changed:
+        enclosing = None
+        for start, end, name, kind in definitions or []:
+            if start <= line <= end and (enclosing is None or start >= enclosing[0]):
+                enclosing = (start, end, name, kind)
+        if enclosing and enclosing[1] - enclosing[0] + 1 <= MAX_REGION_LINES:
+            span = [enclosing[0], enclosing[1], enclosing[2], enclosing[3]]
+        else:
+            low, high = max(1, line - CONTEXT_LINES), min(total, line + CONTEXT_LINES)
+            if enclosing:
+                low, high = max(low, enclosing[0]), min(high, enclosing[1])
+            span = [low, max(low, high), enclosing[2] if enclosing else "module", enclosing[3] if enclosing else "module"]
+        if spans and span[2] == spans[-1][2] and span[0] <= spans[-1][1] + 1:
+            # Overlapping or adjacent windows of the same definition merge
+            spans[-1][1] = max(spans[-1][1], span[1])
+        elif spans and span[1] <= spans[-1][1]:
+            continue  # inside the previous region, e.g. a nested function sent whole with its parent
+        else:
+            # Different definitions stay separate regions, so each keeps its own cache key
+            span[0] = max(span[0], spans[-1][1] + 1) if spans else span[0]
+            spans.append(span)
+    return [DiffRegion(file_diff.path, name, kind, start, end, file_diff.added, file_diff.deleted_before)
+            for start, end, name, kind in spans]
+
+
+def git_diff(repo: str, base: str, head: Optional[str] = None) -> str:
+    """``git diff base [head]``: the working tree when ``head`` is None"""
+    revisions = [base] + ([head] if head else [])
+    for revision in revisions:
+        # Revisions come from callers; never let one be read as an option
+        if not revision or revision.startswith("-"):
+            raise ValueError(f"Invalid git revision: {revision!r}")
+    return _git(repo, "diff", "--no-color", "--no-ext-diff", f"--unified={CONTEXT_LINES}", *revisions, "--")
+
+
+def git_file(repo: str, path: str, revision: Optional[str] = None) -> Optional[str]:
+    """File contents at ``revision`` (the working tree when None); None if missing"""
+    if revision is None:
+        try:
+            return (Path(repo) / path).read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
+    try:
+        return _git(repo, "show", f"{revision}:{path}")
+    except ValueError:
+        return None
+
+
+def git_toplevel(path: str) -> str:
+    return _git(path, "rev-parse", "--show-toplevel").strip()
+
+
+def _git(repo: str, *args: str) -> str:
+    try:
+        result = subprocess.run(["git", "-C", repo, *args], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ValueError(f"git {args[0]} failed: {e}")
+    if result.returncode != 0:
+        raise ValueError(f"git {args[0]} failed: {result.stderr.strip() or result.returncode}")
+    return result.stdout
+
+
+class DiffReview:
+    """Review the regions of a diff concurrently, reusing results for unchanged regions
+
+    Results are keyed by the region's prompt. Without ``cache``, reuse
+    comes from the LLM client's response cache alone.
+    """
+
+    def __init__(self, llm, cache: Optional[ReviewCache] = None, concurrency: int = CHUNK_CONCURRENCY, context: Optional[str] = None):
+        self.llm = llm
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.context = context
+
+    def _messages(self, region: DiffRegion, code: str) -> List[Dict[str, str]]:
+        prompt = f"File: {region.path}\nRegion: {region.kind} `{region.name}`\n\n```python\n{code}\n```"
+        if self.context:
+            prompt += f"\n\nContext: {self.context}"
+        return [{"role": "system", "content": DIFF_REVIEW_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+    async def _review_region(self, region: DiffRegion, lines: Dict[int, str], semaphore: asyncio.Semaphore,
+                             errors: List[Exception]) -> Dict[str, Any]:
+        code = region.render(lines)
+        messages = self._messages(region, code)
+        key = hashlib.sha256(f"{DIFF_CACHE_VERSION}\0{self.llm.model}\0{messages}".encode()).hexdigest()
+        result = {
+            "id": key[:12],
+            "path": region.path,
+            "name": region.name,
+            "kind": region.kind,
+            "start_line": region.start,
+            "end_line": region.end,
+            "changed_lines": sorted(region.changed | region.deleted),
+            "cached": False,
+            "success": True,
+            "error": None,
+            "findings": [],
+            "input_tokens": 0,
+            "output_tokens": 0,
+        }
+        chunk = CodeChunk(region.name, region.kind, region.start, region.end, code)
+
+        # A shared-store cache does I/O; keep it off the event loop
+        entry = await asyncio.to_thread(self.cache.get, key) if self.cache is not None else None
+        text = entry["text"] if entry else None
+        if text is None:
+            text = await self.llm.cached_response(messages, temperature=0.3, max_tokens=500)
+        if text is not None:
+            result["cached"] = True
+        else:
+            async with semaphore:
+                try:
+                    text = (await self.llm.generate(messages, temperature=0.3, max_tokens=500)).strip()
+                except Exception as e:
+                    errors.append(e)
+                    return {**result, "success": False, "error": str(e)}
+            counter = get_token_counter()
+            result["input_tokens"] = counter.count_messages(messages, self.llm.model)
+            result["output_tokens"] = counter.count(text, self.llm.model)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, key, {"text": text, "reviewed_at": time.time()})
+        result["findings"] = [{**finding, "path": region.path} for finding in ChunkResult(chunk, text).findings()]
+        return result
+
+    async def run(self, diff: str, read_file: Callable[[str], Optional[str]]) -> Dict[str, Any]:
+        """Review ``diff``; ``read_file(path)`` returns a changed file's new contents, or None
+
+        ``read_file`` may block (e.g. ``git show``); it runs in worker threads.
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors: List[Exception] = []
+        jobs, static_findings = [], []
+        file_lines = 0
+        file_diffs = parse_unified_diff(diff)
+        sources = await asyncio.gather(*[asyncio.to_thread(read_file, file_diff.path) for file_diff in file_diffs])
+        for file_diff, source in zip(file_diffs, sources):
+            if source is not None:
+                lines = dict(enumerate(source.splitlines(), 1))
+                file_lines += len(lines)
+                if file_diff.path.endswith(".py"):
+                    analysis = analyze(source)
+                    static_findings += [{**issue.to_dict(), "path": file_diff.path}
+                                        for issue in analysis.issues if issue.line in file_diff.added]
+            else:
+                lines = file_diff.hunk_lines
+            for region in map_regions(file_diff, source):
+                jobs.append(self._review_region(region, lines, semaphore, errors))
+
+        try:
+            regions = list(await asyncio.gather(*jobs))
+        finally:
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.save)
+        failed = [region for region in regions if not region["success"]]
+        if regions and len(failed) == len(regions):
+            # Nothing was reviewed; surface the upstream error itself (e.g. a 429)
+            raise errors[0]
+
+        findings = sorted((finding for region in regions for finding in region["findings"]),
+                          key=lambda finding: (finding["path"], finding["line"]))
+        stats = {
+            "files": len({region["path"] for region in regions}),
+            "regions": len(regions),
+            "cached_regions": sum(1 for region in regions if region["cached"]),
+            "failed_regions": len(failed),
+            "changed_lines": sum(len(region["changed_lines"]) for region in regions),
+            "sent_lines": sum(region["end_line"] - region["start_line"] + 1 for region in regions),
+            "file_lines": file_lines,
+            "input_tokens": sum(region["input_tokens"] for region in regions),
+            "output_tokens": sum(region["output_tokens"] for region in regions),
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+        }
+        return {
+            "report": render_diff_report(regions, findings, static_findings, stats),
+            "regions": regions,
+            "findings": findings,
+            "static_findings": static_findings,
+            "stats": stats,
+        }
+
+
+def render_diff_report(regions, findings, static_findings, stats) -> str:
+    """Markdown report grouped by file and region"""
+    parts = [
+        "# Review of changes",
+        f"{len(findings) + len(static_findings)} finding(s) in {stats['regions']} changed region(s) across "
+        f"{stats['files']} file(s); {stats['cached_regions']} region(s) reused from earlier reviews. "
+        f"Sent {stats['sent_lines']} line(s) for {stats['changed_lines']} changed.",
+    ]
+    if not regions:
+        parts.append("The diff changes no reviewable lines.")
+    path = None
+    for region in regions:
+        if region["path"] != path:
+            path = region["path"]
+            parts.append(f"## {path}")
+        heading = f"### `{region['name']}` (lines {region['start_line']}-{region['end_line']})"
+        parts.append(heading + (" (unchanged since last review)" if region["cached"] else ""))
+        if not region["success"]:
+            parts.append(f"_Could not review this region: {region['error']}_")
+            continue
+        items = [(f["line"], f"- **L{f['line']}**: {f['message']}") for f in region["findings"]]
+        items += [(f["line"], f"- **L{f['line']}** `{f['rule']}` ({f['severity']}): {f['message']}")
+                  for f in static_findings
+                  if f["path"] == path and region["start_line"] <= f["line"] <= region["end_line"]]
+        parts.append("\n".join(text for _, text in sorted(items, key=lambda item: item[0])) or "No issues found.")
+    return "\n\n".join(parts)
+
+
+def diff_cache_for(root: Path) -> ReviewCache:
+    return ReviewCache(Path(root) / INDEX_DIR / "diff_reviews.json")
+
+
+class SharedReviewCache:
+    """Region reviews in the cross-worker shared store, with ``ReviewCache``'s interface
+
+    Entries are written through and expire after ``ttl`` seconds.
+    """
+
+    PREFIX = "codeassist:diff_review:"
+
+    def __init__(self, store, ttl: Optional[float] = None):
+        self.store = store
+        self.ttl = ttl or float(os.getenv("CODEASSIST_DIFF_CACHE_TTL", 30 * 86400))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.store.get(self.PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        self.store.set(self.PREFIX + key, json.dumps(result), ex=self.ttl)
+
+    def save(self):
+        pass
+
+
+_diff_cache = None
+_diff_cache_lock = threading.Lock()
+
+
+def get_diff_cache():
+    """Persistent cache for API diff reviews, or None if there is nowhere to keep one
+
+    The shared store when configured (reaches every worker), else a file in
+    ``CODEASSIST_PROJECT_ROOT``, the one ``codeassist review --base`` uses.
+    """
+    global _diff_cache
+    with _diff_cache_lock:
+        if _diff_cache is None:
+            shared = get_shared_store()
+            root = os.getenv("CODEASSIST_PROJECT_ROOT")
+            if shared is not None:
+                _diff_cache = SharedReviewCache(shared)
+            elif root:
+                _diff_cache = diff_cache_for(Path(root))
+        return _diff_cache
@@ -0,0 +1,236 @@
+"""Review every matching file under a directory
+
+Files go through a bounded ``asyncio`` work queue: ``concurrency`` workers
+each take the next file, run the local static checks and (unless those
+settle it) the chunked ``FilePipeline`` review. Results are cached in
+``<root>/.codeassist/reviews.json`` by content hash and model, so a re-run
+only spends API calls on files that changed.
+"""
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from services.file_pipeline import FilePipeline
+from services.static_checks import analyze
+from services.symbol_index import INDEX_DIR, MAX_FILE_BYTES, SKIP_DIRS
+
+# Bump when prompts or the result format change, to invalidate cached reviews
+REVIEW_CACHE_VERSION = 1
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("CODEASSIST_REVIEW_CACHE_MAX_ENTRIES", 5000))
+DEFAULT_CONCURRENCY = int(os.getenv("CODEASSIST_REVIEW_CONCURRENCY", 4))
+
+
+def discover_files(root: Path, include: Iterable[str] = ("*.py",), exclude: Iterable[str] = ()) -> List[Path]:
+    """Files under ``root`` matching an ``include`` glob and no ``exclude`` glob
+
+    Globs match the root-relative POSIX path or the bare file name, so
+    ``tests/*`` and ``test_*.py`` both work. VCS, virtualenv and cache
+    directories are skipped.
+    """
+    include, exclude = list(include) or ["*.py"], list(exclude)
+
+    def matches(relative: str, patterns: List[str]) -> bool:
+        name = relative.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    files = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.endswith(".egg-info"))
+        for filename in sorted(filenames):
+            path = Path(directory) / filename
+            relative = path.relative_to(root).as_posix()
+            if matches(relative, include) and not matches(relative, exclude):
+                files.append(path)
+    return files
+
+
+class ReviewCache:
+    """Per-file review results keyed by content hash, persisted as JSON"""
+
+    def __init__(self, path: Path, max_entries: int = REVIEW_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            data = json.loads(path.read_text())
+            if data.get("version") == REVIEW_CACHE_VERSION:
+                self._entries = data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(content: str, model: str) -> str:
+        return hashlib.sha256(f"{REVIEW_CACHE_VERSION}\0{model}\0{content}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = result
+            self._dirty = True
+
+    def save(self):
+        """Write the cache, keeping the most recently reviewed entries"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = sorted(self._entries.items(), key=lambda item: item[1].get("reviewed_at", 0), reverse=True)
+            self._entries = dict(entries[:self.max_entries])
+            payload = json.dumps({"version": REVIEW_CACHE_VERSION, "entries": self._entries})
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(payload)
+        os.replace(tmp, self.path)
+
+
+class DirectoryReview:
+    """Review many files through a bounded work queue
+
+    ``model_for(code)`` picks the model for a file's content and
+    ``client_for(model)`` returns its LLM client. Both are called only for
+    files the static checks do not settle, and the model is part of the
+    cache key.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        model_for: Callable[[str], str],
+        client_for: Callable[[str], Any],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        cache: Optional[ReviewCache] = None
+    ):
+        self.root = Path(root)
+        self.model_for = model_for
+        self.client_for = client_for
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+
+    async def review_file(self, path: Path) -> Dict[str, Any]:
+        """Review one file, from the cache when its content is unchanged"""
+        started = time.monotonic()
+        relative = path.relative_to(self.root).as_posix()
+        result: Dict[str, Any] = {"path": relative, "cached": False, "success": True, "error": None,
+                                  "llm_used": False, "model": None, "findings": [], "static_findings": []}
+        try:
+            if path.stat().st_size > MAX_FILE_BYTES:
+                raise ValueError(f"larger than {MAX_FILE_BYTES} bytes")
+            content = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            return {**result, "success": False, "error": f"Could not read file: {e}"}
+
+        analysis = analyze(content)
+        result["static_findings"] = [issue.to_dict() for issue in analysis.issues]
+        if not analysis.valid:
+            # The model cannot usefully review code that does not parse
+            error = analysis.syntax_error
+            result["static_findings"] = [{"rule": "E999", "category": "bug", "severity": "error",
+                                          "line": error.lineno or 1, "message": f"Syntax error: {error.msg}"}]
+        if not analysis.valid or not content.strip():
+            result["elapsed_seconds"] = round(time.monotonic() - started, 3)
+            return result
+
+        model = self.model_for(content)
+        key = ReviewCache.key(content, model)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            return {**cached, "path": relative, "cached": True, "elapsed_seconds": round(time.monotonic() - started, 3)}
+
+        try:
+            llm = self.client_for(model)
+            review = await FilePipeline(llm, task="review").run(content, filename=relative)
+        except Exception as e:
+            return {**result, "success": False, "error": str(e), "elapsed_seconds": round(time.monotonic() - started, 3)}
+
+        result.update(
+            llm_used=True,
+            model=model,
+            findings=review["findings"],
+            report=review["report"],
+            pipeline=review["pipeline"],
+            success=review["pipeline"]["failed_chunks"] == 0,
+            error=f"{review['pipeline']['failed_chunks']} section(s) failed" if review["pipeline"]["failed_chunks"] else None,
+            reviewed_at=time.time(),
+        )
+        # Partial failures are retried on the next run rather than cached
+        if self.cache is not None and result["success"]:
+            self.cache.set(key, {k: v for k, v in result.items() if k not in ("path", "cached", "elapsed_seconds")})
+        result["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+    async def run(self, files: List[Path], on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Review ``files`` with ``concurrency`` workers; results keep the input order"""
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue()
+        for position, path in enumerate(files):
+            queue.put_nowait((position, path))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+
+        async def worker():
+            while True:
+                try:
+                    position, path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[position] = await self.review_file(path)
+                if on_result is not None:
+                    on_result(results[position])
+
+        try:
+            await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(files)) or 1)])
+        finally:
+            if self.cache is not None:
+                self.cache.save()
+
+        done = [result for result in results if result is not None]
+        return {
+            "root": str(self.root),
+            "files": done,
+            "summary": {
+                "files": len(done),
+                "reviewed": sum(1 for result in done if result["llm_used"] and not result["cached"]),
+                "cached": sum(1 for result in done if result["cached"]),
+                "failed": sum(1 for result in done if not result["success"]),
+                "findings": sum(len(result["findings"]) for result in done),
+                "static_findings": sum(len(result["static_findings"]) for result in done),
+                "elapsed_seconds": round(time.monotonic() - started, 3),
+            },
+        }
+
+
+def review_cache_for(root: Path) -> ReviewCache:
+    return ReviewCache(Path(root) / INDEX_DIR / "reviews.json")
+
+
+def render_markdown(report: Dict[str, Any]) -> str:
+    """Combined Markdown report, one section per file with findings by line"""
+    summary = report["summary"]
+    parts = [
+        f"# Review of {report['root']}",
+        f"{summary['files']} file(s): {summary['reviewed']} reviewed, {summary['cached']} unchanged since the last run, "
+        f"{summary['failed']} failed. {summary['findings']} finding(s) and {summary['static_findings']} static finding(s) "
+        f"in {summary['elapsed_seconds']}s.",
+    ]
+    for result in report["files"]:
+        parts.append(f"## {result['path']}" + (" (unchanged)" if result["cached"] else ""))
+        if result.get("error"):
+            parts.append(f"_{result['error']}_")
+        items = [(finding["line"], f"- **L{finding['line']}**: {finding['message']}") for finding in result["findings"]]
+        items += [(issue["line"], f"- **L{issue['line']}** `{issue['rule']}` ({issue['severity']}): {issue['message']}")
+                  for issue in result["static_findings"]]
+        if items:
+            parts.append("\n".join(line for _, line in sorted(items, key=lambda item: item[0])))
+        elif result["success"]:
+            parts.append("No issues found.")
+    return "\n\n".join(parts) + "\n"
@@ -0,0 +1,180 @@
+"""Chunked, concurrent review/explanation of whole files"""
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from services.chunker import CodeChunk, chunk_python_source
+from services.token_budget import get_token_counter
+
+CHUNK_TOKENS = int(os.getenv("CODEASSIST_CHUNK_TOKENS", 1500))
+CHUNK_CONCURRENCY = int(os.getenv("CODEASSIST_CHUNK_CONCURRENCY", 4))
+
+_FINDING_RE = re.compile(r"^\s*(?:[-*]\s*)?\**L(\d+)\**\s*[:\-]\s*(.+)$")
+
+REVIEW_SYSTEM_PROMPT = """You are an expert code reviewer. You are reviewing one section of a larger Python file.
+Analyze it for:
+1. Code quality and best practices
+2. Performance issues
+3. Security vulnerabilities
+4. Readability and maintainability
+5. Potential bugs or edge cases
+
+Report each issue on its own line as `L<line>: <finding and suggested fix>`, using the
+line numbers shown to the left of the code. If the section has no issues, reply exactly
+`No issues found.`"""
+
+EXPLAIN_SYSTEM_PROMPT = """You are a helpful programming tutor. You are explaining one section of a larger Python file.
+Explain in clear, simple language what this section does and how it works.
+Be concise: a short paragraph or a few bullet points."""
+
+
+class ChunkResult:
+    """Outcome of processing one chunk"""
+
+    def __init__(self, chunk: CodeChunk, text: Optional[str] = None, cached: bool = False, error: Optional[str] = None):
+        self.chunk = chunk
+        self.text = text
+        self.cached = cached
+        self.error = error
+        # The exception behind ``error``, re-raised when every chunk fails
+        self.exception: Optional[Exception] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+    def findings(self) -> List[Dict[str, Any]]:
+        """Line-anchored findings, translated to file line numbers"""
+        if not self.text:
+            return []
+        findings = []
+        unanchored = []
+        for line in self.text.splitlines():
+            match = _FINDING_RE.match(line)
+            if match:
+                relative = int(match.group(1))
+                absolute = min(self.chunk.start_line + relative - 1, self.chunk.end_line)
+                findings.append({"line": absolute, "message": match.group(2).strip(), "section": self.chunk.name})
+            elif line.strip():
+                unanchored.append(line.strip())
+        if not findings and unanchored and unanchored != ["No issues found."]:
+            # Model ignored the format; anchor its notes to the start of the section
+            findings.append({"line": self.chunk.start_line, "message": " ".join(unanchored), "section": self.chunk.name})
+        return findings
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.chunk.name,
+            "kind": self.chunk.kind,
+            "start_line": self.chunk.start_line,
+            "end_line": self.chunk.end_line,
+            "cached": self.cached,
+            "success": self.success,
+            "error": self.error,
+        }
+
+
+class FilePipeline:
+    """Split a file with ``ast`` and process its chunks concurrently
+
+    Each chunk is sent with chunk-relative line numbers, so the prompt for a
+    function depends only on its own code: unchanged chunks hit the response
+    cache even when edits elsewhere shift them up or down the file.
+    """
+
+    def __init__(self, llm, task: str = "review", max_tokens: int = CHUNK_TOKENS, concurrency: int = CHUNK_CONCURRENCY):
+        if task not in ("review", "explain"):
+            raise ValueError(f"Unknown pipeline task: {task}")
+        self.llm = llm
+        self.task = task
+        self.max_tokens = max_tokens
+        self.concurrency = max(1, concurrency)
+
+    def _messages(self, chunk: CodeChunk, filename: Optional[str], context: Optional[str]) -> List[Dict[str, str]]:
+        system = REVIEW_SYSTEM_PROMPT if self.task == "review" else EXPLAIN_SYSTEM_PROMPT
+        prompt = f"File: {filename or 'unknown'}\nSection: {chunk.kind} `{chunk.name}`\n\n```python\n{chunk.numbered()}\n```"
+        if context:
+            prompt += f"\n\nContext: {context}"
+        return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+    async def _process(self, chunk: CodeChunk, filename, context, semaphore: asyncio.Semaphore) -> ChunkResult:
+        messages = self._messages(chunk, filename, context)
+        temperature = 0.3 if self.task == "review" else 0.5
+        max_tokens = 500 if self.task == "review" else 300
+
+        cached = await self.llm.cached_response(messages, temperature=temperature, max_tokens=max_tokens)
+        if cached is not None:
+            return ChunkResult(chunk, cached.strip(), cached=True)
+
+        async with semaphore:
+            try:
+                text = (await self.llm.generate(messages, temperature=temperature, max_tokens=max_tokens)).strip()
+            except Exception as e:
+                result = ChunkResult(chunk, error=str(e))
+                result.exception = e
+                return result
+
+        result = ChunkResult(chunk, text)
+        counter = get_token_counter()
+        result.input_tokens = counter.count_messages(messages, self.llm.model)
+        result.output_tokens = counter.count(text, self.llm.model)
+        return result
+
+    async def run(self, source: str, filename: Optional[str] = None, context: Optional[str] = None) -> Dict[str, Any]:
+        """Process ``source`` and return the merged report plus pipeline stats"""
+        started = time.monotonic()
+        chunks = chunk_python_source(source, max_tokens=self.max_tokens)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*[
+            self._process(chunk, filename, context, semaphore) for chunk in chunks
+        ])
+        elapsed = time.monotonic() - started
+
+        failed = [result for result in results if not result.success]
+        if results and len(failed) == len(results):
+            # Nothing was processed; surface the upstream error itself (e.g. a 429)
+            raise failed[0].exception
+
+        findings = []
+        if self.task == "review":
+            for result in results:
+                findings.extend(result.findings())
+            findings.sort(key=lambda finding: finding["line"])
+
+        return {
+            "report": self._merge(results, findings, filename),
+            "findings": findings,
+            "chunks": [result.summary() for result in results],
+            "pipeline": {
+                "chunks": len(results),
+                "cached_chunks": sum(1 for result in results if result.cached),
+                "failed_chunks": len(failed),
+                "elapsed_seconds": round(elapsed, 3),
+                "chunks_per_second": round(len(results) / elapsed, 2) if elapsed > 0 else 0,
+                "input_tokens": sum(result.input_tokens for result in results),
+                "output_tokens": sum(result.output_tokens for result in results),
+            },
+        }
+
+    def _merge(self, results: List[ChunkResult], findings: List[Dict[str, Any]], filename: Optional[str]) -> str:
+        """Combine per-chunk output into one Markdown report"""
+        title = "Review" if self.task == "review" else "Explanation"
+        parts = [f"# {title} of {filename or 'file'}"]
+        if self.task == "review":
+            parts.append(f"{len(findings)} finding(s) across {len(results)} section(s).")
+
+        for result in results:
+            chunk = result.chunk
+            parts.append(f"## `{chunk.name}` (lines {chunk.start_line}-{chunk.end_line})")
+            if not result.success:
+                parts.append(f"_Could not process this section: {result.error}_")
+            elif self.task == "review":
+                section = [f for f in findings if f["section"] == chunk.name and chunk.start_line <= f["line"] <= chunk.end_line]
+                parts.append("\n".join(f"- **L{f['line']}**: {f['message']}" for f in section) or "No issues found.")
+            else:
+                parts.append(result.text)
+        return "\n\n".join(parts)
@@ -0,0 +1,182 @@
+"""Fill-in-the-middle prompts around a cursor in a whole buffer
+
+Editors send the full buffer and a cursor offset. Only bounded windows are
+sent: up to ``FIM_PREFIX_TOKENS`` before the cursor and ``FIM_SUFFIX_TOKENS``
+after it, cut at whole lines.
+
+The prompt is laid out so consecutive keystrokes share as long a prefix as
+possible, which upstream prompt caching (e.g. OpenAI's automatic caching of
+repeated prompt prefixes) then serves at a discount and with lower latency:
+
+- the suffix comes before the prefix (SPM order), since typing at the
+  cursor leaves the text after it unchanged;
+- window edges move in steps of ``FIM_ALIGN_LINES`` lines rather than one
+  line per keystroke;
+- the line being typed comes last, so it is the only part that changes.
+"""
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from services.token_budget import TokenCounter, fit_prompt, get_token_counter
+
+FIM_PREFIX_TOKENS = int(os.getenv("CODEASSIST_FIM_PREFIX_TOKENS", 1500))
+FIM_SUFFIX_TOKENS = int(os.getenv("CODEASSIST_FIM_SUFFIX_TOKENS", 500))
+FIM_ALIGN_LINES = int(os.getenv("CODEASSIST_FIM_ALIGN_LINES", 32))
+
+CURSOR_MARKER = "<CURSOR>"
+SUFFIX_OMITTED = "# ... (rest of file omitted) ..."
+
+FIM_SYSTEM_PROMPT = f"""You are an expert Python programmer filling in code at the cursor in a file.
+You are shown the code after the cursor, then the code before it ending in {CURSOR_MARKER}.
+Reply with only the text to insert at {CURSOR_MARKER}: no explanation, no code fences, and do not
+repeat code that is already before or after the cursor. The insertion must join the code before and
+after it into valid, properly indented Python. Reply with nothing if no insertion is needed."""
+
+_FENCE = re.compile(r"^```[\w+-]*\n(.*?)\n?```\s*$", re.DOTALL)
+
+
+class FimWindow:
+    """The parts of a buffer sent for a completion at ``cursor``"""
+
+    def __init__(self, prefix: str, suffix: str, cursor_line: int, start_line: int, end_line: int):
+        self.prefix = prefix
+        self.suffix = suffix
+        # 1-based line numbers in the buffer
+        self.cursor_line = cursor_line
+        self.start_line = start_line
+        self.end_line = end_line
+
+    @property
+    def context_code(self) -> str:
+        """Window code without the line being typed, for retrieving project context
+
+        Leaving out the partial line keeps retrieval (and so the prompt
+        prefix) stable until a line is finished.
+        """
+        head = self.prefix.rpartition("\n")[0]
+        tail = self.suffix.partition("\n")[2]
+        return f"{head}\n{tail}"
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"cursor_line": self.cursor_line, "start_line": self.start_line, "end_line": self.end_line}
+
+
+def _omitted_above(count: int) -> str:
+    return f"# ... ({count} lines above omitted) ..."
+
+
+def fim_window(
+    code: str,
+    cursor: int,
+    prefix_tokens: int = FIM_PREFIX_TOKENS,
+    suffix_tokens: int = FIM_SUFFIX_TOKENS,
+    align: int = FIM_ALIGN_LINES,
+    model: str = "gpt-3.5-turbo",
+    counter: Optional[TokenCounter] = None
+) -> FimWindow:
+    """Cut bounded windows before and after the character offset ``cursor``
+
+    The line being typed is always kept whole. Further lines are kept while
+    they fit the budgets, then rounded to ``align``-line steps: the prefix
+    start up to a multiple of ``align`` from the top of the file, the suffix
+    length down to a multiple of ``align // 4`` lines (its window is smaller).
+    """
+    if cursor < 0 or cursor > len(code):
+        raise ValueError(f"Cursor offset {cursor} is outside the code (0-{len(code)})")
+    counter = counter or get_token_counter()
+    align = max(1, align)
+
+    *above, partial = code[:cursor].split("\n")
+    budget = prefix_tokens - counter.count(partial, model) - counter.count(_omitted_above(len(above)), model)
+    start = len(above)
+    while start > 0:
+        cost = counter.count(above[start - 1] + "\n", model)
+        if cost > budget:
+            break
+        budget -= cost
+        start -= 1
+    if start:
+        start = min(-(-start // align) * align, len(above))
+    prefix = "\n".join(above[start:] + [partial])
+    if start:
+        prefix = f"{_omitted_above(start)}\n{prefix}"
+
+    rest_of_line, *below = code[cursor:].split("\n")
+    budget = suffix_tokens - counter.count(rest_of_line, model) - counter.count(SUFFIX_OMITTED, model)
+    kept = 0
+    while kept < len(below):
+        cost = counter.count(below[kept] + "\n", model)
+        if cost > budget:
+            break
+        budget -= cost
+        kept += 1
+    if kept < len(below):
+        step = max(1, align // 4)
+        kept = kept // step * step
+    suffix = "\n".join([rest_of_line] + below[:kept])
+    if kept < len(below):
+        suffix = f"{suffix}\n{SUFFIX_OMITTED}"
+
+    cursor_line = len(above) + 1
+    return FimWindow(prefix, suffix, cursor_line, start + 1, cursor_line + kept)
+
+
+def build_fim_messages(
+    prefix: str,
+    suffix: str,
+    project_context: str = "",
+    context: Optional[str] = None,
+    filename: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Chat messages for a fill-in-the-middle completion, most stable parts first"""
+    prompt = ""
+    if filename:
+        prompt += f"File: {filename}\n\n"
+    if project_context:
+        prompt += f"Relevant definitions from this project:\n\n```python\n{project_context}\n```\n\n"
+    if context:
+        prompt += f"Additional context: {context}\n\n"
+    prompt += f"Code after the cursor:\n\n```python\n{suffix}\n```\n\n"
+    prompt += f"Code before the cursor:\n\n```python\n{prefix}{CURSOR_MARKER}\n```"
+    return [
+        {"role": "system", "content": FIM_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def fit_fim_messages(
+    model: str,
+    window: FimWindow,
+    project_context: str = "",
+    context: Optional[str] = None,
+    filename: Optional[str] = None,
+    max_output_tokens: int = 500
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """FIM messages that fit ``model``'s context window, plus a token estimate
+
+    The windows are bounded already; on small models the prefix is trimmed
+    further, keeping the lines nearest the cursor.
+    """
+    return fit_prompt(
+        model,
+        window.prefix,
+        lambda prefix: build_fim_messages(prefix, window.suffix, project_context, context, filename),
+        max_output_tokens=max_output_tokens,
+        keep="end"
+    )
+
+
+def prompt_cache_key(code: str, filename: Optional[str] = None) -> str:
+    """Routing hint for upstream prompt caching, shared by requests for the same buffer"""
+    buffer = filename or code[:2000]
+    return "fim-" + hashlib.sha256(buffer.encode("utf-8")).hexdigest()[:16]
+
+
+def clean_insertion(text: str) -> str:
+    """Strip a code fence or cursor marker the model added despite instructions"""
+    match = _FENCE.match(text.strip())
+    if match:
+        text = match.group(1)
+    return text.replace(CURSOR_MARKER, "")
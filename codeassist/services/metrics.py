@@ -0,0 +1,432 @@
+"""In-process metrics: labelled counters and fixed-bucket histograms
+
+Everything here has constant memory per label set, so recording a sample is
+O(buckets) and nothing grows with traffic. ``MetricsRegistry.render()``
+produces the Prometheus text exposition format served at ``/metrics``.
+"""
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def log_buckets(low: float, high: float, per_doubling: int = 2) -> Tuple[float, ...]:
+    """Log-spaced bucket bounds from ``low`` to at least ``high``
+
+    With two buckets per doubling, any quantile read back from the histogram
+    is within ~20% of the true value, HDR-histogram style.
+    """
+    bounds = []
+    value = low
+    step = 2 ** (1 / per_doubling)
+    while value < high * step:
+        bounds.append(float(f"{value:.6g}"))
+        value *= step
+    return tuple(bounds)
+
+
+# 1ms .. ~6min
+LATENCY_BUCKETS = log_buckets(0.001, 300.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram (constant memory regardless of sample count)"""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: Optional[Iterable[float]] = None):
+        self.buckets = tuple(buckets if buckets is not None else self.DEFAULT_BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            observed_max = self.max
+        if count == 0:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else observed_max
+                upper = min(upper, observed_max)
+                lower = min(lower, upper)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return observed_max
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean and tail percentiles (seconds)"""
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4) if self.count else 0,
+            "p50": round(self.quantile(0.50), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self.max, 4),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _Family:
+    """A metric name with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Family):
+    """Monotonic counter per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format(value)}" for key, value in sorted(self.values().items())]
+
+
+class Gauge(Counter):
+    """Value that can go up and down per label set"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class HistogramFamily(_Family):
+    """One fixed-bucket ``Histogram`` per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, **labels) -> Histogram:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Histogram(self.buckets)
+            return series
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def series(self) -> Dict[Tuple[str, ...], Histogram]:
+        with self._lock:
+            return dict(self._series)
+
+    def merged(self, **match) -> Histogram:
+        """Combine every series whose labels include ``match``"""
+        merged = Histogram(self.buckets)
+        for key, series in self.series().items():
+            labels = dict(zip(self.labelnames, key))
+            if any(labels.get(name) != str(value) for name, value in match.items()):
+                continue
+            with series._lock:
+                for index, bucket_count in enumerate(series.counts):
+                    merged.counts[index] += bucket_count
+                merged.count += series.count
+                merged.total += series.total
+                merged.max = max(merged.max, series.max)
+        return merged
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self.series().items()):
+            with series._lock:
+                counts = list(series.counts)
+                count, total = series.count, series.total
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _format(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._labels(key, inf)} {count}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+# A collector returns (name, kind, help, [(labels, value), ...]) tuples at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them for scraping"""
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _register(self, family: _Family) -> _Family:
+        with self._lock:
+            existing = self._families.get(family.name)
+            if existing is not None:
+                return existing
+            self._families[family.name] = family
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> HistogramFamily:
+        return self._register(HistogramFamily(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector: Collector):
+        """Add a callback that reports values owned by another component"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(family.render())
+        for collector in collectors:
+            try:
+                collected = list(collector())
+            except Exception:
+                continue
+            for name, kind, help_text, samples in collected:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    pairs = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                    lines.append(f"{name}{{{pairs}}} {_format(value)}" if pairs else f"{name} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(round(value, 9))
+    return str(value)
+
+
+class RequestMetrics:
+    """Per-request accumulator for time spent waiting on the LLM
+
+    Upstream time is measured as wall-clock time during which at least one
+    LLM call was outstanding, so concurrent calls (batches, file chunks,
+    hedged requests) are not double counted.
+    """
+
+    def __init__(self):
+        self.model: Optional[str] = None
+        self.outcome: Optional[str] = None
+        self.upstream_seconds = 0.0
+        # Prompt plus output tokens of successful LLM calls, for settling rate-limit charges
+        self.llm_tokens = 0
+        self._active = 0
+        self._since = 0.0
+
+    def note_model(self, model: str):
+        if self.model is None:
+            self.model = model
+        elif self.model != model:
+            self.model = "mixed"
+
+    def enter(self):
+        if self._active == 0:
+            self._since = time.perf_counter()
+        self._active += 1
+
+    def exit(self):
+        self._active -= 1
+        if self._active == 0:
+            self.upstream_seconds += time.perf_counter() - self._since
+
+
+_current_request: contextvars.ContextVar = contextvars.ContextVar("codeassist_request_metrics", default=None)
+
+
+def begin_request() -> Tuple[RequestMetrics, contextvars.Token]:
+    """Start accounting for a request in the current context"""
+    request = RequestMetrics()
+    return request, _current_request.set(request)
+
+
+def end_request(token: contextvars.Token):
+    _current_request.reset(token)
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current_request.get()
+
+
+@contextmanager
+def upstream_timer(model: str):
+    """Attribute the enclosed block to upstream (LLM) time for this request"""
+    request = _current_request.get()
+    if request is None:
+        yield
+        return
+    request.note_model(model)
+    request.enter()
+    try:
+        yield
+    finally:
+        request.exit()
+
+
+def note_model(model: str):
+    """Label this request with ``model`` without attributing any time to upstream"""
+    request = _current_request.get()
+    if request is not None:
+        request.note_model(model)
+
+
+def note_tokens(tokens: int):
+    """Add an LLM call's prompt and output tokens to this request's usage"""
+    request = _current_request.get()
+    if request is not None:
+        request.llm_tokens += tokens
+
+
+def mark_outcome(outcome: str):
+    """Override the status-derived outcome (e.g. a stream that failed after 200)"""
+    request = _current_request.get()
+    if request is not None:
+        request.outcome = outcome
+
+
+_registry: Optional[MetricsRegistry] = None
+_started = time.time()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry()
+    return _registry
+
+
+def process_start_time() -> float:
+    return _started
+
+
+# Standard families shared by the API middleware and the LLM client
+def http_requests() -> Counter:
+    return get_metrics_registry().counter(
+        "codeassist_http_requests_total", "HTTP requests by route, model and outcome",
+        ("route", "method", "model", "outcome", "status"),
+    )
+
+
+def http_latency() -> HistogramFamily:
+    return get_metrics_registry().histogram(
+        "codeassist_http_request_duration_seconds", "End-to-end request latency, including streamed bodies",
+        ("route", "model"),
+    )
+
+
+def upstream_latency() -> HistogramFamily:
+    return get_metrics_registry().histogram(
+        "codeassist_upstream_wait_seconds", "Per-request time spent waiting on the LLM",
+        ("route", "model"),
+    )
+
+
+def overhead_latency() -> HistogramFamily:
+    return get_metrics_registry().histogram(
+        "codeassist_server_overhead_seconds", "Per-request time not spent waiting on the LLM",
+        ("route",),
+    )
+
+
+def admission_wait() -> HistogramFamily:
+    return get_metrics_registry().histogram(
+        "codeassist_admission_wait_seconds", "Time upstream calls waited for a concurrency slot",
+        ("model",), buckets=Histogram.DEFAULT_BUCKETS,
+    )
+
+
+def admission_queue_depth() -> HistogramFamily:
+    return get_metrics_registry().histogram(
+        "codeassist_admission_queue_depth", "Calls already queued when an upstream call asked for a slot",
+        ("model",), buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128),
+    )
+
+
+def llm_call_latency() -> HistogramFamily:
+    return get_metrics_registry().histogram(
+        "codeassist_llm_call_duration_seconds", "Latency of individual upstream chat completion calls",
+        ("model", "outcome"),
+    )
@@ -0,0 +1,303 @@
+"""Route each request to the cheapest model that fits it
+
+The routing policy is an ordered list of rules. The first rule matching
+the task and input size supplies candidate models, cheapest/fastest first.
+Candidates whose context window cannot hold the request are dropped, and
+models that are currently failing or slower than the task's latency budget
+(per the live call statistics every ``LLMClient`` reports here) are moved
+to the back. The remaining order is the fallback chain.
+
+The policy is JSON, read from ``CODEASSIST_ROUTING_POLICY`` (a file path or
+inline JSON) and merged over ``DEFAULT_POLICY``. Requests naming a concrete
+model keep it as the first choice; ``"auto"`` lets the router pick. Only
+models the policy mentions can be requested, so caller-supplied names never
+reach the client registry, admission limiters or metric labels unchecked.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.metrics import get_metrics_registry
+from services.token_budget import context_window, count_tokens
+
+AUTO_MODEL = "auto"
+
+DEFAULT_POLICY: Dict[str, Any] = {
+    # Used for "auto" when routing is disabled
+    "default_model": "gpt-3.5-turbo",
+    "rules": [
+        {"task": "completion", "max_input_tokens": 1500, "models": ["gpt-4o-mini", "gpt-3.5-turbo"]},
+        {"task": "review", "min_input_tokens": 4000, "models": ["gpt-4o", "gpt-4.1"]},
+        {"models": ["gpt-3.5-turbo", "gpt-4o-mini", "gpt-4o"]},
+    ],
+    # Models callers may request besides those named above
+    "extra_models": [],
+    # Models explicitly requested by the caller fall back to the rule's models
+    "fallback_for_explicit": True,
+    # Demote a model whose recent error rate exceeds this (after min_samples calls)
+    "max_error_rate": 0.5,
+    "min_samples": 5,
+    # Recent calls considered for health, and how far back (seconds)
+    "window": 50,
+    "window_seconds": 300,
+    # Demote a model whose recent median latency exceeds the task's budget
+    "latency_budget_seconds": {"completion": 3.0, "review": 30.0, "explain": 30.0},
+}
+
+logger = logging.getLogger("codeassist.router")
+
+
+def load_policy(value: Optional[str] = None) -> Dict[str, Any]:
+    """``DEFAULT_POLICY`` updated from a JSON file path or inline JSON"""
+    value = value if value is not None else os.getenv("CODEASSIST_ROUTING_POLICY", "")
+    policy = dict(DEFAULT_POLICY)
+    if not value:
+        return policy
+    if not value.lstrip().startswith("{"):
+        with open(value, "r") as f:
+            value = f.read()
+    overrides = json.loads(value)
+    if not isinstance(overrides, dict):
+        raise ValueError("Routing policy must be a JSON object")
+    policy.update(overrides)
+    return policy
+
+
+class ModelHealth:
+    """Outcomes and latencies of a model's most recent calls"""
+
+    def __init__(self, window: int = 50):
+        self._calls: deque = deque(maxlen=window)
+
+    def record(self, ok: bool, seconds: float, now: Optional[float] = None):
+        self._calls.append((now or time.time(), ok, seconds))
+
+    def summary(self, window_seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+        cutoff = (now or time.time()) - window_seconds
+        recent = [(ok, seconds) for at, ok, seconds in list(self._calls) if at >= cutoff]
+        latencies = sorted(seconds for ok, seconds in recent if ok)
+        failures = sum(1 for ok, _ in recent if not ok)
+        return {
+            "calls": len(recent),
+            "error_rate": round(failures / len(recent), 3) if recent else 0.0,
+            "p50_seconds": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        }
+
+
+class RoutingDecision:
+    """The models to try for one request, in order, and why"""
+
+    def __init__(self, task: str, requested: str, candidates: List[str], input_tokens: int, reason: str):
+        self.task = task
+        self.requested = requested
+        self.candidates = candidates
+        self.input_tokens = input_tokens
+        self.reason = reason
+
+    @property
+    def model(self) -> str:
+        return self.candidates[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task": self.task,
+            "requested": self.requested,
+            "candidates": self.candidates,
+            "input_tokens": self.input_tokens,
+            "reason": self.reason,
+        }
+
+
+class ModelRouter:
+    """Chooses models per request and runs calls down the fallback chain"""
+
+    def __init__(self, policy: Optional[Dict[str, Any]] = None, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv("CODEASSIST_ROUTING_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.policy = policy if policy is not None else load_policy()
+        self._health: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+        self.recent: deque = deque(maxlen=100)
+        self.fallbacks = 0
+        self._decisions = get_metrics_registry().counter(
+            "codeassist_routing_decisions_total", "Models chosen by the router, by task", ("task", "model"),
+        )
+        self._fallbacks = get_metrics_registry().counter(
+            "codeassist_routing_fallbacks_total", "Calls retried on the next model after a failure",
+            ("task", "from_model", "to_model"),
+        )
+
+    def record_call(self, model: str, ok: bool, seconds: float):
+        """Feed one upstream call's outcome into the model's health window"""
+        with self._lock:
+            health = self._health.get(model)
+            if health is None:
+                health = self._health[model] = ModelHealth(self.policy["window"])
+            health.record(ok, seconds)
+
+    def health(self, model: str) -> Dict[str, Any]:
+        with self._lock:
+            health = self._health.get(model)
+        if health is None:
+            return {"calls": 0, "error_rate": 0.0, "p50_seconds": None}
+        return health.summary(self.policy["window_seconds"])
+
+    def known_models(self) -> List[str]:
+        """Every model the policy can route to; the only ones a caller may request"""
+        models = [self.policy["default_model"]]
+        for rule in self.policy["rules"]:
+            models.extend(rule["models"])
+        models.extend(self.policy.get("extra_models", []))
+        return list(dict.fromkeys(models))
+
+    def _rule_for(self, task: str, input_tokens: int) -> Tuple[int, Dict[str, Any]]:
+        for index, rule in enumerate(self.policy["rules"]):
+            if rule.get("task") not in (None, task):
+                continue
+            if input_tokens < rule.get("min_input_tokens", 0):
+                continue
+            if "max_input_tokens" in rule and input_tokens > rule["max_input_tokens"]:
+                continue
+            return index, rule
+        return -1, {"models": [self.policy["default_model"]]}
+
+    def route(
+        self,
+        task: str,
+        requested: Optional[str],
+        code: str = "",
+        context: Optional[str] = None,
+        max_output_tokens: int = 500
+    ) -> RoutingDecision:
+        """Pick the ordered candidate models for a request"""
+        requested = requested or AUTO_MODEL
+        if requested != AUTO_MODEL and requested not in self.known_models():
+            raise ValueError(
+                f"Unknown model '{requested}'; use '{AUTO_MODEL}' or one of: {', '.join(self.known_models())}"
+            )
+        input_tokens = count_tokens(code) + (count_tokens(context) if context else 0)
+
+        if not self.enabled:
+            model = self.policy["default_model"] if requested == AUTO_MODEL else requested
+            return self._decide(RoutingDecision(task, requested, [model], input_tokens, "routing disabled"))
+
+        index, rule = self._rule_for(task, input_tokens)
+        notes = [f"rule {index}" if index >= 0 else "no rule matched"]
+        needed = input_tokens + max_output_tokens
+        fitting = [model for model in rule["models"] if context_window(model) >= needed]
+        if len(fitting) < len(rule["models"]):
+            notes.append("too small: " + ", ".join(sorted(set(rule["models"]) - set(fitting))))
+        if not fitting:
+            # Nothing fits outright; let the largest window try with a trimmed prompt
+            fitting = [max(rule["models"], key=context_window)]
+
+        demoted = {}
+        budget = self.policy["latency_budget_seconds"].get(task)
+        for model in fitting:
+            health = self.health(model)
+            if health["calls"] >= self.policy["min_samples"] and health["error_rate"] > self.policy["max_error_rate"]:
+                demoted[model] = f"error rate {health['error_rate']}"
+            elif budget and health["p50_seconds"] is not None and health["p50_seconds"] > budget:
+                demoted[model] = f"p50 {health['p50_seconds']}s over budget"
+        candidates = [model for model in fitting if model not in demoted] + [model for model in fitting if model in demoted]
+        if demoted:
+            notes.append("demoted " + "; ".join(f"{model} ({why})" for model, why in demoted.items()))
+
+        if requested != AUTO_MODEL:
+            fallbacks = [model for model in candidates if model != requested] if self.policy["fallback_for_explicit"] else []
+            candidates = [requested] + fallbacks
+            notes.insert(0, "requested explicitly")
+        return self._decide(RoutingDecision(task, requested, candidates, input_tokens, "; ".join(notes)))
+
+    def _decide(self, decision: RoutingDecision) -> RoutingDecision:
+        self._decisions.inc(task=decision.task, model=decision.model)
+        self.recent.append({"at": round(time.time(), 3), **decision.to_dict()})
+        logger.info(
+            "route task=%s requested=%s input_tokens=%d -> %s (%s)",
+            decision.task, decision.requested, decision.input_tokens, " > ".join(decision.candidates), decision.reason,
+        )
+        return decision
+
+    def note_fallback(self, decision: RoutingDecision, failed: str, error: Exception, next_model: str):
+        self.fallbacks += 1
+        self._fallbacks.inc(task=decision.task, from_model=failed, to_model=next_model)
+        logger.warning("fallback task=%s %s -> %s after %s: %s",
+                       decision.task, failed, next_model, type(error).__name__, error)
+
+    async def generate(
+        self,
+        decision: RoutingDecision,
+        build: Callable[[str], Tuple[list, Dict[str, int]]],
+        temperature: float,
+        max_tokens: int,
+        client_factory: Optional[Callable] = None,
+        **kwargs
+    ) -> Tuple[str, str, Dict[str, int]]:
+        """Run the call on each candidate until one succeeds
+
+        ``build(model)`` returns ``(messages, usage)`` for that model (prompts
+        are fitted per context window). Returns ``(text, model, usage)``; the
+        last error propagates if every candidate fails. ``kwargs`` go to
+        ``LLMClient.generate``.
+        """
+        from models.errors import LLMError
+        from services.admission import OverloadedError
+        if client_factory is None:
+            from models.client_registry import get_llm_client as client_factory
+
+        for position, model in enumerate(decision.candidates):
+            try:
+                messages, usage = build(model)
+                text = await client_factory(model).generate(messages, temperature=temperature, max_tokens=max_tokens, **kwargs)
+                return text, model, usage
+            except (LLMError, OverloadedError, ValueError) as e:
+                if position + 1 >= len(decision.candidates):
+                    raise
+                self.note_fallback(decision, model, e, decision.candidates[position + 1])
+
+    def first_available(self, decision: RoutingDecision, build: Callable[[str], Tuple[list, Dict[str, int]]]):
+        """``(model, messages, usage)`` for the first candidate with capacity, for streaming
+
+        A stream cannot switch models once tokens have been sent, so
+        fallback happens only before it starts: on a saturated model or a
+        prompt that does not fit.
+        """
+        from services.admission import OverloadedError, get_admission_controller
+
+        for position, model in enumerate(decision.candidates):
+            try:
+                messages, usage = build(model)
+                get_admission_controller().check_capacity(model)
+                return model, messages, usage
+            except (OverloadedError, ValueError) as e:
+                if position + 1 >= len(decision.candidates):
+                    raise
+                self.note_fallback(decision, model, e, decision.candidates[position + 1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = list(self._health)
+        return {
+            "enabled": self.enabled,
+            "fallbacks": self.fallbacks,
+            "models": {model: self.health(model) for model in models},
+            "recent_decisions": list(self.recent)[-10:],
+        }
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,223 @@
+"""Per-caller token-bucket rate limiting and quota accounting"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.shared_state import get_shared_store, shared_lock
+
+# (bucket name, capacity, refill per second, cost)
+BucketSpec = Tuple[str, float, float, float]
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory (LRU-bounded)"""
+
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read(self, key: str) -> Optional[Tuple[float, float]]:
+        state = self._buckets.get(key)
+        if state is not None:
+            self._buckets.move_to_end(key)
+        return state
+
+    def _write(self, key: str, tokens: float, updated: float):
+        self._buckets[key] = (tokens, updated)
+        self._buckets.move_to_end(key)
+        # An evicted bucket comes back full, which is where an idle caller's bucket ends up anyway
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def take(self, caller: str, specs: List[BucketSpec], now: float, force: bool = False) -> List[Tuple[bool, float, float]]:
+        """Charge every bucket, or none if any would go negative
+
+        Returns ``(allowed, remaining, seconds until the cost fits)`` per
+        bucket. ``force`` charges regardless, and a negative cost refunds
+        (both used to settle actual usage against the estimate).
+        """
+        with self._lock:
+            return _take(self._read, self._write, caller, specs, now, force)
+
+
+class SharedBucketStore:
+    """Token buckets in the cross-worker shared store, updated under a shared lock"""
+
+    PREFIX = "codeassist:ratelimit:"
+
+    def __init__(self, store):
+        self.store = store
+
+    def _read(self, key: str) -> Optional[Tuple[float, float]]:
+        raw = self.store.get(self.PREFIX + key)
+        return tuple(json.loads(raw)) if raw else None
+
+    def _write(self, key: str, tokens: float, updated: float):
+        # Buckets expire once they would have refilled, keeping the store small
+        self.store.set(self.PREFIX + key, json.dumps([tokens, updated]), ex=3600)
+
+    def take(self, caller: str, specs: List[BucketSpec], now: float, force: bool = False) -> List[Tuple[bool, float, float]]:
+        with shared_lock(self.store, self.PREFIX + caller, timeout=2.0, ttl=5):
+            return _take(self._read, self._write, caller, specs, now, force)
+
+
+def _take(read, write, caller: str, specs: List[BucketSpec], now: float, force: bool) -> List[Tuple[bool, float, float]]:
+    """Refill, test and (if all fit) charge each bucket for ``caller``"""
+    levels = []
+    for name, capacity, rate, cost in specs:
+        state = read(f"{caller}:{name}")
+        tokens, updated = state if state is not None else (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        levels.append(tokens)
+
+    fits = [tokens >= cost for tokens, (_, _, _, cost) in zip(levels, specs)]
+    allowed = force or all(fits)
+    results = []
+    for tokens, fit, (name, capacity, rate, cost) in zip(levels, fits, specs):
+        if allowed:
+            tokens = min(capacity, tokens - cost)
+        write(f"{caller}:{name}", tokens, now)
+        wait = 0.0 if fit else (cost - tokens) / rate if rate > 0 else float("inf")
+        results.append((allowed and fit or force, tokens, wait))
+    return results
+
+
+class RateLimitDecision:
+    """Outcome of a rate-limit check, with the quota to report to the caller"""
+
+    def __init__(self, allowed: bool, limits: Dict[str, Dict[str, float]], retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limits = limits
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        for name, quota in self.limits.items():
+            suffix = name.capitalize()
+            headers[f"X-RateLimit-Limit-{suffix}"] = str(int(quota["limit"]))
+            headers[f"X-RateLimit-Remaining-{suffix}"] = str(max(0, int(quota["remaining"])))
+            headers[f"X-RateLimit-Reset-{suffix}"] = f"{quota['reset']:.1f}"
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, int(self.retry_after + 0.999)))
+        return headers
+
+
+class RateLimiter:
+    """Two token buckets per caller: one for requests, one for estimated LLM tokens
+
+    Buckets hold a minute's worth of quota and refill continuously, so a
+    caller can burst up to the per-minute limit and then proceeds at the
+    sustained rate. A request is admitted only if both buckets cover it.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        store=None,
+        enabled: Optional[bool] = None,
+        max_tracked_callers: int = 1000
+    ):
+        if enabled is None:
+            enabled = os.getenv("CODEASSIST_RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.requests_per_minute = requests_per_minute or float(os.getenv("CODEASSIST_RATE_LIMIT_RPM", 60))
+        self.tokens_per_minute = tokens_per_minute or float(os.getenv("CODEASSIST_RATE_LIMIT_TPM", 100_000))
+        if store is None:
+            shared = get_shared_store()
+            store = SharedBucketStore(shared) if shared is not None else MemoryBucketStore()
+        self.store = store
+        self.max_tracked_callers = max_tracked_callers
+        self._usage: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _specs(self, requests: float, tokens: float) -> List[BucketSpec]:
+        return [
+            ("requests", self.requests_per_minute, self.requests_per_minute / 60, requests),
+            ("tokens", self.tokens_per_minute, self.tokens_per_minute / 60, tokens),
+        ]
+
+    def check(self, caller: str, requests: float = 1, tokens: float = 0) -> RateLimitDecision:
+        """Charge ``caller`` for ``requests`` and estimated ``tokens`` if quota allows"""
+        now = time.time()
+        # A single request larger than the whole bucket could never run; cap its charge
+        tokens = min(tokens, self.tokens_per_minute)
+        requests = min(requests, self.requests_per_minute)
+        results = self.store.take(caller, self._specs(requests, tokens), now)
+        allowed = all(result[0] for result in results)
+        limits = {}
+        for (name, capacity, rate, _), (_, remaining, wait) in zip(self._specs(requests, tokens), results):
+            limits[name] = {
+                "limit": capacity,
+                "remaining": remaining,
+                "reset": (capacity - remaining) / rate if rate > 0 else 0.0,
+            }
+        retry_after = max(wait for _, _, wait in results)
+        self._account(caller, allowed, requests, tokens)
+        return RateLimitDecision(allowed, limits, retry_after)
+
+    def settle(self, caller: str, estimated: float, actual: float):
+        """Correct ``caller``'s token bucket once a request's actual usage is known
+
+        ``check`` charges the estimate up front; the difference is charged
+        (or refunded) here regardless of the remaining quota, so an
+        underestimate delays the caller's next requests instead of failing this one.
+        """
+        estimated = min(estimated, self.tokens_per_minute)
+        difference = actual - estimated
+        if not difference:
+            return
+        self.store.take(caller, [self._specs(0, difference)[1]], time.time(), force=True)
+        with self._lock:
+            usage = self._usage.get(caller)
+            if usage is not None:
+                usage["tokens"] += difference
+
+    def _account(self, caller: str, allowed: bool, requests: float, tokens: float):
+        with self._lock:
+            usage = self._usage.get(caller)
+            if usage is None:
+                usage = self._usage[caller] = {"requests": 0, "tokens": 0, "rejected": 0}
+            self._usage.move_to_end(caller)
+            if allowed:
+                self.allowed += 1
+                usage["requests"] += requests
+                usage["tokens"] += tokens
+            else:
+                self.rejected += 1
+                usage["rejected"] += 1
+            while len(self._usage) > self.max_tracked_callers:
+                self._usage.popitem(last=False)
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        """Limits, totals and the heaviest callers by tokens (settled where known)"""
+        with self._lock:
+            callers = sorted(self._usage.items(), key=lambda item: item[1]["tokens"], reverse=True)[:top]
+            return {
+                "enabled": self.enabled,
+                "store": type(self.store).__name__,
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "top_callers": [{"caller": caller, **usage} for caller, usage in callers],
+            }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
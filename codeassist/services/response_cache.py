@@ -0,0 +1,306 @@
+"""Content-addressed cache for LLM responses"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.shared_state import get_shared_store
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: Optional[int],
+    **kwargs
+) -> str:
+    """Hash the parameters that determine an LLM response"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "extra": kwargs,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """Size-bounded LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, record_miss: bool = True) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += record_miss
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += record_miss
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, stored_at: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (stored_at or time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache:
+    """On-disk cache tier that survives restarts"""
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl: float = 7 * 24 * 3600.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses(stored_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+
+    def get(self, key: str, record_miss: bool = True) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[0] > self.ttl:
+                self.misses += record_miss
+                return None
+            self.hits += 1
+            return row[0], row[1]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._writes += 1
+            # Prune periodically rather than on every insert
+            if self._writes % 100 == 0:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        cursor = self._conn.execute(
+            "DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,)
+        )
+        removed = cursor.rowcount
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY stored_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            removed += cursor.rowcount
+        self.evictions += max(removed, 0)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "path": self.path,
+            "entries": count,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SharedStoreCache:
+    """Second cache tier in the cross-worker shared store (see ``shared_state``)"""
+
+    PREFIX = "codeassist:cache:"
+
+    def __init__(self, store, ttl: float = 7 * 24 * 3600.0):
+        self.store = store
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, record_miss: bool = True) -> Optional[Tuple[float, str]]:
+        raw = self.store.get(self.PREFIX + key)
+        if raw is None:
+            self.misses += record_miss
+            return None
+        self.hits += 1
+        stored_at, value = json.loads(raw)
+        return stored_at, value
+
+    def set(self, key: str, value: str):
+        # Expiry is enforced by the store itself
+        self.store.set(self.PREFIX + key, json.dumps([time.time(), value]), ex=int(self.ttl))
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.store).__name__,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ResponseCache:
+    """Two-tier (memory, optional SQLite or shared store) cache in front of ``LLMClient.generate``
+
+    Only calls at or below ``max_temperature`` are cached, since higher
+    temperatures are expected to vary between calls. When workers share
+    state and no ``CODEASSIST_CACHE_DB`` is set, the second tier lives in the
+    shared store so a response cached by one worker serves all of them.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        disk_path: Optional[str] = None,
+        max_temperature: Optional[float] = None,
+        enabled: Optional[bool] = None,
+        shared=None
+    ):
+        if enabled is None:
+            enabled = os.getenv("CODEASSIST_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.max_temperature = max_temperature if max_temperature is not None else float(
+            os.getenv("CODEASSIST_CACHE_MAX_TEMPERATURE", 0.5)
+        )
+        self.memory = MemoryCache(
+            max_entries=max_entries or int(os.getenv("CODEASSIST_CACHE_MAX_ENTRIES", 1024)),
+            ttl=ttl or float(os.getenv("CODEASSIST_CACHE_TTL", 3600.0)),
+        )
+        disk_path = disk_path or os.getenv("CODEASSIST_CACHE_DB")
+        shared = shared if shared is not None else get_shared_store()
+        self.disk = None
+        if disk_path:
+            self.disk = SQLiteCache(disk_path)
+        elif shared is not None:
+            self.disk = SharedStoreCache(shared)
+
+    def is_cacheable(self, temperature: float) -> bool:
+        return self.enabled and temperature <= self.max_temperature
+
+    async def get(self, key: str, record_miss: bool = True) -> Optional[str]:
+        """Look up ``key`` in memory, then on disk (promoting disk hits)
+
+        ``record_miss=False`` is for probes that fall through to
+        ``LLMClient.generate``, which records the miss itself.
+        """
+        value = self.memory.get(key, record_miss)
+        if value is not None or self.disk is None:
+            return value
+        entry = await asyncio.to_thread(self.disk.get, key, record_miss)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        self.memory.set(key, value, stored_at=stored_at)
+        return value
+
+    async def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def clear(self):
+        self.memory.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for each tier"""
+        memory = self.memory.stats()
+        disk = self.disk.stats() if self.disk is not None else None
+        hits = memory["hits"] + (disk["hits"] if disk else 0)
+        lookups = memory["hits"] + memory["misses"]
+        return {
+            "enabled": self.enabled,
+            "max_temperature": self.max_temperature,
+            "hit_rate": round(hits / lookups * 100, 1) if lookups else 0,
+            "memory": memory,
+            "disk": disk,
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+def close_response_cache():
+    """Close the process-wide response cache's disk tier"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is not None:
+            _response_cache.close()
+            _response_cache = None
@@ -0,0 +1,365 @@
+"""Near-duplicate response cache for review and explain requests
+
+The exact-match ``ResponseCache`` misses snippets that differ only in
+formatting, comments or variable names. This cache normalises code first:
+parse, drop docstrings, rename every local identifier to ``v0, v1, ...`` in
+order of appearance and unparse. The canonical text is embedded as hashed
+token n-grams and stored in an LRU-bounded vector store; lookups take the
+best cosine match (one matrix-vector product with NumPy, a sparse loop
+without it) and accept it above a per-task similarity threshold.
+
+Answers for canonically identical code are rewritten to the caller's
+identifier names before they are returned.
+"""
+import ast
+import builtins
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.metrics import Histogram, get_metrics_registry
+
+# numpy is a declared dependency but slow to import, so the first VectorStore
+# loads it; where it is missing, vectors stay sparse pure-Python dicts
+np = None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+
+_BUILTINS = set(dir(builtins)) | {"self", "cls"}
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_CODE_SPAN = re.compile(r"(```.*?```|`[^`\n]+`)", re.DOTALL)
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    """Rename local identifiers to ``v0, v1, ...`` and drop docstrings"""
+
+    def __init__(self, keep: set):
+        self.keep = keep
+        self.names: Dict[str, str] = {}
+
+    def _canonical(self, name: str) -> str:
+        if name in _BUILTINS or name in self.keep:
+            return name
+        return self.names.setdefault(name, f"v{len(self.names)}")
+
+    def _strip_docstring(self, node):
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+
+    def visit_Module(self, node):
+        self._strip_docstring(node)
+        return self.generic_visit(node)
+
+    def _visit_definition(self, node):
+        node.name = self._canonical(node.name)
+        self._strip_docstring(node)
+        return self.generic_visit(node)
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_definition
+
+    def visit_Name(self, node):
+        node.id = self._canonical(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self._canonical(node.arg)
+        return self.generic_visit(node)
+
+
+def normalize_code(code: str) -> Tuple[str, List[str]]:
+    """Canonical form of ``code`` and its original identifiers in ``v0, v1, ...`` order
+
+    Imported names and builtins keep their names (they carry meaning);
+    attribute and keyword names are never renamed. Code that does not parse
+    falls back to comment- and whitespace-insensitive text.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        lines = (re.sub(r"#.*$", "", line).strip() for line in code.splitlines())
+        return "\n".join(" ".join(line.split()) for line in lines if line), []
+
+    keep = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            keep.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+    canonicalizer = _Canonicalizer(keep)
+    tree = canonicalizer.visit(tree)
+    return ast.unparse(tree), list(canonicalizer.names)
+
+
+def rename_identifiers(text: str, old_names: List[str], new_names: List[str]) -> str:
+    """Rewrite a cached answer from one snippet's identifiers to another's
+
+    Names are replaced everywhere inside code spans, but in prose only when
+    at least three characters long, so renaming ``a`` cannot touch the
+    article "a".
+    """
+    mapping = {old: new for old, new in zip(old_names, new_names) if old != new}
+    if not mapping:
+        return text
+    every = re.compile(r"\b(" + "|".join(map(re.escape, sorted(mapping, key=len, reverse=True))) + r")\b")
+    long_names = [name for name in mapping if len(name) >= 3]
+    prose = re.compile(r"\b(" + "|".join(map(re.escape, sorted(long_names, key=len, reverse=True))) + r")\b") \
+        if long_names else None
+
+    def replace(match):
+        return mapping[match.group(1)]
+
+    parts = _CODE_SPAN.split(text)
+    for i, part in enumerate(parts):
+        if i % 2:
+            parts[i] = every.sub(replace, part)
+        elif prose is not None:
+            parts[i] = prose.sub(replace, part)
+    return "".join(parts)
+
+
+def embed(text: str, dim: int, ngram: int = 3) -> Dict[int, float]:
+    """L2-normalised signed feature hashing of token 1..``ngram``-grams"""
+    tokens = _TOKEN.findall(text)
+    features: Counter = Counter()
+    for n in range(1, ngram + 1):
+        for i in range(len(tokens) - n + 1):
+            digest = zlib.crc32(" ".join(tokens[i:i + n]).encode("utf-8"))
+            features[digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+    norm = math.sqrt(sum(value * value for value in features.values()))
+    return {index: value / norm for index, value in features.items() if value} if norm else {}
+
+
+class VectorStore:
+    """Fixed-capacity vector store with LRU eviction and scoped nearest-neighbour lookup"""
+
+    def __init__(self, dim: int = 1024, capacity: int = 2048):
+        _load_numpy()
+        self.dim = dim
+        self.capacity = capacity
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free = list(range(capacity - 1, -1, -1))
+        self._keys: List[Optional[str]] = [None] * capacity
+        if np is not None:
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            self._scopes = np.zeros(capacity, dtype=np.int64)
+        else:
+            self._vectors: List[Optional[Dict[int, float]]] = [None] * capacity
+            self._scopes = [0] * capacity
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, key: str, scope: int, vector: Dict[int, float]) -> Optional[str]:
+        """Insert or replace ``key``; returns the key evicted to make room, if any"""
+        evicted = None
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            if not self._free:
+                evicted, slot = self._slots.popitem(last=False)
+            else:
+                slot = self._free.pop()
+        self._slots[key] = slot
+        self._keys[slot] = key
+        self._scopes[slot] = scope
+        if np is not None:
+            row = self._matrix[slot]
+            row[:] = 0.0
+            if vector:
+                row[list(vector)] = list(vector.values())
+        else:
+            self._vectors[slot] = vector
+        return evicted
+
+    def remove(self, key: str):
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._keys[slot] = None
+            self._scopes[slot] = 0
+            if np is not None:
+                self._matrix[slot] = 0.0
+            else:
+                self._vectors[slot] = None
+            self._free.append(slot)
+
+    def touch(self, key: str):
+        self._slots.move_to_end(key)
+
+    def nearest(self, scope: int, vector: Dict[int, float]) -> Tuple[Optional[str], float]:
+        """Most similar stored key within ``scope`` and its cosine similarity"""
+        if not self._slots or not vector:
+            return None, 0.0
+        if np is not None:
+            query = np.zeros(self.dim, dtype=np.float32)
+            query[list(vector)] = list(vector.values())
+            similarities = self._matrix @ query
+            similarities[self._scopes != scope] = -1.0
+            slot = int(np.argmax(similarities))
+            best = float(similarities[slot])
+        else:
+            slot, best = -1, -1.0
+            for key, candidate in self._slots.items():
+                if self._scopes[candidate] != scope:
+                    continue
+                stored = self._vectors[candidate]
+                similarity = sum(value * stored.get(index, 0.0) for index, value in vector.items())
+                if similarity > best:
+                    slot, best = candidate, similarity
+        if slot < 0 or best <= 0 or self._keys[slot] is None:
+            return None, 0.0
+        return self._keys[slot], best
+
+
+class SemanticCache:
+    """Serve cached answers for code that is a near-duplicate of an earlier request
+
+    Entries are scoped by task, model and request context, which must
+    match exactly; only the code is compared by similarity.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        capacity: Optional[int] = None,
+        ttl: Optional[float] = None,
+        dim: int = 1024,
+        enabled: Optional[bool] = None
+    ):
+        if enabled is None:
+            enabled = os.getenv("CODEASSIST_SEMANTIC_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.threshold = threshold or float(os.getenv("CODEASSIST_SEMANTIC_CACHE_THRESHOLD", 0.95))
+        self.ttl = ttl or float(os.getenv("CODEASSIST_SEMANTIC_CACHE_TTL", 3600.0))
+        self.store = VectorStore(dim, capacity or int(os.getenv("CODEASSIST_SEMANTIC_CACHE_MAX_ENTRIES", 2048)))
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.lookup_seconds = Histogram()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lookups = get_metrics_registry().counter(
+            "codeassist_semantic_cache_lookups_total", "Semantic cache lookups by task and result",
+            ("task", "result"),
+        )
+
+    def threshold_for(self, task: str) -> float:
+        """Similarity needed for a hit; ``CODEASSIST_SEMANTIC_CACHE_THRESHOLD_<TASK>`` overrides"""
+        override = os.getenv(f"CODEASSIST_SEMANTIC_CACHE_THRESHOLD_{task.upper()}")
+        return float(override) if override else self.threshold
+
+    @staticmethod
+    def _scope(task: str, model: str, context: Optional[str]) -> int:
+        digest = hashlib.sha256(f"{task}\0{model}\0{context or ''}".encode("utf-8")).digest()
+        # Non-zero 63-bit id; 0 marks an empty slot
+        return (int.from_bytes(digest[:8], "big") >> 1) or 1
+
+    def lookup(self, task: str, model: str, code: str, context: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """``(answer, model_used)`` for ``code`` or a near-duplicate of it, else None
+
+        ``model_used`` is the model that produced the answer, which differs
+        from the requested ``model`` when that was ``auto``.
+        """
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        canonical, names = normalize_code(code)
+        scope = self._scope(task, model, context)
+        vector = embed(canonical, self.store.dim)
+        result = "miss"
+        answer = None
+        with self._lock:
+            key, similarity = self.store.nearest(scope, vector)
+            entry = self._entries.get(key) if key else None
+            if entry is not None and time.time() - entry["stored_at"] > self.ttl:
+                self.store.remove(key)
+                del self._entries[key]
+                entry = None
+            if entry is not None and similarity >= self.threshold_for(task):
+                self.store.touch(key)
+                answer = entry["response"]
+                model_used = entry.get("model_used") or model
+                if entry["canonical"] == canonical:
+                    answer = rename_identifiers(answer, entry["names"], names)
+                    result = "exact"
+                    self.exact_hits += 1
+                else:
+                    result = "near"
+                    self.near_hits += 1
+            else:
+                self.misses += 1
+        self._lookups.inc(task=task, result=result)
+        self.lookup_seconds.observe(time.perf_counter() - started)
+        return (answer, model_used) if answer is not None else None
+
+    def store_response(
+        self, task: str, model: str, code: str, context: Optional[str], response: str, model_used: Optional[str] = None
+    ):
+        """Remember ``response`` as the answer for ``code``, produced by ``model_used`` (default ``model``)"""
+        if not self.enabled or not response:
+            return
+        canonical, names = normalize_code(code)
+        scope = self._scope(task, model, context)
+        key = hashlib.sha256(f"{scope}\0{canonical}".encode("utf-8")).hexdigest()
+        vector = embed(canonical, self.store.dim)
+        with self._lock:
+            evicted = self.store.add(key, scope, vector)
+            if evicted is not None:
+                self._entries.pop(evicted, None)
+                self.evictions += 1
+            self._entries[key] = {
+                "canonical": canonical, "names": names, "response": response, "stored_at": time.time(),
+                "model_used": model_used or model,
+            }
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self.store.remove(key)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "numpy" if np is not None else "python",
+                "threshold": self.threshold,
+                "entries": len(self.store),
+                "max_entries": self.store.capacity,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups * 100, 1) if lookups else 0,
+                "lookup_seconds": self.lookup_seconds.summary(),
+            }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Return the process-wide semantic cache"""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache()
+        return _semantic_cache
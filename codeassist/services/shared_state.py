@@ -0,0 +1,233 @@
+"""Cross-process shared state for multi-worker deployments
+
+Backends expose a small Redis-compatible subset (``get``, ``set`` with
+``ex``/``nx``, ``delete``, ``hset``, ``hget``, ``hgetall``, ``hdel``), so a
+``redis.Redis(decode_responses=True)`` client can be used as-is. Choose one
+with ``CODEASSIST_SHARED_STATE``:
+
+- unset: no sharing (single process)
+- ``memory``: in-process fake, for tests
+- ``sqlite`` or ``sqlite:///path/to/state.db``: a WAL-mode file all local workers open
+- ``redis://host:port/db``: Redis (requires the ``redis`` package)
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+DEFAULT_SQLITE_PATH = "codeassist-state.db"
+# The SQLite store deletes expired keys once every this many writes
+SQLITE_PURGE_EVERY = int(os.getenv("CODEASSIST_SHARED_STATE_PURGE_EVERY", 500))
+
+
+class MemorySharedStore:
+    """In-process stand-in for a shared store"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, tuple] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and key in self._values:
+                expires_at = self._values[key][1]
+                if expires_at is None or expires_at > time.time():
+                    return False
+            self._values[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            return int(self._values.pop(key, None) is not None)
+
+    def hset(self, name: str, key: str, value: str) -> int:
+        with self._lock:
+            fields = self._hashes.setdefault(name, {})
+            created = key not in fields
+            fields[key] = value
+            return int(created)
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(name, {}).get(key)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hdel(self, name: str, key: str) -> int:
+        with self._lock:
+            return int(self._hashes.get(name, {}).pop(key, None) is not None)
+
+    def close(self):
+        pass
+
+
+class SQLiteSharedStore:
+    """Shared store in a WAL-mode SQLite file, safe across local processes
+
+    Expired keys are invisible to reads and purged every
+    ``purge_every`` writes, so TTL'd entries (cache responses, rate-limit
+    buckets, locks) do not accumulate in the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, purge_every: int = SQLITE_PURGE_EVERY):
+        self.path = path
+        self.purge_every = max(1, purge_every)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL);"
+            "CREATE TABLE IF NOT EXISTS hashes (name TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (name, field));"
+            "CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at);"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ex: Optional[float] = None, nx: bool = False) -> bool:
+        expires_at = time.time() + ex if ex else None
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._purge_expired()
+            if not nx:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+                )
+                return True
+            # Atomic set-if-absent: an expired row counts as absent
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, time.time()))
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount == 1
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM kv WHERE key = ?", (key,)).rowcount
+
+    def _purge_expired(self) -> int:
+        return self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def purge_expired(self) -> int:
+        """Delete every expired key now; returns how many were removed"""
+        with self._lock:
+            return self._purge_expired()
+
+    def hset(self, name: str, key: str, value: str) -> int:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (name, field, value) VALUES (?, ?, ?)", (name, key, value)
+            )
+        return 1
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM hashes WHERE name = ? AND field = ?", (name, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT field, value FROM hashes WHERE name = ?", (name,)).fetchall()
+        return dict(rows)
+
+    def hdel(self, name: str, key: str) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM hashes WHERE name = ? AND field = ?", (name, key)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_shared_store(url: Optional[str]):
+    """Build a shared store from a ``CODEASSIST_SHARED_STATE``-style URL (None if unset)"""
+    if not url:
+        return None
+    if url == "memory":
+        return MemorySharedStore()
+    if url == "sqlite":
+        return SQLiteSharedStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("CODEASSIST_SHARED_STATE points at Redis but the 'redis' package is not installed")
+        return redis.Redis.from_url(url, decode_responses=True)
+    raise ValueError(f"Unsupported shared state backend: {url}")
+
+
+@contextmanager
+def shared_lock(store, name: str, timeout: float = 10.0, ttl: int = 30):
+    """Best-effort cross-process mutex built on ``SET NX EX``"""
+    key = f"lock:{name}"
+    token = worker_id()
+    deadline = time.monotonic() + timeout
+    while not store.set(key, token, ex=ttl, nx=True):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for shared lock {name}")
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        if store.get(key) == token:
+            store.delete(key)
+
+
+_worker_id: Optional[str] = None
+_worker_pid: Optional[int] = None
+_shared_store = None
+_shared_store_lock = threading.Lock()
+_shared_store_loaded = False
+
+
+def worker_id() -> str:
+    """Identifier for this worker process, unique across restarts and forks"""
+    global _worker_id, _worker_pid
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_id = f"{socket.gethostname()}:{_worker_pid}:{int(time.time())}"
+    return _worker_id
+
+
+def get_shared_store():
+    """Return the process-wide shared store, or None when sharing is off"""
+    global _shared_store, _shared_store_loaded
+    with _shared_store_lock:
+        if not _shared_store_loaded:
+            _shared_store = create_shared_store(os.getenv("CODEASSIST_SHARED_STATE"))
+            _shared_store_loaded = True
+        return _shared_store
@@ -0,0 +1,173 @@
+"""Mergeable streaming summaries: DDSketch quantiles and decayed rates"""
+import math
+import time
+from typing import Any, Dict, Optional
+
+
+class DDSketch:
+    """Quantile sketch with bounded relative error (Masson et al., 2019)
+
+    Values land in log-spaced bins with ratio ``gamma``, so every quantile
+    is returned within ``relative_accuracy`` of the true value. Updates are
+    O(1), two sketches merge by adding bin counts, and the bin count is
+    capped (the lowest bins collapse first, keeping the tail accurate).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048, min_value: float = 1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # Midpoint (in relative terms) of the bin (gamma^(i-1), gamma^i]
+        return 2 * self.gamma ** index / (1 + self.gamma)
+
+    def add(self, value: float, count: int = 1):
+        if value <= self.min_value:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def _collapse(self):
+        """Fold the lowest bins together until the sketch is back under budget"""
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+
+    def merge(self, other: "DDSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self, digits: int = 3) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": round(self.mean, digits),
+            "p50": round(self.quantile(0.50), digits),
+            "p95": round(self.quantile(0.95), digits),
+            "p99": round(self.quantile(0.99), digits),
+            "max": round(self.max, digits) if self.count else 0.0,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact JSON form: bins as ``{index: count}``"""
+        return {
+            "accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero": self.zero_count,
+            "bins": {str(index): count for index, count in sorted(self.bins.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DDSketch":
+        sketch = cls(relative_accuracy=data.get("accuracy", 0.01))
+        sketch.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero", 0)
+        sketch.count = data.get("count", 0)
+        sketch.total = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min = data.get("min", 0.0)
+            sketch.max = data.get("max", 0.0)
+        return sketch
+
+
+class DecayedRate:
+    """Exponentially decayed event rate with a given half-life
+
+    Holds a single decayed counter: recent events weigh fully and older ones
+    fade, so ``rate()`` tracks current traffic in O(1) memory.
+    """
+
+    def __init__(self, half_life: float = 60.0):
+        self.half_life = half_life
+        self._decay = math.log(2) / half_life
+        self.value = 0.0
+        self.updated: Optional[float] = None
+
+    def _advance(self, now: float):
+        if self.updated is None:
+            self.updated = now
+        elif now > self.updated:
+            self.value *= math.exp(-self._decay * (now - self.updated))
+            self.updated = now
+
+    def add(self, amount: float = 1.0, now: Optional[float] = None):
+        self._advance(now if now is not None else time.time())
+        self.value += amount
+
+    def merge(self, other: "DecayedRate"):
+        """Add another counter's events (e.g. from another worker)"""
+        if other.updated is None:
+            return
+        if self.updated is None:
+            self.value, self.updated = other.value, other.updated
+            return
+        now = max(self.updated, other.updated)
+        self._advance(now)
+        self.value += other.value * math.exp(-self._decay * (now - other.updated))
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Events per second"""
+        if self.updated is None:
+            return 0.0
+        now = now if now is not None else time.time()
+        decayed = self.value * math.exp(-self._decay * max(0.0, now - self.updated))
+        return decayed * self._decay
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"half_life": self.half_life, "value": self.value, "updated": self.updated}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DecayedRate":
+        rate = cls(half_life=data.get("half_life", 60.0))
+        rate.value = data.get("value", 0.0)
+        rate.updated = data.get("updated")
+        return rate
@@ -0,0 +1,105 @@
+"""Cold-start measurement for the CLI and API entry points
+
+Imports that already happened cannot be profiled from inside the process,
+so the entry point is re-run in a fresh interpreter under
+``python -X importtime`` and its report is parsed. ``measure_cold_start``
+times plain runs for the regression benchmark in ``benchmarks/``.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$")
+
+
+def _run(argv: List[str], importtime: bool, env: Optional[Dict[str, str]]) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + list(argv)
+    return subprocess.run(command, capture_output=True, text=True, env={**os.environ, **(env or {})})
+
+
+def profile_startup(argv: List[str], env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Run ``python -X importtime <argv>``: wall time, output and every import's cost"""
+    started = time.perf_counter()
+    result = _run(argv, True, env)
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    imports, stderr = [], []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match is None:
+            if not line.startswith("import time:"):
+                stderr.append(line)
+            continue
+        imports.append({
+            "module": match.group(4),
+            "self_ms": int(match.group(1)) / 1000,
+            "cumulative_ms": int(match.group(2)) / 1000,
+            # One space after the bar, then two per nesting level
+            "depth": (len(match.group(3)) - 1) // 2,
+        })
+    return {
+        "argv": list(argv),
+        "returncode": result.returncode,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(item["cumulative_ms"] for item in imports if item["depth"] == 0), 1),
+        "imports": imports,
+        "stdout": result.stdout,
+        "stderr": "\n".join(stderr),
+    }
+
+
+def imported_modules(profile: Dict[str, Any]) -> set:
+    return {item["module"] for item in profile["imports"]}
+
+
+def format_report(profile: Dict[str, Any], top: int = 15) -> str:
+    """Plain-text breakdown: top-level imports with their costliest children, then the slowest modules"""
+    lines = [
+        f"Startup profile: {' '.join(profile['argv'])}",
+        f"Wall time {profile['wall_ms']:.0f} ms, of which imports {profile['import_ms']:.0f} ms "
+        f"({len(profile['imports'])} modules)",
+        "",
+        "Imports by cumulative ms:",
+    ]
+    # -X importtime lists children before their parent
+    roots, children = [], []
+    for item in profile["imports"]:
+        if item["depth"] == 1:
+            children.append(item)
+        elif item["depth"] == 0:
+            roots.append((item, children))
+            children = []
+    for root, kids in sorted(roots, key=lambda pair: pair[0]["cumulative_ms"], reverse=True)[:top]:
+        lines.append(f"  {root['cumulative_ms']:9.1f}  {root['module']}")
+        for kid in sorted(kids, key=lambda item: item["cumulative_ms"], reverse=True)[:5]:
+            if kid["cumulative_ms"] >= 1:
+                lines.append(f"  {kid['cumulative_ms']:9.1f}    {kid['module']}")
+    lines += ["", "Slowest modules (self ms):"]
+    heaviest = sorted(profile["imports"], key=lambda item: item["self_ms"], reverse=True)
+    lines += [f"  {item['self_ms']:9.1f}  {item['module']}" for item in heaviest[:top]]
+    return "\n".join(lines)
+
+
+def measure_cold_start(argv: List[str], repeats: int = 5, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Median and spread of wall time for fresh runs, after one unmeasured warm-up run
+
+    The warm-up fills the OS page cache, so the numbers reflect interpreter
+    and import work rather than disk reads.
+    """
+    _run(argv, False, env)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = _run(argv, False, env)
+        samples.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(argv)} exited with {result.returncode}: {result.stderr.strip()[-500:]}")
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
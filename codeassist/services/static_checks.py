@@ -0,0 +1,307 @@
+"""Fast local analysis run before code is sent to the LLM
+
+One ``ast`` parse and one walk over the tree, dispatching each node to the
+rules registered for its type. Rules cover common security, bug and
+performance patterns; they are deliberately conservative, so a finding is
+almost always worth reporting.
+"""
+import ast
+import os
+import textwrap
+import time
+from typing import Any, Callable, Dict, List, Optional, Type
+
+SEVERITY_ORDER = {"error": 0, "warning": 1, "info": 2}
+
+# Snippets this short with local findings are answered without the LLM (0 disables)
+STATIC_ONLY_MAX_LINES = int(os.getenv("CODEASSIST_STATIC_ONLY_MAX_LINES", 3))
+
+
+class StaticIssue:
+    """One rule match, anchored to a line of the analysed code"""
+
+    def __init__(self, rule: str, category: str, severity: str, line: int, message: str):
+        self.rule = rule
+        self.category = category
+        self.severity = severity
+        self.line = line
+        self.message = message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rule": self.rule,
+            "category": self.category,
+            "severity": self.severity,
+            "line": self.line,
+            "message": self.message,
+        }
+
+    def __str__(self):
+        return f"Line {self.line}: [{self.rule} {self.severity}] {self.message}"
+
+
+class AnalysisResult:
+    """Outcome of ``analyze``: a syntax error, or the issues found"""
+
+    def __init__(self, issues: List[StaticIssue], syntax_error: Optional[SyntaxError], lines: int, elapsed: float):
+        self.issues = issues
+        self.syntax_error = syntax_error
+        self.lines = lines
+        self.elapsed = elapsed
+
+    @property
+    def valid(self) -> bool:
+        return self.syntax_error is None
+
+    @property
+    def answers_locally(self) -> bool:
+        """Whether the review can be given without calling the LLM
+
+        True for code that does not parse, and for tiny snippets with a
+        warning or error the rules already explain.
+        """
+        if not self.valid:
+            return True
+        serious = any(issue.severity != "info" for issue in self.issues)
+        return serious and 0 < self.lines <= STATIC_ONLY_MAX_LINES
+
+    def report(self) -> str:
+        """Markdown review built from the local findings alone"""
+        if not self.valid:
+            error = self.syntax_error
+            where = f"line {error.lineno}" + (f", column {error.offset}" if error.offset else "")
+            text = f"## Syntax error\n\nThe code does not parse ({where}): {error.msg}."
+            if error.text and error.text.strip():
+                text += f"\n\n```python\n{error.text.rstrip()}\n```"
+            return text + "\n\nFix the syntax error and request the review again."
+        if not self.issues:
+            return "No issues found by static analysis."
+        sections = []
+        for category in ("security", "bug", "performance"):
+            issues = [issue for issue in self.issues if issue.category == category]
+            if issues:
+                sections.append(f"## {category.capitalize()}\n\n" + "\n".join(f"- {issue}" for issue in issues))
+        return "\n\n".join(sections)
+
+    def prompt_notes(self) -> str:
+        """Findings summary for the LLM prompt, so it need not rediscover them"""
+        if not self.issues:
+            return ""
+        return (
+            "A static analyzer already reported these issues; confirm or refine them briefly "
+            "instead of re-explaining them, and focus on anything it missed:\n"
+            + "\n".join(f"- {issue}" for issue in self.issues)
+        )
+
+
+# Node type -> rule functions; each yields (line, message) pairs
+_RULES: Dict[Type[ast.AST], List[Callable]] = {}
+
+
+def rule(code: str, category: str, severity: str, *node_types: Type[ast.AST]):
+    """Register a rule function for the given node types"""
+    def register(func):
+        func.code, func.category, func.severity = code, category, severity
+        for node_type in node_types:
+            _RULES.setdefault(node_type, []).append(func)
+        return func
+    return register
+
+
+def _call_name(node: ast.Call) -> str:
+    """Dotted name of the called function (``subprocess.call``), or ``""``"""
+    parts = []
+    target = node.func
+    while isinstance(target, ast.Attribute):
+        parts.append(target.attr)
+        target = target.value
+    if isinstance(target, ast.Name):
+        parts.append(target.id)
+        return ".".join(reversed(parts))
+    return ""
+
+
+def _keyword(node: ast.Call, name: str) -> Optional[ast.expr]:
+    for keyword in node.keywords:
+        if keyword.arg == name:
+            return keyword.value
+    return None
+
+
+def _is_constant(node: Optional[ast.expr], value) -> bool:
+    return isinstance(node, ast.Constant) and node.value is value
+
+
+# Security
+
+@rule("S101", "security", "error", ast.Call)
+def shell_injection(node: ast.Call, context):
+    name = _call_name(node)
+    if name.startswith("subprocess.") and _is_constant(_keyword(node, "shell"), True):
+        command = node.args[0] if node.args else _keyword(node, "args")
+        if not isinstance(command, ast.Constant):
+            yield node.lineno, f"{name}() with shell=True and a non-literal command allows shell injection; pass an argument list without shell=True"
+        else:
+            yield node.lineno, f"{name}() with shell=True; prefer an argument list without shell=True"
+    elif name in ("os.system", "os.popen"):
+        yield node.lineno, f"{name}() runs through the shell; use subprocess.run() with an argument list"
+
+
+@rule("S102", "security", "error", ast.Call)
+def dynamic_code(node: ast.Call, context):
+    if isinstance(node.func, ast.Name) and node.func.id in ("eval", "exec"):
+        if not (node.args and isinstance(node.args[0], ast.Constant)):
+            yield node.lineno, f"{node.func.id}() on dynamic input can execute arbitrary code; use ast.literal_eval or explicit parsing"
+
+
+@rule("S103", "security", "warning", ast.Call)
+def unsafe_deserialization(node: ast.Call, context):
+    name = _call_name(node)
+    if name in ("pickle.load", "pickle.loads", "marshal.load", "marshal.loads"):
+        yield node.lineno, f"{name}() can execute code from untrusted data; use JSON or a safe format"
+    elif name == "yaml.load" and _keyword(node, "Loader") is None and len(node.args) < 2:
+        yield node.lineno, "yaml.load() without a Loader is unsafe; use yaml.safe_load()"
+
+
+@rule("S104", "security", "warning", ast.Call)
+def disabled_tls_verification(node: ast.Call, context):
+    if _call_name(node).split(".")[0] in ("requests", "httpx") and _is_constant(_keyword(node, "verify"), False):
+        yield node.lineno, "TLS certificate verification is disabled (verify=False)"
+
+
+@rule("S105", "security", "warning", ast.Assign)
+def hardcoded_secret(node: ast.Assign, context):
+    if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str) and len(node.value.value) >= 4:
+        for target in node.targets:
+            name = target.id if isinstance(target, ast.Name) else getattr(target, "attr", "")
+            if any(word in name.lower() for word in ("password", "passwd", "secret", "api_key", "token")):
+                yield node.lineno, f"Hard-coded credential in '{name}'; load it from the environment or a secret store"
+
+
+# Bugs
+
+@rule("B001", "bug", "warning", ast.FunctionDef, ast.AsyncFunctionDef)
+def mutable_default(node, context):
+    for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+        if isinstance(default, (ast.List, ast.Dict, ast.Set)) or (
+            isinstance(default, ast.Call) and _call_name(default) in ("list", "dict", "set")
+        ):
+            yield default.lineno, f"Mutable default argument in {node.name}() is shared between calls; default to None"
+
+
+@rule("B002", "bug", "warning", ast.ExceptHandler)
+def bare_except(node: ast.ExceptHandler, context):
+    if node.type is None:
+        yield node.lineno, "Bare 'except:' also catches KeyboardInterrupt and SystemExit; catch Exception or something narrower"
+    elif all(isinstance(stmt, ast.Pass) for stmt in node.body):
+        yield node.lineno, "Exception silently ignored; log it or handle it explicitly"
+
+
+@rule("B003", "bug", "warning", ast.Compare)
+def suspicious_comparison(node: ast.Compare, context):
+    for op, right in zip(node.ops, node.comparators):
+        if isinstance(op, (ast.Eq, ast.NotEq)) and _is_constant(right, None):
+            yield node.lineno, "Comparison to None with ==/!=; use 'is None' / 'is not None'"
+        elif isinstance(op, (ast.Is, ast.IsNot)) and isinstance(right, ast.Constant) and not (
+            right.value is None or isinstance(right.value, bool) or right.value is Ellipsis
+        ):
+            yield node.lineno, "'is' compares identity, not value; use == for literals"
+
+
+@rule("B004", "bug", "error", ast.Assert)
+def assert_tuple(node: ast.Assert, context):
+    if isinstance(node.test, ast.Tuple) and node.test.elts:
+        yield node.lineno, "assert on a non-empty tuple is always true; drop the parentheses"
+
+
+@rule("B005", "bug", "info", ast.BinOp)
+def unchecked_division(node: ast.BinOp, context):
+    if isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) and isinstance(node.right, ast.Name):
+        function = context["function"]
+        if function is not None and node.right.id in {arg.arg for arg in function.args.args}:
+            yield node.lineno, f"Division by parameter '{node.right.id}' raises ZeroDivisionError when it is 0"
+
+
+# Performance
+
+@rule("P001", "performance", "info", ast.For)
+def range_len_loop(node: ast.For, context):
+    iterator = node.iter
+    if (
+        isinstance(iterator, ast.Call) and _call_name(iterator) == "range" and len(iterator.args) == 1
+        and isinstance(iterator.args[0], ast.Call) and _call_name(iterator.args[0]) == "len"
+    ):
+        yield node.lineno, "Loop over range(len(...)); iterate directly or use enumerate()"
+
+
+@rule("P002", "performance", "warning", ast.AugAssign)
+def string_concat_in_loop(node: ast.AugAssign, context):
+    if context["loop_depth"] and isinstance(node.op, ast.Add) and isinstance(node.value, (ast.JoinedStr, ast.Constant)) \
+            and isinstance(getattr(node.value, "value", ""), str):
+        yield node.lineno, "String built with += in a loop is quadratic; collect parts and ''.join() them"
+
+
+@rule("P003", "performance", "info", ast.Compare)
+def membership_in_keys(node: ast.Compare, context):
+    for op, right in zip(node.ops, node.comparators):
+        if isinstance(op, (ast.In, ast.NotIn)) and isinstance(right, ast.Call) and not right.args:
+            if isinstance(right.func, ast.Attribute) and right.func.attr == "keys":
+                yield node.lineno, "Membership test on .keys(); test the dict directly"
+        if isinstance(op, (ast.In, ast.NotIn)) and context["loop_depth"] and isinstance(right, ast.Call) \
+                and _call_name(right) == "list":
+            yield node.lineno, "Membership test against a list built inside a loop is O(n) each time; build a set once"
+
+
+@rule("P004", "performance", "error", ast.Call)
+def blocking_call_in_async(node: ast.Call, context):
+    function = context["function"]
+    if isinstance(function, ast.AsyncFunctionDef) and _call_name(node) in ("time.sleep", "requests.get", "requests.post"):
+        yield node.lineno, f"{_call_name(node)}() blocks the event loop inside async {function.name}(); use an async equivalent"
+
+
+@rule("P005", "performance", "info", ast.Subscript)
+def sort_for_extreme(node: ast.Subscript, context):
+    if isinstance(node.value, ast.Call) and _call_name(node.value) == "sorted" and isinstance(node.slice, ast.Constant) \
+            and node.slice.value in (0, -1):
+        yield node.lineno, "sorted(...)[0] / [-1] sorts the whole sequence; use min() or max()"
+
+
+_LOOPS = (ast.For, ast.AsyncFor, ast.While, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+
+def _walk(tree: ast.AST, issues: List[StaticIssue]):
+    """Run the rules over every node, with an explicit stack (deep expressions would overflow recursion)"""
+    stack = [(tree, {"function": None, "loop_depth": 0})]
+    while stack:
+        node, context = stack.pop()
+        for check in _RULES.get(type(node), ()):
+            for line, message in check(node, context):
+                issues.append(StaticIssue(check.code, check.category, check.severity, line, message))
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            context = {**context, "function": node, "loop_depth": 0}
+        elif isinstance(node, _LOOPS):
+            context = {**context, "loop_depth": context["loop_depth"] + 1}
+        stack.extend((child, context) for child in reversed(list(ast.iter_child_nodes(node))))
+
+
+def analyze(code: str) -> AnalysisResult:
+    """Parse ``code`` and run every rule over it
+
+    Snippets are dedented first, so a method pasted on its own parses; line
+    numbers are unchanged.
+    """
+    started = time.perf_counter()
+    lines = len([line for line in code.splitlines() if line.strip()])
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError as e:
+        return AnalysisResult([], e, lines, time.perf_counter() - started)
+    except (RecursionError, MemoryError):
+        # Too deeply nested for the parser; leave the review to the LLM
+        return AnalysisResult([], None, lines, time.perf_counter() - started)
+
+    issues: List[StaticIssue] = []
+    _walk(tree, issues)
+    issues.sort(key=lambda issue: (issue.line, SEVERITY_ORDER[issue.severity]))
+    return AnalysisResult(issues, None, lines, time.perf_counter() - started)
@@ -0,0 +1,358 @@
+"""Project symbol index with BM25 retrieval for completion context
+
+``SymbolIndex`` scans a source tree, extracts functions, classes and methods
+(signature plus first docstring paragraph) with ``ast`` and stores them in a
+compact JSON file under ``<root>/.codeassist/``. Re-indexing only re-parses
+files whose size or mtime changed and whose content hash differs.
+
+At completion time the identifiers in the snippet are matched against the
+symbols with Okapi BM25; query terms are scored rarest-first and scoring
+stops at the latency budget, so a large project degrades to "best terms
+only" rather than slowing the request down.
+"""
+import ast
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.token_budget import count_tokens
+
+INDEX_VERSION = 1
+INDEX_DIR = ".codeassist"
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", "venv", ".venv", "env",
+             "build", "dist", "site-packages", ".tox", ".nox", ".mypy_cache", ".pytest_cache", INDEX_DIR}
+MAX_FILE_BYTES = 1_000_000
+
+# Seconds between rescans of the tree when serving completions
+REFRESH_INTERVAL = float(os.getenv("CODEASSIST_INDEX_REFRESH_SECONDS", 30))
+# Budget for retrieved definitions in the completion prompt
+CONTEXT_TOKENS = int(os.getenv("CODEASSIST_INDEX_CONTEXT_TOKENS", 600))
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_STOPWORDS = {
+    "self", "cls", "def", "class", "return", "import", "from", "if", "else", "elif", "for", "while",
+    "in", "is", "not", "and", "or", "none", "true", "false", "the", "a", "an", "of", "to", "with",
+    "as", "try", "except", "pass", "raise", "async", "await", "lambda", "yield", "args", "kwargs",
+}
+
+
+def terms(text: str) -> List[str]:
+    """Search terms: identifiers plus their snake_case/camelCase parts, lowercased"""
+    out = []
+    for identifier in _IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        parts = [part.lower() for chunk in identifier.split("_") for part in _CAMEL.findall(chunk)]
+        if len(parts) > 1 and lowered not in _STOPWORDS:
+            out.append(lowered)
+        out.extend(part for part in parts if len(part) > 1 and part not in _STOPWORDS)
+    return out
+
+
+class Symbol:
+    """A definition found in the project"""
+
+    __slots__ = ("path", "line", "kind", "qualname", "signature", "doc")
+
+    def __init__(self, path: str, line: int, kind: str, qualname: str, signature: str, doc: str):
+        self.path = path
+        self.line = line
+        self.kind = kind
+        self.qualname = qualname
+        self.signature = signature
+        self.doc = doc
+
+    @property
+    def name(self) -> str:
+        return self.qualname.rsplit(".", 1)[-1]
+
+    def terms(self) -> List[str]:
+        # The name counts double: a match there matters more than one in prose
+        name_terms = terms(self.qualname)
+        return name_terms * 2 + terms(self.signature) + terms(self.doc)
+
+    def render(self) -> str:
+        """Stub form for the prompt: location, signature and docstring"""
+        where = f"{self.path}:{self.line}"
+        if self.kind == "method":
+            where += f" (in class {self.qualname.rsplit('.', 1)[0]})"
+        text = f"# {where}\n{self.signature}"
+        if self.doc:
+            indent = " " * (len(self.signature) - len(self.signature.lstrip()) + 4)
+            text += f'\n{indent}"""{self.doc}"""'
+        return text
+
+    def to_row(self) -> list:
+        return [self.line, self.kind, self.qualname, self.signature, self.doc]
+
+    def __repr__(self):
+        return f"Symbol({self.kind} {self.qualname!r} at {self.path}:{self.line})"
+
+
+def _signature(node, indent: str) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases)
+        return f"{indent}class {node.name}({bases}):" if bases else f"{indent}class {node.name}:"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:"
+
+
+def _first_paragraph(doc: Optional[str], limit: int = 300) -> str:
+    if not doc:
+        return ""
+    paragraph = " ".join(doc.strip().split("\n\n")[0].split())
+    return paragraph if len(paragraph) <= limit else paragraph[:limit - 3] + "..."
+
+
+def extract_symbols(source: str, path: str) -> List[Symbol]:
+    """Top-level functions and classes, plus methods one level down"""
+    tree = ast.parse(source)
+    symbols = []
+    definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    for node in tree.body:
+        if not isinstance(node, definitions):
+            continue
+        kind = "class" if isinstance(node, ast.ClassDef) else "function"
+        symbols.append(Symbol(path, node.lineno, kind, node.name, _signature(node, ""),
+                              _first_paragraph(ast.get_docstring(node))))
+        if isinstance(node, ast.ClassDef):
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and (
+                    not child.name.startswith("_") or child.name == "__init__"
+                ):
+                    symbols.append(Symbol(path, child.lineno, "method", f"{node.name}.{child.name}",
+                                          _signature(child, "    "), _first_paragraph(ast.get_docstring(child))))
+    return symbols
+
+
+class SymbolIndex:
+    """On-disk symbol table for one project, searchable with BM25"""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        self.root = Path(root).resolve()
+        self.index_path = Path(index_path) if index_path else self.root / INDEX_DIR / "symbols.json"
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._symbols: List[Symbol] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        self._average_length = 0.0
+        self.updated_at: Optional[float] = None
+        self.last_update: Dict[str, Any] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == str(self.root):
+            self._files = data.get("files", {})
+            self.updated_at = data.get("updated_at")
+            self._rebuild()
+
+    def _save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "root": str(self.root), "updated_at": self.updated_at,
+                       "files": self._files}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def _source_files(self) -> Iterator[Path]:
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if name not in SKIP_DIRS and not name.startswith(".")]
+            for filename in filenames:
+                if filename.endswith(".py"):
+                    yield Path(directory) / filename
+
+    def update(self) -> Dict[str, int]:
+        """Re-index changed files and drop deleted ones; returns change counts"""
+        with self._update_lock:
+            return self._update()
+
+    def _update(self) -> Dict[str, int]:
+        started = time.perf_counter()
+        changes = {"scanned": 0, "parsed": 0, "removed": 0}
+        seen = set()
+        dirty = False
+        for path in self._source_files():
+            relative = path.relative_to(self.root).as_posix()
+            seen.add(relative)
+            changes["scanned"] += 1
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entry = self._files.get(relative)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            if stat.st_size > MAX_FILE_BYTES:
+                continue
+            try:
+                data = path.read_bytes()
+            except OSError:
+                continue
+            digest = hashlib.sha1(data).hexdigest()
+            if entry and entry["hash"] == digest:
+                # Touched but unchanged (checkout, formatter no-op): no re-parse
+                entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+                dirty = True
+                continue
+            try:
+                symbols = extract_symbols(data.decode("utf-8", errors="replace"), relative)
+            except (SyntaxError, ValueError):
+                symbols = []
+            self._files[relative] = {
+                "mtime": stat.st_mtime, "size": stat.st_size, "hash": digest,
+                "symbols": [symbol.to_row() for symbol in symbols],
+            }
+            changes["parsed"] += 1
+            dirty = True
+
+        for relative in set(self._files) - seen:
+            del self._files[relative]
+            changes["removed"] += 1
+            dirty = True
+
+        self.updated_at = time.time()
+        if dirty:
+            self._rebuild()
+            self._save()
+        changes["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_update = changes
+        return changes
+
+    def _rebuild(self):
+        """Recompute the in-memory inverted index from the file table"""
+        symbols = [
+            Symbol(path, *row) for path, entry in sorted(self._files.items()) for row in entry["symbols"]
+        ]
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for doc_id, symbol in enumerate(symbols):
+            counts = Counter(symbol.terms())
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                postings.setdefault(term, []).append((doc_id, frequency))
+        with self._lock:
+            self._symbols, self._postings, self._lengths = symbols, postings, lengths
+            self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        budget_ms: float = 20.0,
+        exclude_path: Optional[str] = None
+    ) -> List[Tuple[float, Symbol]]:
+        """Top-``k`` symbols for ``query`` by BM25, best first"""
+        with self._lock:
+            symbols, postings, lengths, average = self._symbols, self._postings, self._lengths, self._average_length
+        if not symbols:
+            return []
+
+        deadline = time.perf_counter() + budget_ms / 1000
+        total = len(symbols)
+        query_terms = [term for term in Counter(terms(query)) if term in postings]
+        # Rarest (most informative) terms first, so a cut-off keeps the best evidence
+        query_terms.sort(key=lambda term: len(postings[term]))
+        scores: Dict[int, float] = {}
+        for term in query_terms:
+            if time.perf_counter() > deadline:
+                break
+            matches = postings[term]
+            idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+            for doc_id, frequency in matches:
+                norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / average)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_id, score in ranked:
+            if exclude_path and symbols[doc_id].path == exclude_path:
+                continue
+            results.append((score, symbols[doc_id]))
+            if len(results) == k:
+                break
+        return results
+
+    def context_for(
+        self,
+        code: str,
+        k: int = 5,
+        max_tokens: int = CONTEXT_TOKENS,
+        exclude_path: Optional[str] = None,
+        budget_ms: float = 20.0
+    ) -> Tuple[str, List[Symbol]]:
+        """Rendered definitions relevant to ``code``, within ``max_tokens``"""
+        blocks, used = [], []
+        remaining = max_tokens
+        for _, symbol in self.search(code, k=k, budget_ms=budget_ms, exclude_path=exclude_path):
+            block = symbol.render()
+            cost = count_tokens(block) + 1
+            if cost > remaining:
+                continue
+            blocks.append(block)
+            used.append(symbol)
+            remaining -= cost
+        return "\n\n".join(blocks), used
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            symbols = len(self._symbols)
+            terms_indexed = len(self._postings)
+        return {
+            "root": str(self.root),
+            "files": len(self._files),
+            "symbols": symbols,
+            "terms": terms_indexed,
+            "updated_at": self.updated_at,
+            "last_update": self.last_update,
+        }
+
+
+def find_project_root(path: str) -> Path:
+    """Nearest ancestor holding a VCS or packaging marker, else the file's directory"""
+    start = Path(path).resolve()
+    start = start if start.is_dir() else start.parent
+    for candidate in [start] + list(start.parents):
+        if any((candidate / marker).exists() for marker in (".git", "pyproject.toml", "setup.py", "setup.cfg")):
+            return candidate
+    return start
+
+
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(root: Optional[str] = None, refresh: bool = True) -> Optional[SymbolIndex]:
+    """Shared index for ``root`` (default ``CODEASSIST_PROJECT_ROOT``), refreshed at most every few seconds
+
+    Returns None when no project root is configured.
+    """
+    root = root or os.getenv("CODEASSIST_PROJECT_ROOT")
+    if not root:
+        return None
+    key = str(Path(root).resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SymbolIndex(key)
+    # Always rescan once per process: files may have changed since the index was saved
+    if refresh and (not index.last_update or time.time() - index.updated_at > REFRESH_INTERVAL):
+        index.update()
+    return index
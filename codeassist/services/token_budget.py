@@ -0,0 +1,252 @@
+"""Token counting and prompt budgeting before requests go upstream"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a local heuristic tokenizer
+    tiktoken = None
+
+# Context window sizes (tokens). Longest matching prefix wins.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "o1": 200000,
+    "o3": 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMER = 3
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+
+def context_window(model: str) -> int:
+    """Context window for ``model``, matching on the longest known prefix"""
+    best = None
+    for prefix in MODEL_CONTEXT_WINDOWS:
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return MODEL_CONTEXT_WINDOWS[best] if best else DEFAULT_CONTEXT_WINDOW
+
+
+class TokenCounter:
+    """Counts tokens locally, caching counts by content hash
+
+    Uses ``tiktoken`` when it is installed; otherwise a regex heuristic that
+    splits words, punctuation and whitespace runs and charges long words one
+    token per four characters. The heuristic errs slightly high, which is
+    the safe side for budgeting.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._encodings: Dict[str, object] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _encoding(self, model: str):
+        if tiktoken is None:
+            return None
+        if model not in self._encodings:
+            try:
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                # Encodings are downloaded on first use; offline hosts use the heuristic
+                encoding = None
+            self._encodings[model] = encoding
+        return self._encodings[model]
+
+    def _count_uncached(self, text: str, model: str) -> int:
+        encoding = self._encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        tokens = 0
+        for piece in _WORD_RE.findall(text):
+            if piece.isspace():
+                # A single space merges into the next word; newline+indent
+                # runs cost roughly one token per eight characters
+                tokens += 0 if piece == " " else 1 + len(piece) // 8
+            else:
+                tokens += (len(piece) + 3) // 4
+        return tokens
+
+    def count(self, text: str, model: str = "gpt-3.5-turbo") -> int:
+        if not text:
+            return 0
+        key = (hashlib.sha1(text.encode("utf-8")).hexdigest(), model if tiktoken else "")
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        tokens = self._count_uncached(text, model)
+        with self._lock:
+            self._cache[key] = tokens
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo") -> int:
+        """Tokens a chat request will consume on input"""
+        return REPLY_PRIMER + sum(
+            MESSAGE_OVERHEAD + self.count(message.get("content") or "", model) for message in messages
+        )
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "tokenizer": "tiktoken" if tiktoken else "heuristic",
+            "cached_counts": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """Return the process-wide token counter"""
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Shortcut for ``get_token_counter().count(text, model)``"""
+    return get_token_counter().count(text, model)
+
+
+def _omission(count: int) -> str:
+    return f"# ... ({count} lines omitted) ..."
+
+
+def fit_code(
+    code: str,
+    max_tokens: int,
+    keep: Union[str, int] = "end",
+    model: str = "gpt-3.5-turbo",
+    counter: Optional[TokenCounter] = None
+) -> str:
+    """Trim ``code`` to at most ``max_tokens``, keeping whole lines
+
+    ``keep`` selects what survives: ``"end"`` (the region before a cursor at
+    the end of the buffer), ``"start"``, ``"both"`` (head and tail, dropping
+    the middle) or an ``int`` line index to window around.
+    """
+    counter = counter or get_token_counter()
+    if counter.count(code, model) <= max_tokens:
+        return code
+
+    lines = code.splitlines()
+    costs = [counter.count(line + "\n", model) for line in lines]
+    budget = max_tokens - counter.count(_omission(len(lines)), model) * 2
+    if budget <= 0:
+        return ""
+
+    count = len(lines)
+    if keep == "start":
+        order = list(range(count))
+    elif keep == "end":
+        order = list(range(count - 1, -1, -1))
+    elif keep == "both":
+        # Alternate head and tail, working inward
+        order = []
+        left, right = 0, count - 1
+        while left <= right:
+            order.append(left)
+            if right != left:
+                order.append(right)
+            left, right = left + 1, right - 1
+    else:
+        # Alternate outward from the anchor line
+        anchor = max(0, min(int(keep), count - 1))
+        order = [anchor]
+        for offset in range(1, count):
+            if anchor - offset >= 0:
+                order.append(anchor - offset)
+            if anchor + offset < count:
+                order.append(anchor + offset)
+
+    kept = set()
+    used = 0
+    for index in order:
+        if used + costs[index] > budget:
+            break
+        kept.add(index)
+        used += costs[index]
+
+    output = []
+    omitted = 0
+    for index, line in enumerate(lines):
+        if index in kept:
+            if omitted:
+                output.append(_omission(omitted))
+                omitted = 0
+            output.append(line)
+        else:
+            omitted += 1
+    if omitted:
+        output.append(_omission(omitted))
+    return "\n".join(output)
+
+
+class PromptTooLargeError(ValueError):
+    """The prompt cannot fit the model's context window even with code trimmed"""
+
+
+def fit_prompt(
+    model: str,
+    code: str,
+    build: Callable[[str], List[Dict[str, str]]],
+    max_output_tokens: int,
+    keep: Union[str, int] = "end",
+    counter: Optional[TokenCounter] = None
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """Build messages for ``code`` that fit ``model``'s context window
+
+    ``build(code)`` must return the chat messages for a given code string.
+    Returns the messages and a usage estimate with ``input_tokens``,
+    ``output_tokens`` (the reserved maximum) and ``truncated`` (0/1).
+    """
+    counter = counter or get_token_counter()
+    window = context_window(model)
+    messages = build(code)
+    input_tokens = counter.count_messages(messages, model)
+    truncated = 0
+
+    if input_tokens + max_output_tokens > window:
+        overhead = counter.count_messages(build(""), model)
+        available = window - max_output_tokens - overhead
+        if available <= 0:
+            raise PromptTooLargeError(
+                f"Prompt does not fit the {window}-token context window of {model}"
+            )
+        code = fit_code(code, available, keep=keep, model=model, counter=counter)
+        messages = build(code)
+        input_tokens = counter.count_messages(messages, model)
+        truncated = 1
+
+    return messages, {
+        "input_tokens": input_tokens,
+        "output_tokens": max_output_tokens,
+        "truncated": truncated,
+    }